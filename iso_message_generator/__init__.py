@@ -2,11 +2,14 @@
 ISO 20022 Message Generator Module
 
 This module provides functionality to parse ISO 20022 message structures
-from Excel files and generate valid XML messages for different payment scenarios.
+from Excel files and generate valid XML messages for different payment scenarios,
+and to stream existing pacs.008 messages as compact per-transaction records.
 """
 
 from .message_structure import extract_message_structure
 from .rule_processor import extract_rules
 from .xml_generator import create_sample_xml
+from .message_reader import GroupHeader, Transaction, iter_transactions, read_header
 
-__all__ = ['extract_message_structure', 'extract_rules', 'create_sample_xml']
+__all__ = ['extract_message_structure', 'extract_rules', 'create_sample_xml',
+           'GroupHeader', 'Transaction', 'iter_transactions', 'read_header']
@@ -0,0 +1,224 @@
+"""
+Check amounts and currencies of pacs.008 messages with exact decimal arithmetic.
+
+The message is streamed with iterparse one CdtTrfTxInf at a time and cleared
+behind the parser, so memory stays flat whatever the number of transactions.
+Every amount is parsed as a Decimal and checked against the ISO 4217 minor units
+of its currency, the group header totals are compared with Decimal accumulators
+over the transactions, and instructed amount, exchange rate and settlement
+amount are checked for coherence.
+"""
+from decimal import Decimal, InvalidOperation
+from lxml import etree
+
+# ISO 4217 currencies whose minor unit differs from the usual two decimals
+MINOR_UNITS = {
+    'BIF': 0, 'CLP': 0, 'DJF': 0, 'GNF': 0, 'ISK': 0, 'JPY': 0, 'KMF': 0, 'KRW': 0,
+    'PYG': 0, 'RWF': 0, 'UGX': 0, 'UYI': 0, 'VND': 0, 'VUV': 0, 'XAF': 0, 'XOF': 0, 'XPF': 0,
+    'BHD': 3, 'IQD': 3, 'JOD': 3, 'KWD': 3, 'LYD': 3, 'OMR': 3, 'TND': 3,
+    'CLF': 4, 'UYW': 4
+}
+
+DEFAULT_MINOR_UNITS = 2
+
+def minor_units(currency):
+    """
+    Return the number of decimals allowed for a currency.
+
+    Args:
+        currency (str): ISO 4217 currency code
+
+    Returns:
+        int: Number of minor unit decimals
+    """
+    return MINOR_UNITS.get(currency, DEFAULT_MINOR_UNITS)
+
+def _local_name(tag):
+    """Return the local name of a namespaced tag."""
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else None
+
+def _error(index, line, path, message):
+    """Build an amount error record."""
+    return {'index': index, 'line': line, 'path': path, 'message': message}
+
+def _parse_amount(elem, index, path, errors):
+    """
+    Parse an amount element and check it against the minor units of its currency.
+
+    Returns:
+        tuple: (Decimal amount or None, currency code or None)
+    """
+    currency = elem.get('Ccy')
+    text = (elem.text or '').strip()
+
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        errors.append(_error(index, elem.sourceline, path, f"Amount '{text}' is not a decimal number"))
+        return None, currency
+
+    if not amount.is_finite() or amount < 0:
+        errors.append(_error(index, elem.sourceline, path, f"Amount '{text}' is not a non-negative finite number"))
+        return None, currency
+
+    if currency is not None:
+        decimals = -amount.as_tuple().exponent
+        if decimals > minor_units(currency):
+            errors.append(_error(index, elem.sourceline, path,
+                                 f"Amount '{text}' has {decimals} decimals, {currency} allows {minor_units(currency)}"))
+
+    return amount, currency
+
+def _check_transaction(elem, index, errors):
+    """
+    Check the amounts of one transaction.
+
+    Returns:
+        tuple: (IntrBkSttlmAmt as Decimal or None, its currency or None)
+    """
+    settlement = instructed = rate = None
+    settlement_ccy = instructed_ccy = None
+    charges = {}
+
+    for child in elem.iter():
+        name = _local_name(child.tag)
+        if name is None:
+            continue
+
+        if 'Ccy' in child.attrib:
+            amount, currency = _parse_amount(child, index, name, errors)
+            parent = _local_name(child.getparent().tag)
+
+            if name == 'IntrBkSttlmAmt' and parent == 'CdtTrfTxInf':
+                settlement, settlement_ccy = amount, currency
+            elif name == 'InstdAmt' and parent == 'CdtTrfTxInf':
+                instructed, instructed_ccy = amount, currency
+            elif name == 'Amt' and parent == 'ChrgsInf' and amount is not None:
+                charges[currency] = charges.get(currency, Decimal(0)) + amount
+        elif name == 'XchgRate' and _local_name(child.getparent().tag) == 'CdtTrfTxInf':
+            text = (child.text or '').strip()
+            try:
+                rate = Decimal(text)
+            except InvalidOperation:
+                errors.append(_error(index, child.sourceline, name, f"Exchange rate '{text}' is not a decimal number"))
+
+    if instructed is None or settlement is None:
+        if rate is not None and instructed is None:
+            errors.append(_error(index, elem.sourceline, 'XchgRate', "XchgRate is present without InstdAmt"))
+        return settlement, settlement_ccy
+
+    # Charges deducted along the chain explain a settlement amount below the instructed amount
+    tolerance = charges.get(settlement_ccy, Decimal(0)) + Decimal(1).scaleb(-minor_units(settlement_ccy))
+
+    if instructed_ccy == settlement_ccy:
+        if abs(instructed - settlement) > tolerance:
+            errors.append(_error(index, elem.sourceline, 'InstdAmt',
+                                 f"InstdAmt {instructed} {instructed_ccy} differs from IntrBkSttlmAmt "
+                                 f"{settlement} {settlement_ccy} by more than the charges"))
+    elif rate is None:
+        errors.append(_error(index, elem.sourceline, 'XchgRate',
+                             f"XchgRate is required when InstdAmt ({instructed_ccy}) and "
+                             f"IntrBkSttlmAmt ({settlement_ccy}) currencies differ"))
+    elif rate <= 0:
+        errors.append(_error(index, elem.sourceline, 'XchgRate', f"Exchange rate {rate} must be positive"))
+    else:
+        # pacs.008 carries no unit currency for XchgRate, so accept a rate quoted in either direction
+        converted = (instructed * rate, instructed / rate)
+        if all(abs(amount - settlement) > tolerance for amount in converted):
+            errors.append(_error(index, elem.sourceline, 'XchgRate',
+                                 f"InstdAmt {instructed} {instructed_ccy} at XchgRate {rate} does not give "
+                                 f"IntrBkSttlmAmt {settlement} {settlement_ccy}"))
+
+    return settlement, settlement_ccy
+
+def iter_amount_errors(source):
+    """
+    Stream a message and yield every amount and currency inconsistency.
+
+    Args:
+        source (str or file): Path to the XML file or a binary file object
+
+    Yields:
+        dict: Error with 'index' (zero-based transaction index, None for the
+        group header), 'line', 'path' and 'message'
+    """
+    header = {}
+    totals = {}
+    total = Decimal(0)
+    count = 0
+
+    context = etree.iterparse(source, events=('end',), tag=('{*}GrpHdr', '{*}CdtTrfTxInf'),
+                              remove_comments=True, huge_tree=True)
+
+    for _, elem in context:
+        errors = []
+
+        if _local_name(elem.tag) == 'GrpHdr':
+            for child in elem:
+                name = _local_name(child.tag)
+                if name in ('NbOfTxs', 'CtrlSum'):
+                    header[name] = ((child.text or '').strip(), child.sourceline)
+                elif name == 'TtlIntrBkSttlmAmt':
+                    amount, currency = _parse_amount(child, None, name, errors)
+                    header[name] = (amount, currency, child.sourceline)
+        else:
+            amount, currency = _check_transaction(elem, count, errors)
+            if amount is not None:
+                total += amount
+                totals[currency] = totals.get(currency, Decimal(0)) + amount
+            count += 1
+
+        yield from errors
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    if 'NbOfTxs' in header:
+        text, line = header['NbOfTxs']
+        if not text.isdigit() or int(text) != count:
+            yield _error(None, line, 'NbOfTxs', f"NbOfTxs is {text} but the message holds {count} transactions")
+
+    if 'CtrlSum' in header:
+        text, line = header['CtrlSum']
+        try:
+            if Decimal(text) != total:
+                yield _error(None, line, 'CtrlSum', f"CtrlSum {text} does not equal the sum of IntrBkSttlmAmt {total}")
+        except InvalidOperation:
+            yield _error(None, line, 'CtrlSum', f"CtrlSum '{text}' is not a decimal number")
+
+    if header.get('TtlIntrBkSttlmAmt') and header['TtlIntrBkSttlmAmt'][0] is not None:
+        amount, currency, line = header['TtlIntrBkSttlmAmt']
+        other = sorted(code for code in totals if code != currency)
+        if other:
+            yield _error(None, line, 'TtlIntrBkSttlmAmt',
+                         f"Transactions settle in {', '.join(other)} but TtlIntrBkSttlmAmt is in {currency}")
+        if amount != totals.get(currency, Decimal(0)):
+            yield _error(None, line, 'TtlIntrBkSttlmAmt',
+                         f"TtlIntrBkSttlmAmt {amount} {currency} does not equal the sum of IntrBkSttlmAmt "
+                         f"{totals.get(currency, Decimal(0))} {currency}")
+
+def check_amounts(source, max_errors=1000):
+    """
+    Check every amount of a message and summarize the findings.
+
+    Args:
+        source (str or file): Path to the XML file or a binary file object
+        max_errors (int): Maximum number of errors kept in the result
+
+    Returns:
+        dict: Dictionary with 'valid', 'error_count' and up to max_errors 'errors'
+    """
+    errors = []
+    error_count = 0
+
+    try:
+        for error in iter_amount_errors(source):
+            error_count += 1
+            if len(errors) < max_errors:
+                errors.append(error)
+    except etree.XMLSyntaxError as e:
+        error_count += 1
+        errors.append(_error(None, e.lineno, None, str(e)))
+
+    return {'valid': error_count == 0, 'error_count': error_count, 'errors': errors}
@@ -0,0 +1,66 @@
+"""
+Replace files atomically so a crash never leaves a message half written.
+
+New content is written to a temporary file in the same directory as the target,
+flushed to disk, given the permissions of the file it replaces and renamed over
+it. A rename within a directory is atomic, so readers and a crashed run see
+either the old file or the new one, never a truncated mix of both.
+"""
+import os
+import stat
+import tempfile
+
+def open_temp_file(path):
+    """
+    Create a temporary file next to a target file.
+
+    Args:
+        path (str): Path of the file that will be replaced
+
+    Returns:
+        tuple: Binary file object opened for writing and the temporary file path
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_file = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    return os.fdopen(handle, 'wb'), temp_file
+
+def replace_file(temp_file, path, mode_from=None):
+    """
+    Move a finished temporary file over its target.
+
+    Args:
+        temp_file (str): Temporary file written and closed by the caller
+        path (str): Path of the file to replace
+        mode_from (str, optional): File whose permissions the new file gets,
+            defaults to path when it exists
+    """
+    mode_from = mode_from or path
+    if os.path.exists(mode_from):
+        os.chmod(temp_file, stat.S_IMODE(os.stat(mode_from).st_mode))
+    os.replace(temp_file, path)
+
+def discard_temp_file(temp_file):
+    """Remove a temporary file that will not replace its target."""
+    try:
+        os.unlink(temp_file)
+    except FileNotFoundError:
+        pass
+
+def atomic_write(path, data):
+    """
+    Write bytes to a file, replacing it atomically.
+
+    Args:
+        path (str): Path of the file to write
+        data (bytes): New content
+    """
+    output, temp_file = open_temp_file(path)
+    try:
+        with output:
+            output.write(data)
+            output.flush()
+            os.fsync(output.fileno())
+        replace_file(temp_file, path)
+    except BaseException:
+        discard_temp_file(temp_file)
+        raise
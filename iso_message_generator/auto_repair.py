@@ -0,0 +1,283 @@
+"""
+Repair messages from their XSD validation errors until they validate.
+
+The message is validated against the compiled schema, every error in the lxml
+error log is located in the tree from its path and mapped through its domain and
+type to the registered repairs that fix that error, and those repairs run on the
+element the error names and on its parent (errors about unexpected children are
+reported on the child, but fixed on the parent). The repaired tree is validated
+again in memory. libxml2 stops checking a component at its first error, so each
+round can reveal errors the previous one hid; the loop ends when the message is
+valid, when no repair applies to the remaining errors (a fixed point), or after
+an iteration cap. The message is parsed and serialized only once.
+"""
+import multiprocessing
+import os
+import signal
+import time
+
+from lxml import etree
+
+from .atomic_files import atomic_write
+from .repairs import (PHASES, RECOVER_REPAIR, load_repair_schema, message_diff, parse_message,
+                      repair_element, select_repairs, serialize_tree, summarize_repairs)
+from .xsd_validation import format_schema_errors, load_schema
+
+# lxml error domain of schema validity errors, the only ones repairs are keyed by
+SCHEMA_ERROR_DOMAIN = 'SCHEMASV'
+
+MAX_ITERATIONS = 5
+
+# Why the loop ended
+STOP_REASONS = ('valid', 'fixed_point', 'iteration_cap')
+
+def index_repairs(repairs):
+    """
+    Index repairs by the lxml error types they resolve.
+
+    Args:
+        repairs (list): Repairs from select_repairs
+
+    Returns:
+        dict: Error type name to the list of repairs, structure repairs first
+    """
+    index = {}
+    for phase in PHASES:
+        for repair in repairs:
+            if repair['phase'] != phase:
+                continue
+            for error_type in repair['error_types']:
+                index.setdefault(error_type, []).append(repair)
+    return index
+
+def locate_error(tree, error):
+    """
+    Find the element a validation error refers to.
+
+    Args:
+        tree (lxml.etree._ElementTree): Validated document
+        error (dict): Error from format_schema_errors
+
+    Returns:
+        lxml.etree._Element: The element, or None if the error has no usable path
+    """
+    if not error['path']:
+        return None
+    root = tree.getroot()
+    namespaces = {prefix: uri for prefix, uri in root.nsmap.items() if prefix}
+    try:
+        found = tree.xpath(error['path'], namespaces=namespaces)
+    except Exception:
+        return None
+    return found[0] if found else None
+
+def plan_repairs(tree, errors, index):
+    """
+    Map validation errors to the repairs to run on each element.
+
+    Args:
+        tree (lxml.etree._ElementTree): Validated document
+        errors (list): Errors from format_schema_errors
+        index (dict): Repairs by error type from index_repairs
+
+    Returns:
+        list: (element, repairs, error type) tuples in error order, each
+        element and repair planned once
+    """
+    plan = []
+    planned = set()
+
+    for error in errors:
+        if error['domain'] != SCHEMA_ERROR_DOMAIN:
+            continue
+        candidates = index.get(error['type'])
+        if not candidates:
+            continue
+        elem = locate_error(tree, error)
+        if elem is None:
+            continue
+
+        for target in (elem, elem.getparent()):
+            if target is None:
+                continue
+            repairs = [repair for repair in candidates if (target, repair['name']) not in planned]
+            if repairs:
+                planned.update((target, repair['name']) for repair in repairs)
+                plan.append((target, repairs, error['type']))
+
+    return plan
+
+def auto_repair_tree(root, schema, schema_table, repairs=None, max_iterations=MAX_ITERATIONS):
+    """
+    Validate and repair a parsed message until it validates or no repair applies.
+
+    Args:
+        root (lxml.etree._Element): Root element of the message, changed in place
+        schema (lxml.etree.XMLSchema): Compiled schema from load_schema
+        schema_table (dict): Table from load_repair_schema
+        repairs (list, optional): Repairs from select_repairs, defaults to all
+        max_iterations (int): Rounds of repairs before giving up
+
+    Returns:
+        dict: Dictionary with 'valid', 'stop' (one of STOP_REASONS),
+        'iterations', 'repairs' (changes made, with the 'iteration' and the
+        'error' type that triggered them) and 'errors' (remaining errors)
+    """
+    tree = root.getroottree()
+    index = index_repairs(repairs if repairs is not None else select_repairs())
+    fired = []
+    iterations = 0
+
+    while True:
+        if schema.validate(tree):
+            return {'valid': True, 'stop': 'valid', 'iterations': iterations, 'repairs': fired, 'errors': []}
+
+        errors = format_schema_errors(schema.error_log)
+        if iterations >= max_iterations:
+            stop = 'iteration_cap'
+            break
+
+        changes = []
+        for elem, element_repairs, error_type in plan_repairs(tree, errors, index):
+            # An earlier repair in this round may have removed the element
+            if elem.getroottree().getroot() is not root:
+                continue
+            for change in repair_element(elem, schema_table, element_repairs):
+                change['iteration'] = iterations + 1
+                change['error'] = error_type
+                changes.append(change)
+
+        if not changes:
+            stop = 'fixed_point'
+            break
+        fired.extend(changes)
+        iterations += 1
+
+    return {'valid': False, 'stop': stop, 'iterations': iterations, 'repairs': fired, 'errors': errors}
+
+def auto_repair_message(data, schema, schema_table, repairs=None, max_iterations=MAX_ITERATIONS,
+                        compact=False, xml_declaration=True):
+    """
+    Parse, repair from validation errors and serialize one message.
+
+    Args:
+        data (bytes): Raw message bytes
+        schema (lxml.etree.XMLSchema): Compiled schema from load_schema
+        schema_table (dict): Table from load_repair_schema
+        repairs (list, optional): Repairs from select_repairs, defaults to all
+        max_iterations (int): Rounds of repairs before giving up
+        compact (bool): Serialize in the compact output mode
+        xml_declaration (bool): Start the message with an XML declaration
+
+    Returns:
+        dict: Result of auto_repair_tree with 'data' added (repaired bytes,
+        None if nothing was repaired)
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If the message could not be parsed at all
+    """
+    root, recovered = parse_message(data)
+    result = auto_repair_tree(root, schema, schema_table, repairs, max_iterations)
+    if recovered:
+        result['repairs'].insert(0, {'repair': RECOVER_REPAIR, 'path': None, 'line': None, 'iteration': 0, 'error': None})
+
+    result['data'] = serialize_tree(root, compact, xml_declaration) if result['repairs'] else None
+    return result
+
+def auto_repair_file(path, schema, schema_table, repairs=None, max_iterations=MAX_ITERATIONS, dry_run=False,
+                     compact=False, xml_declaration=True):
+    """
+    Repair one file from its validation errors, replacing it atomically if anything was repaired.
+
+    Args:
+        path (str): Path to the XML file
+        schema (lxml.etree.XMLSchema): Compiled schema from load_schema
+        schema_table (dict): Table from load_repair_schema
+        repairs (list, optional): Repairs from select_repairs, defaults to all
+        max_iterations (int): Rounds of repairs before giving up
+        dry_run (bool): Compute the diff without writing the file
+        compact (bool): Serialize in the compact output mode
+        xml_declaration (bool): Start the message with an XML declaration
+
+    Returns:
+        dict: Dictionary with 'file', 'status' ('repaired', 'unchanged' or
+        'error'), 'valid', 'stop', 'iterations', 'repairs' (repair name to
+        number of changes), 'changes' (every change made), 'errors'
+        (remaining validation errors), 'diff' (dry run only), 'seconds' and 'error'
+    """
+    start = time.perf_counter()
+    result = {'file': path, 'status': 'unchanged', 'valid': False, 'stop': None, 'iterations': 0,
+              'repairs': {}, 'changes': [], 'errors': [], 'diff': None, 'seconds': 0.0, 'error': None}
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        repaired = auto_repair_message(data, schema, schema_table, repairs, max_iterations, compact, xml_declaration)
+        result.update({'valid': repaired['valid'], 'stop': repaired['stop'], 'iterations': repaired['iterations'],
+                       'changes': repaired['repairs'], 'errors': repaired['errors']})
+
+        if repaired['data'] is not None:
+            result['status'] = 'repaired'
+            result['repairs'] = summarize_repairs(repaired['repairs'])
+            if dry_run:
+                result['diff'] = message_diff(data, repaired['data'], os.path.basename(path))
+            else:
+                atomic_write(path, repaired['data'])
+    except (etree.XMLSyntaxError, OSError) as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+_worker_state = {}
+
+def _load_worker_state(xsd_file, names, options):
+    """Keep the compiled schema, the repair schema, the repairs and the options for _auto_repair_item."""
+    _worker_state['schema'] = load_schema(xsd_file)
+    _worker_state['schema_table'] = load_repair_schema(xsd_file)
+    _worker_state['repairs'] = select_repairs(names)
+    _worker_state['options'] = options
+
+def _init_worker(xsd_file, names, options):
+    """Compile the schema once for the lifetime of a worker process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _load_worker_state(xsd_file, names, options)
+
+def _auto_repair_item(path):
+    """Repair one file inside a worker process."""
+    return auto_repair_file(path, _worker_state['schema'], _worker_state['schema_table'],
+                            _worker_state['repairs'], **_worker_state['options'])
+
+def auto_repair_files(files, xsd_file, names=None, max_iterations=MAX_ITERATIONS, dry_run=False, workers=None,
+                      chunksize=4, compact=False, xml_declaration=True):
+    """
+    Repair many files from their validation errors, in parallel.
+
+    Args:
+        files (list): Paths to the XML files
+        xsd_file (str): Path to the pacs.008 XSD schema file
+        names (iterable, optional): Names of the repairs to run, defaults to all
+        max_iterations (int): Rounds of repairs per message before giving up
+        dry_run (bool): Compute diffs without writing any file
+        workers (int, optional): Number of worker processes, defaults to the CPU count
+        chunksize (int): Files handed to a worker at a time
+        compact (bool): Serialize repaired files in the compact output mode
+        xml_declaration (bool): Start repaired files with an XML declaration
+
+    Yields:
+        dict: Result of auto_repair_file for each file, in input order
+    """
+    options = {'max_iterations': max_iterations, 'dry_run': dry_run, 'compact': compact,
+               'xml_declaration': xml_declaration}
+    workers = min(workers or os.cpu_count() or 1, max(len(files), 1))
+
+    if workers == 1:
+        _load_worker_state(xsd_file, names, options)
+        for path in files:
+            yield _auto_repair_item(path)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(xsd_file, names, options)) as pool:
+        yield from pool.imap(_auto_repair_item, files, chunksize)
@@ -0,0 +1,245 @@
+"""
+Evaluate the compiled ISO 20022 rules over many messages at once with columnar arrays.
+
+The fields referenced by the rules are extracted from N messages into NumPy
+arrays with one row per credit transfer transaction. Cross-field rules then run
+as vectorized array operations, and the per-transaction outcomes are reduced to
+a per-message result bitmap.
+"""
+import numpy as np
+
+from .rule_engine import STRUCTURED_ADDRESS_ELEMENTS, MAX_REMITTANCE_CHARACTERS, build_message_index, rule_key
+
+PARTY_SCOPES = ('UltmtDbtr', 'InitgPty', 'Dbtr', 'Cdtr', 'UltmtCdtr')
+
+AGENT_PAIRS = (('InstgAgt', 'DbtrAgt'), ('InstdAgt', 'CdtrAgt'))
+
+# Batch-only check that is not part of the Rules sheet
+CURRENCY_RULE_ID = 'CCY'
+
+# Key of an agent without FinInstnId, which never equals the key of an identified agent
+NO_FININSTNID_KEY = 'None:'
+
+def _agent_key(component, agent):
+    """Reduce an agent in a transaction or header index to a comparable string."""
+    if f"{agent}/FinInstnId" not in component:
+        return NO_FININSTNID_KEY
+
+    entry = component.get(f"{agent}/FinInstnId/BICFI")
+    if entry and entry['values'][0]:
+        return f"BICFI:{entry['values'][0]}"
+
+    entry = component.get(f"{agent}/FinInstnId/ClrSysMmbId/MmbId")
+    if entry and entry['values'][0]:
+        return f"MmbId:{entry['values'][0]}"
+
+    prefix = f"{agent}/FinInstnId/"
+    return "Text:" + ' '.join(value for path, entry in sorted(component.items())
+                              if path.startswith(prefix) for value in entry['values'] if value)
+
+def extract_rule_columns(messages):
+    """
+    Extract the rule-relevant fields from many messages into columnar arrays.
+
+    Args:
+        messages (iterable): Root Document elements or message indexes from build_message_index
+
+    Returns:
+        dict: Dictionary of NumPy arrays with one row per transaction, plus
+        'message' (row to message number), 'offsets' (first row of each message,
+        only meaningful where the row count is not zero), 'row_counts'
+        (transactions per message) and 'message_count'
+    """
+    rows = {'message': []}
+
+    def append(name, value):
+        rows.setdefault(name, []).append(value)
+
+    message_count = 0
+
+    for message in messages:
+        index = message if isinstance(message, dict) else build_message_index(message)
+        header = index['header']
+        header_ccy = (header.get('TtlIntrBkSttlmAmt/@Ccy') or {'values': ['']})['values'][0]
+
+        for transaction in index['transactions']:
+            rows['message'].append(message_count)
+
+            for scope in PARTY_SCOPES:
+                append(f"{scope}.present", scope in transaction)
+                append(f"{scope}.nm", f"{scope}/Nm" in transaction)
+                append(f"{scope}.anybic", f"{scope}/Id/OrgId/AnyBIC" in transaction)
+                append(f"{scope}.pstladr", f"{scope}/PstlAdr" in transaction)
+                append(f"{scope}.adrline", f"{scope}/PstlAdr/AdrLine" in transaction)
+                append(f"{scope}.twnnm", f"{scope}/PstlAdr/TwnNm" in transaction)
+                append(f"{scope}.ctry", f"{scope}/PstlAdr/Ctry" in transaction)
+                append(f"{scope}.structured", any(f"{scope}/PstlAdr/{name}" in transaction
+                                                  for name in STRUCTURED_ADDRESS_ELEMENTS))
+
+            for instructing, party_agent in AGENT_PAIRS:
+                component = transaction if instructing in transaction else header
+                append(f"{instructing}.present", instructing in component)
+                append(f"{instructing}.id", _agent_key(component, instructing))
+                append(f"{party_agent}.present", party_agent in transaction)
+                append(f"{party_agent}.id", _agent_key(transaction, party_agent))
+
+            append('RmtInf.present', 'RmtInf' in transaction)
+            append('RmtInf.ustrd', 'RmtInf/Ustrd' in transaction)
+            append('RmtInf.strd', 'RmtInf/Strd' in transaction)
+            strd = transaction.get('RmtInf/Strd')
+            append('RmtInf.strd_length', sum(strd['lengths']) if strd else 0)
+            rltd = transaction.get('RltdRmtInf')
+            append('RltdRmtInf.present', rltd is not None)
+            append('RltdRmtInf.max_length', max(rltd['lengths']) if rltd else 0)
+
+            append('IntrBkSttlmAmt.ccy', (transaction.get('IntrBkSttlmAmt/@Ccy') or {'values': ['']})['values'][0])
+            append('TtlIntrBkSttlmAmt.ccy', header_ccy)
+
+        message_count += 1
+
+    columns = {}
+    for name, values in rows.items():
+        if name.endswith('.id') or name.endswith('.ccy'):
+            columns[name] = np.array(values, dtype=str)
+        elif name.endswith('_length') or name == 'message':
+            columns[name] = np.array(values, dtype=np.int64)
+        else:
+            columns[name] = np.array(values, dtype=bool)
+
+    if 'message' not in columns or not len(columns['message']):
+        columns['message'] = np.zeros(0, dtype=np.int64)
+
+    columns['message_count'] = message_count
+    columns['row_counts'] = np.bincount(columns['message'], minlength=message_count)
+    # Never clipped: a message without transactions starts where the next one does,
+    # which can be one past the last row, so offsets are only used for non-empty messages
+    columns['offsets'] = np.searchsorted(columns['message'], np.arange(message_count))
+
+    return columns
+
+def _vector_agents_match(columns, scope):
+    """Instructing Agent must equal Debtor Agent and Instructed Agent must equal Creditor Agent."""
+    applicable = np.zeros(len(columns['message']), dtype=bool)
+    passed = np.ones(len(columns['message']), dtype=bool)
+    for instructing, party_agent in AGENT_PAIRS:
+        pair_applicable = columns[f"{instructing}.present"] & columns[f"{party_agent}.present"]
+        applicable |= pair_applicable
+        passed &= ~pair_applicable | (columns[f"{instructing}.id"] == columns[f"{party_agent}.id"])
+    return applicable, passed
+
+def _vector_name_if_postal_address(columns, scope):
+    """If Postal Address is present, Name is mandatory."""
+    applicable = columns[f"{scope}.pstladr"]
+    return applicable, ~applicable | columns[f"{scope}.nm"]
+
+def _vector_name_if_anybic_absent(columns, scope):
+    """If AnyBIC is absent, Name is mandatory."""
+    applicable = columns[f"{scope}.present"] & ~columns[f"{scope}.anybic"]
+    return applicable, ~applicable | columns[f"{scope}.nm"]
+
+def _vector_structured_vs_unstructured(columns, scope):
+    """If AddressLine is present, all other optional PostalAddress elements must be absent."""
+    applicable = columns[f"{scope}.adrline"]
+    return applicable, ~applicable | ~columns[f"{scope}.structured"]
+
+def _vector_town_name_and_country(columns, scope):
+    """If AddressLine is absent, Town Name and Country must be present."""
+    applicable = columns[f"{scope}.pstladr"] & ~columns[f"{scope}.adrline"]
+    return applicable, ~applicable | (columns[f"{scope}.twnnm"] & columns[f"{scope}.ctry"])
+
+def _vector_related_remittance_length(columns, scope):
+    """Each Related Remittance component must not exceed 9,000 characters of business data."""
+    applicable = columns['RltdRmtInf.present']
+    return applicable, columns['RltdRmtInf.max_length'] <= MAX_REMITTANCE_CHARACTERS
+
+def _vector_remittance_mutually_exclusive(columns, scope):
+    """Related Remittance Information and Remittance Information are mutually exclusive."""
+    applicable = columns['RltdRmtInf.present'] | columns['RmtInf.present']
+    return applicable, ~(columns['RltdRmtInf.present'] & columns['RmtInf.present'])
+
+def _vector_unstructured_structured_exclusive(columns, scope):
+    """For Remittance Information, Unstructured and Structured are mutually exclusive."""
+    applicable = columns['RmtInf.present']
+    return applicable, ~(columns['RmtInf.ustrd'] & columns['RmtInf.strd'])
+
+def _vector_structured_remittance_length(columns, scope):
+    """All Structured Remittance occurrences together must not exceed 9,000 characters."""
+    applicable = columns['RmtInf.strd']
+    return applicable, columns['RmtInf.strd_length'] <= MAX_REMITTANCE_CHARACTERS
+
+def _vector_currency_consistency(columns, scope):
+    """IntrBkSttlmAmt currencies must match each other and TtlIntrBkSttlmAmt within a message."""
+    ccy = columns['IntrBkSttlmAmt.ccy']
+    header_ccy = columns['TtlIntrBkSttlmAmt.ccy']
+    first_ccy = ccy[columns['offsets'][columns['message']]]
+
+    applicable = ccy != ''
+    passed = (ccy == first_ccy) & ((header_ccy == '') | (ccy == header_ccy))
+    return applicable, ~applicable | passed
+
+# Vectorized counterpart of each rule predicate in rule_engine.RULE_PREDICATES
+VECTOR_PREDICATES = {
+    'Textual_RTR_InstructingAgent/InstructedAgent_DebtorAgent/CreditorAgent_Rule': _vector_agents_match,
+    'RTR_Name_MandatoryIf_PstlAdrPresent_Rule': _vector_name_if_postal_address,
+    'RTR_DebtorName_MandatoryIf_Rule': _vector_name_if_anybic_absent,
+    'RTR_CreditorName_MandatoryIf_Rule': _vector_name_if_anybic_absent,
+    'StructuredVsUnstructuredRule': _vector_structured_vs_unstructured,
+    'TownNameAndCountryRule': _vector_town_name_and_country,
+    'Textual_RTR_RelatedRemittanceRule': _vector_related_remittance_length,
+    'Textual_RTR_RelatedRemitInfo_RemitInfo_MutuallyExclusiveRule': _vector_remittance_mutually_exclusive,
+    'Textual_RTR_Unstructured_Structured_MutuallyExclusiveRule': _vector_unstructured_structured_exclusive,
+    'Textual_RTR_RemittanceRule': _vector_structured_remittance_length
+}
+
+def _reduce_per_message(values, columns, reducer, empty):
+    """Reduce per-transaction rows to one value per message, empty for messages without transactions."""
+    # reduceat needs strictly increasing offsets inside the rows, so messages without rows are left out
+    nonempty = columns['row_counts'] > 0
+    reduced = np.full(columns['message_count'], empty, dtype=bool)
+    reduced[nonempty] = reducer.reduceat(values, columns['offsets'][nonempty])
+    return reduced
+
+def evaluate_rules_batch(compiled_rules, columns, check_currency=True):
+    """
+    Evaluate compiled rules against columnar message data with vectorized operations.
+
+    Args:
+        compiled_rules (list): Rules returned by rule_engine.compile_rules
+        columns (dict): Columns returned by extract_rule_columns
+        check_currency (bool): Whether to add the batch currency consistency check
+
+    Returns:
+        dict: Dictionary with 'rule_ids', 'passed' and 'applicable' boolean
+        matrices of shape (messages, rules), and 'bitmap', the passed matrix
+        packed into bits along the rule axis
+    """
+    rule_ids = []
+    vectors = []
+
+    for rule in compiled_rules:
+        predicate = VECTOR_PREDICATES.get(rule_key(rule['rule_name']))
+        if predicate is None:
+            continue
+        rule_ids.append(rule['rule_id'])
+        vectors.append((predicate, rule['scope']))
+
+    if check_currency:
+        rule_ids.append(CURRENCY_RULE_ID)
+        vectors.append((_vector_currency_consistency, None))
+
+    message_count = columns['message_count']
+    passed = np.ones((message_count, len(rule_ids)), dtype=bool)
+    applicable = np.zeros((message_count, len(rule_ids)), dtype=bool)
+
+    if len(columns['message']):
+        for position, (predicate, scope) in enumerate(vectors):
+            row_applicable, row_passed = predicate(columns, scope)
+            applicable[:, position] = _reduce_per_message(row_applicable, columns, np.logical_or, False)
+            passed[:, position] = _reduce_per_message(row_passed, columns, np.logical_and, True)
+
+    return {
+        'rule_ids': rule_ids,
+        'passed': passed,
+        'applicable': applicable,
+        'bitmap': np.packbits(passed, axis=1)
+    }
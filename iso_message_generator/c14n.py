@@ -0,0 +1,206 @@
+"""
+Compute content digests of messages over their C14N 2.0 canonical form.
+
+Two messages that differ only in formatting (indentation, line endings, attribute
+order, quoting, self-closed versus empty elements, comments) get the same digest,
+so caches, duplicate detection and regeneration can compare messages by content
+instead of by bytes. The canonical form is C14N 2.0 without comments and with
+leading and trailing whitespace stripped from text nodes.
+
+Messages up to STREAMING_THRESHOLD bytes are canonicalized in C by libxml2 on a
+tree parsed without blank text, which runs close to raw parse speed. Larger files
+are streamed through the C14N 2.0 writer target chunk by chunk and hashed as the
+canonical form is produced, so memory stays flat. Both paths produce the same
+bytes, and prefix rewriting (which only the C14N 2.0 writer supports) always
+uses the streaming path. Entity references are left unresolved on the tree,
+where libxml2 cannot canonicalize them, so such messages take the streaming
+path too.
+"""
+import hashlib
+import io
+import os
+from lxml import etree
+
+from .atomic_files import atomic_write
+
+DEFAULT_ALGORITHM = 'sha256'
+
+# Files above this size are canonicalized by streaming instead of on a tree
+STREAMING_THRESHOLD = 32 * 1024 * 1024
+
+CHUNK_SIZE = 1 << 16
+
+_tree_parser = etree.XMLParser(remove_blank_text=True, remove_comments=True, resolve_entities=False, huge_tree=True)
+
+def _canonical_tree_bytes(root):
+    """Canonicalize a parsed message with libxml2, stripping its text in place."""
+    for elem in root.iter():
+        if elem.text and elem.text != elem.text.strip():
+            elem.text = elem.text.strip()
+        if elem.tail and elem.tail != elem.tail.strip():
+            elem.tail = elem.tail.strip()
+    return etree.tostring(root.getroottree(), method='c14n', exclusive=True, with_comments=False)
+
+def tree_digest(root, algorithm=DEFAULT_ALGORITHM):
+    """
+    Digest the canonical form of an already parsed message.
+
+    The text of the tree is stripped in place, so call this once every other
+    check on the tree is done.
+
+    Args:
+        root (lxml.etree._Element): Root element of the parsed message
+        algorithm (str): hashlib algorithm name
+
+    Returns:
+        str: Hex digest of the canonical form
+    """
+    try:
+        return hashlib.new(algorithm, _canonical_tree_bytes(root)).hexdigest()
+    except etree.C14NError:
+        # libxml2 does not canonicalize entity references, the C14N 2.0 writer resolves them
+        return stream_digest(io.BytesIO(etree.tostring(root.getroottree())), algorithm)
+
+def canonicalize_stream(source, write, rewrite_prefixes=False, chunk_size=CHUNK_SIZE):
+    """
+    Stream a message through the C14N 2.0 writer.
+
+    Args:
+        source (file): Binary file object to read the message from
+        write (callable): Called with each str piece of the canonical form
+        rewrite_prefixes (bool): Replace namespace prefixes with n0, n1, ... so
+            the prefix choice of the producer does not matter
+        chunk_size (int): Bytes read per parser feed
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If the message is not well-formed
+    """
+    target = etree.C14NWriterTarget(write, with_comments=False, strip_text=True, rewrite_prefixes=rewrite_prefixes)
+    parser = etree.XMLParser(target=target, resolve_entities=False, huge_tree=True)
+
+    for chunk in iter(lambda: source.read(chunk_size), b''):
+        parser.feed(chunk)
+    parser.close()
+
+def stream_digest(source, algorithm=DEFAULT_ALGORITHM, rewrite_prefixes=False):
+    """
+    Digest the canonical form of a message read from a stream, in constant memory.
+
+    Args:
+        source (file): Binary file object to read the message from
+        algorithm (str): hashlib algorithm name
+        rewrite_prefixes (bool): Make the digest independent of namespace prefixes
+
+    Returns:
+        str: Hex digest of the canonical form
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If the message is not well-formed
+    """
+    digest = hashlib.new(algorithm)
+    canonicalize_stream(source, lambda piece: digest.update(piece.encode('utf-8')), rewrite_prefixes)
+    return digest.hexdigest()
+
+def canonical_bytes(data, rewrite_prefixes=False):
+    """
+    Return the canonical form of a message.
+
+    Args:
+        data (bytes): Raw message bytes
+        rewrite_prefixes (bool): Replace namespace prefixes with n0, n1, ...
+
+    Returns:
+        bytes: UTF-8 C14N 2.0 form without comments and with text stripped
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If the message is not well-formed
+    """
+    if not rewrite_prefixes and len(data) <= STREAMING_THRESHOLD:
+        try:
+            return _canonical_tree_bytes(etree.fromstring(data, _tree_parser))
+        except etree.C14NError:
+            pass
+
+    pieces = []
+    canonicalize_stream(io.BytesIO(data), pieces.append, rewrite_prefixes)
+    return ''.join(pieces).encode('utf-8')
+
+def canonical_digest(data, algorithm=DEFAULT_ALGORITHM, rewrite_prefixes=False):
+    """
+    Compute a digest of a message that ignores formatting-only differences.
+
+    Args:
+        data (bytes): Raw message bytes
+        algorithm (str): hashlib algorithm name
+        rewrite_prefixes (bool): Make the digest independent of namespace prefixes
+
+    Returns:
+        str: Hex digest of the canonical form, or of the raw bytes if the
+        message is not well-formed
+    """
+    try:
+        if not rewrite_prefixes and len(data) <= STREAMING_THRESHOLD:
+            try:
+                return hashlib.new(algorithm, _canonical_tree_bytes(etree.fromstring(data, _tree_parser))).hexdigest()
+            except etree.C14NError:
+                # Entity references are only resolved by the C14N 2.0 writer
+                pass
+        return stream_digest(io.BytesIO(data), algorithm, rewrite_prefixes)
+    except etree.XMLSyntaxError:
+        return hashlib.new(algorithm, data).hexdigest()
+
+def file_digest(path, algorithm=DEFAULT_ALGORITHM, rewrite_prefixes=False):
+    """
+    Compute the canonical digest of a file, streaming it if it is large.
+
+    Args:
+        path (str): Path to the XML file
+        algorithm (str): hashlib algorithm name
+        rewrite_prefixes (bool): Make the digest independent of namespace prefixes
+
+    Returns:
+        str: Hex digest of the canonical form, or of the raw bytes if the file
+        is not well-formed
+    """
+    if not rewrite_prefixes and os.path.getsize(path) <= STREAMING_THRESHOLD:
+        with open(path, 'rb') as f:
+            return canonical_digest(f.read(), algorithm)
+
+    try:
+        with open(path, 'rb') as f:
+            return stream_digest(f, algorithm, rewrite_prefixes)
+    except etree.XMLSyntaxError:
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+def write_if_changed(path, content, encoding='utf-8', compare='canonical'):
+    """
+    Write a generated message unless the file already holds the same content.
+
+    Keeping unchanged files untouched keeps their mtime, so stat-based caches
+    and incremental coverage stores do not see them as modified. Changed files
+    are replaced atomically.
+
+    Args:
+        path (str): Path of the file to write
+        content (str or bytes): New message
+        encoding (str): Encoding used when content is a str
+        compare (str): 'canonical' to keep a file whose content only differs in
+            formatting, 'bytes' to keep it only if it is byte-for-byte identical
+
+    Returns:
+        bool: True if the file was written, False if its content was unchanged
+    """
+    data = content.encode(encoding) if isinstance(content, str) else content
+
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            existing = f.read()
+        if existing == data or (compare == 'canonical' and canonical_digest(existing) == canonical_digest(data)):
+            return False
+
+    atomic_write(path, data)
+    return True
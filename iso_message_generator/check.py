@@ -0,0 +1,131 @@
+"""
+Run every message check on a single parse of each message.
+
+A message is parsed once with lxml and the same in-memory tree is used for XSD
+validation, the compiled business rules, field coverage accounting against the
+full field list in reference/all_fields.json, and duplicate detection of message
+and transaction identifiers. All findings are merged into one result record.
+"""
+import json
+import os
+from lxml import etree
+
+from .c14n import tree_digest
+from .rule_engine import build_message_index, evaluate_rules
+from .uniqueness_index import message_identifiers
+from .xsd_validation import validate_document
+
+DEFAULT_FIELDS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference", "all_fields.json")
+
+_parser = etree.XMLParser(huge_tree=True)
+
+def load_spec_paths(fields_file=None):
+    """
+    Load every field path of the message specification.
+
+    Args:
+        fields_file (str, optional): Path to the fields JSON file, defaults to reference/all_fields.json
+
+    Returns:
+        set: Set of absolute field paths across the mandatory, optional and conditional lists
+    """
+    with open(fields_file or DEFAULT_FIELDS_FILE, 'r', encoding='utf-8') as f:
+        fields = json.load(f)
+
+    return {field['path'] for group in fields.values() for field in group}
+
+def check_duplicates(index, digest, name, seen):
+    """
+    Record the identifiers of a message and report the ones seen before.
+
+    The identifiers are the ones uniqueness_index checks across runs, so MsgId is
+    scoped by the instructing agent. An identifier repeated within the message
+    is reported for every repeat, with the message itself as first_seen.
+
+    Args:
+        index (dict): Message index from build_message_index
+        digest (str): Canonical digest of the whole message
+        name (str): Name of the message used in findings
+        seen (dict): Dictionary mapping (kind, value, scope) to the first message it was seen in, updated in place
+
+    Returns:
+        list: List of duplicate dictionaries with kind, value, scope and first_seen
+    """
+    duplicates = []
+    in_message = set()
+
+    for key in [('Message', digest, '')] + message_identifiers(index):
+        if key in in_message:
+            first_seen = name
+        else:
+            in_message.add(key)
+            first_seen = seen.setdefault(key, name)
+            if first_seen == name:
+                continue
+        duplicates.append({'kind': key[0], 'value': key[1], 'scope': key[2], 'first_seen': first_seen})
+
+    return duplicates
+
+def check_message(source, schema=None, compiled_rules=None, spec_paths=None, seen=None, name=None):
+    """
+    Parse a message once and run every configured check on the same tree.
+
+    Args:
+        source (str or bytes): Path to the XML file, or the raw message bytes
+        schema (lxml.etree.XMLSchema, optional): Compiled schema; XSD validation is skipped without it
+        compiled_rules (list, optional): Rules from rule_engine.compile_rules; rule evaluation is skipped without them
+        spec_paths (set, optional): Field paths from load_spec_paths; coverage is skipped without them
+        seen (dict, optional): Identifier registry shared across messages; duplicate detection is skipped without it
+        name (str, optional): Name of the message in the result, defaults to the file path
+
+    Returns:
+        dict: Merged result record with 'file', 'valid', 'well_formed' and one
+        entry per check that ran ('xsd', 'rules', 'coverage', 'duplicates')
+    """
+    name = name or (source if isinstance(source, str) else '<bytes>')
+    record = {'file': name, 'valid': False, 'well_formed': False}
+
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            root = etree.fromstring(source, _parser)
+        else:
+            root = etree.parse(source, _parser).getroot()
+    except (etree.XMLSyntaxError, OSError) as e:
+        record['errors'] = [str(e)]
+        return record
+
+    record['well_formed'] = True
+    valid = True
+
+    if schema is not None:
+        xsd_result = validate_document(root, schema)
+        record['xsd'] = {
+            'valid': xsd_result['valid'],
+            'errors': [{'line': error['line'], 'path': error['path'], 'message': error['message']}
+                       for error in xsd_result['errors']]
+        }
+        valid = valid and xsd_result['valid']
+
+    index = build_message_index(root) if (compiled_rules or spec_paths is not None or seen is not None) else None
+
+    if compiled_rules:
+        record['rules'] = evaluate_rules(compiled_rules, index)
+        valid = valid and not record['rules']['failed_rules']
+
+    if spec_paths is not None:
+        present = spec_paths.intersection(index['paths'])
+        record['coverage'] = {
+            'total_fields': len(index['paths']),
+            'covered_spec_fields': len(present),
+            'spec_fields': len(spec_paths),
+            'coverage_percentage': round(len(present) / len(spec_paths) * 100, 2) if spec_paths else 0,
+            'unknown_fields': sorted(path for path in index['paths'] if path not in spec_paths)
+        }
+
+    if seen is not None:
+        digest = tree_digest(root)
+        record['duplicates'] = check_duplicates(index, digest, name, seen)
+        valid = valid and not record['duplicates']
+
+    record['valid'] = valid
+    return record
@@ -0,0 +1,380 @@
+"""
+Export pacs.008 corpora to columnar files, one row per transaction.
+
+Columns are specification paths from reference/all_fields.json, written relative
+to FIToFICstmrCdtTrf (GrpHdr/MsgId, CdtTrfTxInf/IntrBkSttlmAmt/@Ccy): every
+element path without child elements and every attribute path is a column. Group
+header columns are repeated on each transaction row of their message.
+
+Messages are streamed with iterparse and cleared behind the parser, and rows are
+collected column by column into chunks of a fixed number of rows, each written
+as one Parquet row group or Arrow IPC record batch, so memory is bounded by the
+chunk size however large the corpus. A column projection restricts extraction to
+the selected paths: only the elements on the way to a selected column are
+visited. Parquet and Arrow output need pyarrow; without it the export falls back
+to CSV.
+
+Values are kept as text, so amounts keep their exact decimals; repeated
+elements within one transaction are joined with a separator.
+"""
+import csv
+import fnmatch
+import io
+import json
+import os
+import time
+
+from lxml import etree
+
+from .atomic_files import discard_temp_file, open_temp_file, replace_file
+from .message_reader import local_name
+
+DEFAULT_FIELDS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference", "all_fields.json")
+
+# Prefix of the specification paths, left out of the column names
+MESSAGE_ROOT = '/Document/FIToFICstmrCdtTrf/'
+
+# Row elements: the group header is read once per message, a row is written per transaction
+HEADER_ELEMENT = 'GrpHdr'
+TRANSACTION_ELEMENT = 'CdtTrfTxInf'
+
+# Columns identifying the source of every row, ahead of the specification columns
+ROW_COLUMNS = ('message_file', 'transaction_index')
+
+FORMATS = ('parquet', 'arrow', 'csv')
+
+EXTENSIONS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow', '.ipc': 'arrow', '.csv': 'csv'}
+
+# Rows collected before a chunk is written, which bounds memory
+CHUNK_ROWS = 65536
+
+# Values collected before a chunk is written, which caps the rows of wide exports
+CHUNK_VALUES = 4 * 1024 * 1024
+
+DEFAULT_SEPARATOR = '|'
+
+def _import_pyarrow():
+    """Import pyarrow with its Parquet and IPC modules, None if it is not installed."""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+def spec_columns(fields_file=None):
+    """
+    List the exportable columns of the message specification.
+
+    Args:
+        fields_file (str, optional): Path to the fields JSON file, defaults to reference/all_fields.json
+
+    Returns:
+        list: Column names in specification order, group header columns first
+    """
+    with open(fields_file or DEFAULT_FIELDS_FILE, 'r', encoding='utf-8') as f:
+        fields = json.load(f)
+
+    paths = []
+    seen = set()
+    for group in fields.values():
+        for field in group:
+            if field['path'] not in seen:
+                seen.add(field['path'])
+                paths.append(field['path'])
+
+    # Components with child elements hold no value of their own
+    components = {path.rsplit('/', 1)[0] for path in paths if '/@' not in path}
+
+    columns = {HEADER_ELEMENT: [], TRANSACTION_ELEMENT: []}
+    for path in paths:
+        if not path.startswith(MESSAGE_ROOT) or path in components:
+            continue
+        column = path[len(MESSAGE_ROOT):]
+        row_element = column.split('/', 1)[0]
+        if row_element in columns and '/' in column:
+            columns[row_element].append(column)
+
+    return columns[HEADER_ELEMENT] + columns[TRANSACTION_ELEMENT]
+
+def select_columns(columns, patterns=None):
+    """
+    Project the columns onto the ones matching any of the given patterns.
+
+    Args:
+        columns (list): Column names from spec_columns
+        patterns (list, optional): Shell-style patterns such as 'CdtTrfTxInf/PmtId/*'
+            or 'GrpHdr/MsgId', all columns if empty
+
+    Returns:
+        list: Matching columns, in specification order
+
+    Raises:
+        ValueError: If a pattern matches no column
+    """
+    if not patterns:
+        return list(columns)
+
+    unmatched = [pattern for pattern in patterns if not fnmatch.filter(columns, pattern)]
+    if unmatched:
+        raise ValueError(f"No column matches: {', '.join(unmatched)}")
+    return [column for column in columns if any(fnmatch.fnmatchcase(column, pattern) for pattern in patterns)]
+
+def build_extractor(columns):
+    """
+    Compile the selected columns into the trees the extraction walks.
+
+    Args:
+        columns (list): Selected column names
+
+    Returns:
+        dict: Row element name to its tree, where each node has 'children'
+        (local name to node), 'column' (position of its text column or None)
+        and 'attributes' (attribute name to column position); positions count
+        the ROW_COLUMNS first
+    """
+    trees = {}
+    for position, column in enumerate(columns, len(ROW_COLUMNS)):
+        steps = column.split('/')
+        attribute = steps.pop()[1:] if steps[-1].startswith('@') else None
+
+        node = trees.setdefault(steps[0], {'children': {}, 'column': None, 'attributes': {}})
+        for step in steps[1:]:
+            node = node['children'].setdefault(step, {'children': {}, 'column': None, 'attributes': {}})
+
+        if attribute:
+            node['attributes'][attribute] = position
+        else:
+            node['column'] = position
+    return trees
+
+def _extract(elem, node, row, separator):
+    """Collect the values of the selected paths below an element into a row."""
+    for name, position in node['attributes'].items():
+        value = elem.get(name)
+        if value is not None:
+            row[position] = value if row[position] is None else row[position] + separator + value
+
+    if node['column'] is not None:
+        text = (elem.text or '').strip()
+        if text:
+            position = node['column']
+            row[position] = text if row[position] is None else row[position] + separator + text
+
+    children = node['children']
+    if children:
+        for child in elem:
+            child_node = children.get(local_name(child.tag))
+            if child_node is not None:
+                _extract(child, child_node, row, separator)
+
+def iter_rows(source, extractor, width, separator=DEFAULT_SEPARATOR):
+    """
+    Stream a message and yield one row per transaction.
+
+    Args:
+        source (str or file): Path to the XML file or a binary file object
+        extractor (dict): Trees from build_extractor
+        width (int): Number of columns, ROW_COLUMNS included
+        separator (str): Joins the values of repeated elements
+
+    Yields:
+        list: Column values of one transaction, None where a path is absent
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If the message is not well-formed
+    """
+    header = [None] * width
+    header[0] = source if isinstance(source, str) else getattr(source, 'name', None)
+    header_tree = extractor.get(HEADER_ELEMENT)
+    transaction_tree = extractor.get(TRANSACTION_ELEMENT)
+    index = 0
+
+    context = etree.iterparse(source, events=('end',), tag=(f'{{*}}{HEADER_ELEMENT}', f'{{*}}{TRANSACTION_ELEMENT}'),
+                              remove_comments=True, huge_tree=True)
+
+    for _, elem in context:
+        if local_name(elem.tag) == HEADER_ELEMENT:
+            if header_tree is not None:
+                _extract(elem, header_tree, header, separator)
+        else:
+            row = list(header)
+            row[1] = index
+            if transaction_tree is not None:
+                _extract(elem, transaction_tree, row, separator)
+            index += 1
+            yield row
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+def output_format(path, requested=None):
+    """
+    Choose the output format from an explicit request or the file extension.
+
+    Args:
+        path (str): Output file path
+        requested (str, optional): One of FORMATS
+
+    Returns:
+        str: One of FORMATS, parquet for unknown extensions
+    """
+    if requested:
+        if requested not in FORMATS:
+            raise ValueError(f"Unknown format: {requested}")
+        return requested
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'parquet')
+
+def open_writer(path, columns, requested_format=None):
+    """
+    Open a chunked columnar writer.
+
+    The file is written to a temporary file next to the target and only moved
+    into place by close_writer, so an interrupted export never leaves a
+    truncated file that looks complete.
+
+    Args:
+        path (str): Output file path
+        columns (list): Selected column names, without ROW_COLUMNS
+        requested_format (str, optional): One of FORMATS, from the extension by default
+
+    Returns:
+        dict: Writer state with 'format', 'path', 'names' and the open output
+    """
+    fmt = output_format(path, requested_format)
+    pyarrow = _import_pyarrow() if fmt != 'csv' else None
+    if fmt != 'csv' and pyarrow is None:
+        path = os.path.splitext(path)[0] + '.csv'
+        print(f"pyarrow is not installed, writing CSV to {path} instead of {fmt}")
+        fmt = 'csv'
+
+    names = list(ROW_COLUMNS) + list(columns)
+    output, temp_file = open_temp_file(path)
+    writer = {'format': fmt, 'path': path, 'temp_file': temp_file, 'output': output, 'names': names,
+              'rows': 0, 'chunks': 0}
+
+    try:
+        if fmt == 'csv':
+            writer['text'] = io.TextIOWrapper(output, encoding='utf-8', newline='')
+            writer['csv'] = csv.writer(writer['text'])
+            writer['csv'].writerow(names)
+        else:
+            fields = [(name, pyarrow.string()) for name in names]
+            fields[1] = (ROW_COLUMNS[1], pyarrow.int64())
+            schema = pyarrow.schema(fields)
+            writer['pyarrow'] = pyarrow
+            writer['schema'] = schema
+            if fmt == 'parquet':
+                writer['writer'] = pyarrow.parquet.ParquetWriter(output, schema)
+            else:
+                writer['writer'] = pyarrow.ipc.new_file(output, schema)
+    except BaseException:
+        output.close()
+        discard_temp_file(temp_file)
+        raise
+
+    return writer
+
+def write_chunk(writer, chunk):
+    """
+    Write a chunk of rows as one row group, record batch or block of CSV lines.
+
+    Args:
+        writer (dict): Writer from open_writer
+        chunk (list): One list of values per column, all of the same length
+    """
+    rows = len(chunk[0]) if chunk else 0
+    if not rows:
+        return
+
+    if writer['format'] == 'csv':
+        writer['csv'].writerows(zip(*chunk))
+    else:
+        pyarrow = writer['pyarrow']
+        schema = writer['schema']
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(chunk, schema)]
+        if writer['format'] == 'parquet':
+            writer['writer'].write_table(pyarrow.Table.from_arrays(arrays, schema=schema), row_group_size=rows)
+        else:
+            writer['writer'].write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=schema))
+
+    writer['rows'] += rows
+    writer['chunks'] += 1
+
+def close_writer(writer, commit=True):
+    """
+    Finish the output and move it into place, or discard it.
+
+    Args:
+        writer (dict): Writer from open_writer
+        commit (bool): Keep the output, False to discard it after an error
+    """
+    try:
+        if writer['format'] == 'csv':
+            writer['text'].flush()
+        else:
+            writer['writer'].close()
+        writer['output'].flush()
+        os.fsync(writer['output'].fileno())
+    finally:
+        writer['output'].close()
+
+    if commit:
+        replace_file(writer['temp_file'], writer['path'])
+    else:
+        discard_temp_file(writer['temp_file'])
+
+def export_messages(files, output, columns, requested_format=None, chunk_rows=None, separator=DEFAULT_SEPARATOR):
+    """
+    Export messages to one columnar file, one row per transaction.
+
+    Args:
+        files (iterable): Paths to the XML files
+        output (str): Output file path
+        columns (list): Selected column names from spec_columns or select_columns
+        requested_format (str, optional): One of FORMATS, from the extension by default
+        chunk_rows (int, optional): Rows per row group or record batch, defaults
+            to CHUNK_ROWS or fewer, so a chunk holds at most CHUNK_VALUES values
+        separator (str): Joins the values of repeated elements
+
+    Returns:
+        dict: Dictionary with 'output', 'format', 'files', 'rows', 'chunks',
+        'errors' (files that could not be read, with the error) and 'seconds'
+    """
+    start = time.perf_counter()
+    extractor = build_extractor(columns)
+    width = len(ROW_COLUMNS) + len(columns)
+    if not chunk_rows:
+        chunk_rows = max(1, min(CHUNK_ROWS, CHUNK_VALUES // width))
+    writer = open_writer(output, columns, requested_format)
+    summary = {'output': writer['path'], 'format': writer['format'], 'files': 0, 'rows': 0, 'chunks': 0,
+               'errors': [], 'seconds': 0.0}
+
+    chunk = [[] for _ in range(width)]
+    committed = False
+    try:
+        for xml_file in files:
+            try:
+                for row in iter_rows(xml_file, extractor, width, separator):
+                    for values, value in zip(chunk, row):
+                        values.append(value)
+                    if len(chunk[0]) >= chunk_rows:
+                        write_chunk(writer, chunk)
+                        chunk = [[] for _ in range(width)]
+            except (etree.XMLSyntaxError, FileNotFoundError, PermissionError) as e:
+                # Transactions read before the error are kept, the file is reported
+                summary['errors'].append({'file': xml_file, 'error': f"{type(e).__name__}: {e}"})
+                continue
+            summary['files'] += 1
+
+        write_chunk(writer, chunk)
+        committed = True
+    finally:
+        close_writer(writer, commit=committed)
+
+    summary['rows'] = writer['rows']
+    summary['chunks'] = writer['chunks']
+    summary['seconds'] = time.perf_counter() - start
+    return summary
@@ -0,0 +1,277 @@
+"""
+Encode the specification paths each message uses as bitsets over integer path IDs.
+
+Every specification path gets an integer ID and every message becomes one row of
+a packed uint8 bit matrix. Corpus coverage, unions, intersections and "which
+messages exercise this path" are then NumPy bitwise operations over the matrix.
+The matrix is saved with the file names and their (size, mtime) signatures, so a
+coverage report is recomputed without parsing a single message and new or
+modified files are added incrementally.
+
+When the store is opened with compiled rules, the same parse also records, per
+message and rule, how many occurrences triggered the rule condition and how many
+violated it, so rule branch coverage is aggregated from the store as well.
+"""
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from .rule_coverage import message_rule_branches, new_rule_coverage
+from .rule_engine import RULESET_VERSION, build_message_index
+
+# Rows unpacked at a time when counting, which bounds the memory of path_counts
+COUNT_CHUNK_ROWS = 65536
+
+def _rules_key(rule_ids):
+    """Identify the rule set the rule counts of a store were recorded with."""
+    return f"{RULESET_VERSION}:{','.join(rule_ids)}"
+
+def open_coverage_store(store_file, spec_paths, compiled_rules=None):
+    """
+    Load a coverage bitset store, or start an empty one.
+
+    A store saved for a different list of specification paths or a different
+    rule set is discarded, since its path and rule IDs no longer line up.
+
+    Args:
+        store_file (str): Path to the .npz store file
+        spec_paths (iterable): Every path of the specification
+        compiled_rules (list, optional): Rules from rule_engine.compile_rules whose
+            branches are recorded for every message
+
+    Returns:
+        dict: Store with 'paths', 'path_ids', 'files', 'signatures' (N x 2 int64),
+        'bits' (N x ceil(paths / 8) uint8), 'rules' and 'rule_counts'
+        (N x rules x 2 int32 triggered and violated occurrence counts)
+    """
+    paths = sorted(spec_paths)
+    rules = [rule for rule in compiled_rules or () if rule['check'] is not None]
+    rules_key = _rules_key([rule['rule_id'] for rule in rules])
+    store = {
+        'paths': paths,
+        'path_ids': {path: position for position, path in enumerate(paths)},
+        'files': [],
+        'signatures': np.zeros((0, 2), dtype=np.int64),
+        'bits': np.zeros((0, (len(paths) + 7) // 8), dtype=np.uint8),
+        'rules': rules,
+        'rule_counts': np.zeros((0, len(rules), 2), dtype=np.int32)
+    }
+
+    if store_file and os.path.exists(store_file):
+        with np.load(store_file) as saved:
+            if saved['paths'].tolist() != paths:
+                print(f"Specification paths changed, rebuilding {store_file}")
+            elif 'rules_key' not in saved or str(saved['rules_key']) != rules_key:
+                print(f"Rule set changed, rebuilding {store_file}")
+            else:
+                store['files'] = saved['files'].tolist()
+                store['signatures'] = saved['signatures']
+                store['bits'] = saved['bits']
+                store['rule_counts'] = saved['rule_counts']
+
+    return store
+
+def message_bitset(message_paths, path_ids, width):
+    """
+    Encode the paths of one message as a packed bitset.
+
+    Args:
+        message_paths (iterable): Absolute paths present in the message
+        path_ids (dict): Path to integer ID mapping of the store
+        width (int): Number of bytes per row
+
+    Returns:
+        numpy.ndarray: uint8 array of length width; paths outside the specification are ignored
+    """
+    present = np.zeros(width * 8, dtype=bool)
+    ids = [path_ids[path] for path in message_paths if path in path_ids]
+    present[ids] = True
+    return np.packbits(present)
+
+def update_coverage_store(store, files, prune=True):
+    """
+    Add new and modified files to the store and drop deleted ones.
+
+    Args:
+        store (dict): Store from open_coverage_store, updated in place
+        files (list): Every XML file of the corpus
+        prune (bool): Drop rows of files that are not in the list
+
+    Returns:
+        int: Number of files parsed
+    """
+    width = store['bits'].shape[1]
+    rows = {name: position for position, name in enumerate(store['files'])}
+    keep = np.ones(len(store['files']), dtype=bool)
+
+    if prune:
+        listed = set(files)
+        for name, position in rows.items():
+            if name not in listed:
+                keep[position] = False
+
+    new_files = []
+    new_signatures = []
+    new_bits = []
+    new_rule_counts = []
+
+    for xml_file in files:
+        try:
+            stat = os.stat(xml_file)
+        except OSError:
+            continue
+
+        signature = (stat.st_size, stat.st_mtime_ns)
+        position = rows.get(xml_file)
+        if position is not None and tuple(store['signatures'][position]) == signature:
+            continue
+
+        try:
+            index = build_message_index(ET.parse(xml_file).getroot())
+        except ET.ParseError as e:
+            print(f"  Skipping {os.path.basename(xml_file)}: {e}")
+            continue
+
+        if position is not None:
+            keep[position] = False
+
+        new_files.append(xml_file)
+        new_signatures.append(signature)
+        new_bits.append(message_bitset(index['paths'], store['path_ids'], width))
+
+        branches = message_rule_branches(store['rules'], index)
+        new_rule_counts.append([(branches[rule['rule_id']]['triggered'], branches[rule['rule_id']]['violations'])
+                                for rule in store['rules']])
+
+    if new_files or not keep.all():
+        store['files'] = [name for name, kept in zip(store['files'], keep) if kept] + new_files
+        store['signatures'] = np.concatenate([store['signatures'][keep],
+                                              np.array(new_signatures, dtype=np.int64).reshape(-1, 2)])
+        store['bits'] = np.concatenate([store['bits'][keep],
+                                        np.array(new_bits, dtype=np.uint8).reshape(-1, width)])
+        store['rule_counts'] = np.concatenate([store['rule_counts'][keep],
+                                               np.array(new_rule_counts, dtype=np.int32).reshape(-1, len(store['rules']), 2)])
+
+    return len(new_files)
+
+def save_coverage_store(store, store_file):
+    """
+    Save the store atomically.
+
+    Args:
+        store (dict): Store from open_coverage_store
+        store_file (str): Path to the .npz store file
+    """
+    temp_file = f"{store_file}.tmp.npz"
+    np.savez(temp_file, paths=np.array(store['paths']), files=np.array(store['files'], dtype=str),
+             signatures=store['signatures'], bits=store['bits'],
+             rules_key=np.array(_rules_key([rule['rule_id'] for rule in store['rules']])),
+             rule_counts=store['rule_counts'])
+    os.replace(temp_file, store_file)
+
+def _unpack(bits, path_count):
+    """Unpack packed rows into a boolean matrix over the path IDs."""
+    return np.unpackbits(bits, axis=1, count=path_count).astype(bool)
+
+def covered_paths(store):
+    """
+    Return the paths used by at least one message (the union of all bitsets).
+
+    Args:
+        store (dict): Store from open_coverage_store
+
+    Returns:
+        list: Covered specification paths
+    """
+    if not len(store['bits']):
+        return []
+    union = np.bitwise_or.reduce(store['bits'], axis=0)
+    return [store['paths'][position] for position in np.flatnonzero(_unpack(union.reshape(1, -1), len(store['paths']))[0])]
+
+def common_paths(store):
+    """
+    Return the paths used by every message (the intersection of all bitsets).
+
+    Args:
+        store (dict): Store from open_coverage_store
+
+    Returns:
+        list: Specification paths present in every message
+    """
+    if not len(store['bits']):
+        return []
+    intersection = np.bitwise_and.reduce(store['bits'], axis=0)
+    return [store['paths'][position] for position in np.flatnonzero(_unpack(intersection.reshape(1, -1), len(store['paths']))[0])]
+
+def path_counts(store):
+    """
+    Count the messages using each path.
+
+    Args:
+        store (dict): Store from open_coverage_store
+
+    Returns:
+        numpy.ndarray: int64 array with one count per path ID
+    """
+    counts = np.zeros(len(store['paths']), dtype=np.int64)
+    for start in range(0, len(store['bits']), COUNT_CHUNK_ROWS):
+        counts += _unpack(store['bits'][start:start + COUNT_CHUNK_ROWS], len(store['paths'])).sum(axis=0)
+    return counts
+
+def message_path_counts(store):
+    """
+    Count the specification paths each message uses.
+
+    Args:
+        store (dict): Store from open_coverage_store
+
+    Returns:
+        numpy.ndarray: int64 array with one count per message row
+    """
+    counts = np.zeros(len(store['bits']), dtype=np.int64)
+    for start in range(0, len(store['bits']), COUNT_CHUNK_ROWS):
+        counts[start:start + COUNT_CHUNK_ROWS] = np.unpackbits(store['bits'][start:start + COUNT_CHUNK_ROWS], axis=1).sum(axis=1)
+    return counts
+
+def messages_with_path(store, path):
+    """
+    List the messages that exercise a path.
+
+    Args:
+        store (dict): Store from open_coverage_store
+        path (str): Specification path
+
+    Returns:
+        list: File names of the messages using the path
+    """
+    position = store['path_ids'].get(path)
+    if position is None:
+        return []
+    mask = (store['bits'][:, position >> 3] & (0x80 >> (position & 7))) != 0
+    return [store['files'][row] for row in np.flatnonzero(mask)]
+
+def store_rule_coverage(store):
+    """
+    Aggregate the rule branches recorded in the store into corpus totals.
+
+    Args:
+        store (dict): Store opened with compiled rules
+
+    Returns:
+        dict: Totals in the form of rule_coverage.new_rule_coverage
+    """
+    coverage = new_rule_coverage(store['rules'])
+    coverage['messages'] = len(store['files'])
+
+    triggered = store['rule_counts'][:, :, 0]
+    violated = store['rule_counts'][:, :, 1]
+    for position, rule in enumerate(store['rules']):
+        totals = coverage['rules'][rule['rule_id']]
+        totals['branches']['not_triggered'] = int((triggered[:, position] == 0).sum())
+        totals['branches']['violated'] = int(((triggered[:, position] > 0) & (violated[:, position] > 0)).sum())
+        totals['branches']['satisfied'] = int(((triggered[:, position] > 0) & (violated[:, position] == 0)).sum())
+        totals['triggered'] = int(triggered[:, position].sum())
+        totals['violations'] = int(violated[:, position].sum())
+
+    return coverage
@@ -0,0 +1,365 @@
+"""
+Generate the messages that fill the specification paths a corpus leaves uncovered.
+
+The pacs.008 XSD is expanded from the Document element into a tree of sequence,
+choice and leaf nodes, one per specification path. Planning a message is a single
+bottom-up pass over that tree: every node is worth the number of still uncovered
+paths its subtree can reach, required children are always taken, optional
+children only when they add something, a choice takes its most valuable
+alternative and repeatable elements repeat while a further occurrence still
+covers new paths. Each planned message is the greedy step of a set cover over
+the uncovered paths, and messages are added until the target coverage is reached
+or no message can cover anything more.
+
+The usage rules of the message are folded into the tree so the generated
+messages pass them as well as the XSD: mutually exclusive elements become a
+choice between groups, elements made mandatory by a rule are always taken, and
+every agent carries the same BICFI so instructing and instructed agents match the
+debtor and creditor agents.
+"""
+import os
+import uuid
+from decimal import Decimal
+from lxml import etree
+
+from .rule_engine import STRUCTURED_ADDRESS_ELEMENTS, build_message_index
+from .xsd_facets import load_schema_types, strip_prefix, xs_name
+
+NAMESPACE = "urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08"
+
+DEFAULT_TARGET = 100.0
+
+# Upper bound for the occurrences of an unbounded element in one message
+MAX_REPEATS = 10
+
+# Mutually exclusive child groups per complex type, from the usage rules; on a tie
+# the first group wins, so the group that also satisfies the rules when empty comes first
+RULE_EXCLUSIVE_GROUPS = {
+    'PostalAddress24': (tuple(name for name in STRUCTURED_ADDRESS_ELEMENTS), ('AdrLine',)),
+    'RemittanceInformation16': (('Ustrd',), ('Strd',)),
+    'CreditTransferTransaction39': (('RmtInf',), ('RltdRmtInf',))
+}
+
+# Optional children a usage rule makes mandatory whenever their parent is present
+RULE_REQUIRED_CHILDREN = {
+    'PostalAddress24': ('TwnNm', 'Ctry'),
+    'PartyIdentification135': ('Nm',),
+    'FinancialInstitutionIdentification18': ('BICFI',)
+}
+
+# Values for the simple types whose pattern a generic value cannot satisfy
+EXAMPLE_VALUES = {
+    'ActiveCurrencyCode': 'CAD',
+    'ActiveOrHistoricCurrencyCode': 'CAD',
+    'AnyBICDec2014Identifier': 'ABCDUS33XXX',
+    'BICFIDec2014Identifier': 'ABCDUS33XXX',
+    'CountryCode': 'CA',
+    'Exact4AlphaNumericText': 'ABCD',
+    'IBAN2007Identifier': 'GB82WEST12345698765432',
+    'LEIIdentifier': '529900T8BM49AURSDO55',
+    'Max15NumericText': '1',
+    'PhoneNumber': '+1-5555555555'
+}
+
+# Values of the built-in types the remaining simple types derive from
+BUILTIN_VALUES = {
+    'date': '2025-01-15',
+    'dateTime': '2025-01-15T10:00:00Z',
+    'time': '10:00:00Z',
+    'boolean': 'false'
+}
+
+SETTLEMENT_AMOUNT = Decimal('100.00')
+
+# Identifiers that must be unique per message or transaction
+UNIQUE_IDENTIFIERS = ('MsgId', 'InstrId', 'EndToEndId', 'TxId')
+
+def build_schema_tree(xsd_file):
+    """
+    Expand the message schema into a tree with one node per specification path.
+
+    Args:
+        xsd_file (str): Path to the pacs.008 XSD schema file
+
+    Returns:
+        dict: Root node for /Document. Each node has 'name', 'path', 'type',
+        'min', 'max', 'kind' ('leaf', 'sequence', 'choice' or 'any'), 'facet',
+        'attributes', 'children', 'groups' and 'required'
+    """
+    schema, simple_types, complex_types = load_schema_types(xsd_file)
+
+    def build(name, path, type_name, min_occurs, max_occurs, stack):
+        node = {'name': name, 'path': path, 'type': type_name, 'min': min_occurs, 'max': max_occurs,
+                'kind': 'leaf', 'facet': simple_types.get(type_name), 'attributes': [],
+                'children': [], 'groups': RULE_EXCLUSIVE_GROUPS.get(type_name, ()),
+                'required': set(RULE_REQUIRED_CHILDREN.get(type_name, ()))}
+
+        definition = complex_types.get(type_name)
+        if definition is None or type_name in stack:
+            return node
+
+        extension = definition.find(f"{xs_name('simpleContent')}/{xs_name('extension')}")
+        if extension is not None:
+            node['facet'] = simple_types.get(strip_prefix(extension.get('base')))
+            for attribute in extension.findall(xs_name('attribute')):
+                node['attributes'].append({
+                    'name': attribute.get('name'),
+                    'path': f"{path}/@{attribute.get('name')}",
+                    'facet': simple_types.get(strip_prefix(attribute.get('type'))),
+                    'required': attribute.get('use') == 'required'
+                })
+            return node
+
+        for model in ('sequence', 'choice'):
+            group = definition.find(xs_name(model))
+            if group is None:
+                continue
+            node['kind'] = model
+            if group.find(xs_name('any')) is not None:
+                node['kind'] = 'any'
+            for element in group.findall(xs_name('element')):
+                maximum = element.get('maxOccurs', '1')
+                node['children'].append(build(
+                    element.get('name'), f"{path}/{element.get('name')}", strip_prefix(element.get('type')),
+                    int(element.get('minOccurs', '1')), MAX_REPEATS if maximum == 'unbounded' else int(maximum),
+                    stack | {type_name}))
+        return node
+
+    root = schema.find(xs_name('element'))
+    return build(root.get('name'), f"/{root.get('name')}", strip_prefix(root.get('type')), 1, 1, frozenset())
+
+def schema_paths(tree):
+    """
+    List every path a generated message can reach.
+
+    Args:
+        tree (dict): Root node from build_schema_tree
+
+    Returns:
+        set: Element and attribute paths of the tree
+    """
+    paths = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        paths.add(node['path'])
+        paths.update(attribute['path'] for attribute in node['attributes'])
+        stack.extend(node['children'])
+    return paths
+
+def _instance(node, attributes, children, paths, gain):
+    """Build a planned element occurrence."""
+    return {'node': node, 'attributes': attributes, 'children': children, 'paths': paths, 'gain': gain}
+
+def _better(candidate, best):
+    """Prefer more new paths, then the smaller plan."""
+    return best is None or (candidate['gain'], -len(candidate['paths'])) > (best['gain'], -len(best['paths']))
+
+def _plan_children(children, required, uncovered):
+    """Plan the occurrences of the children of a sequence, or of one exclusive group."""
+    planned = []
+    for child in children:
+        pending = uncovered
+        occurrences = 0
+        while occurrences < child['max']:
+            occurrence = plan_element(child, pending)
+            mandatory = occurrences < child['min'] or (occurrences == 0 and child['name'] in required)
+            if not mandatory and occurrence['gain'] <= 0:
+                break
+            planned.append(occurrence)
+            pending = pending - occurrence['paths']
+            occurrences += 1
+    return planned
+
+def plan_element(node, uncovered):
+    """
+    Plan one occurrence of an element that covers as many uncovered paths as possible.
+
+    Args:
+        node (dict): Node from build_schema_tree
+        uncovered (set): Paths still to cover
+
+    Returns:
+        dict: Planned occurrence with 'node', 'attributes', 'children' (planned
+        child occurrences), 'paths' (every path it uses) and 'gain' (the number
+        of those paths in uncovered)
+    """
+    paths = {node['path']}
+    attributes = [attribute for attribute in node['attributes']
+                  if attribute['required'] or attribute['path'] in uncovered]
+    paths.update(attribute['path'] for attribute in attributes)
+
+    children = []
+    if node['kind'] == 'choice':
+        best = None
+        for child in node['children']:
+            candidate = plan_element(child, uncovered)
+            if _better(candidate, best):
+                best = candidate
+        children = [best] if best is not None else []
+    elif node['kind'] == 'sequence':
+        grouped = {name for group in node['groups'] for name in group}
+        children = _plan_children([child for child in node['children'] if child['name'] not in grouped],
+                                  node['required'], uncovered)
+
+        if node['groups']:
+            best = None
+            for names in node['groups']:
+                members = [child for child in node['children'] if child['name'] in names]
+                planned = _plan_children(members, node['required'], uncovered)
+                candidate = _instance(None, [], planned, set().union(*(item['paths'] for item in planned)),
+                                      sum(item['gain'] for item in planned))
+                if _better(candidate, best):
+                    best = candidate
+            children.extend(best['children'])
+            order = {child['name']: position for position, child in enumerate(node['children'])}
+            children.sort(key=lambda item: order[item['node']['name']])
+
+    for child in children:
+        paths |= child['paths']
+
+    return _instance(node, attributes, children, paths, len(paths & uncovered))
+
+def plan_cover(tree, covered, spec_paths, target=DEFAULT_TARGET, max_messages=None):
+    """
+    Plan the messages that bring the coverage of the specification paths to a target.
+
+    Args:
+        tree (dict): Root node from build_schema_tree
+        covered (set): Specification paths the corpus already covers
+        spec_paths (set): Every path of the specification
+        target (float): Target coverage percentage
+        max_messages (int, optional): Maximum number of messages to plan
+
+    Returns:
+        tuple: List of planned Document occurrences, and the set of specification
+        paths covered by the corpus and the plans together
+    """
+    spec_paths = set(spec_paths)
+    covered = set(covered) & spec_paths
+    uncovered = (spec_paths - covered) & schema_paths(tree)
+    needed = target / 100 * len(spec_paths)
+
+    plans = []
+    while uncovered and len(covered) < needed and (max_messages is None or len(plans) < max_messages):
+        plan = plan_element(tree, uncovered)
+        if plan['gain'] <= 0:
+            break
+        plans.append(plan)
+        covered |= plan['paths'] & spec_paths
+        uncovered -= plan['paths']
+
+    return plans, covered
+
+def example_value(node, facet, counters):
+    """
+    Pick a value of an element or attribute that satisfies its simple type.
+
+    Args:
+        node (dict): Node (or attribute) the value is for
+        facet (dict): Facet dictionary of its simple type
+        counters (dict): Message and transaction numbers used for unique identifiers
+
+    Returns:
+        str: Value text
+    """
+    name = node['name']
+    if name in UNIQUE_IDENTIFIERS:
+        return f"COV-{counters['message']}-{counters['transaction']}-{name}"[:35]
+    if name == 'UETR' or (facet and facet['type'] == 'UUIDv4Identifier'):
+        return str(uuid.uuid4())
+    if facet is None:
+        return name
+
+    if facet['enumeration']:
+        return sorted(facet['enumeration'])[0]
+    if facet['type'] in EXAMPLE_VALUES:
+        return EXAMPLE_VALUES[facet['type']]
+    if facet['base'] in BUILTIN_VALUES:
+        return BUILTIN_VALUES[facet['base']]
+
+    if facet['base'] == 'decimal':
+        if facet.get('fractionDigits') == 0 or name == 'XchgRate':
+            return '1'
+        if facet['type'].endswith('Amount_SimpleType'):
+            return f"{SETTLEMENT_AMOUNT}" if name in ('IntrBkSttlmAmt', 'InstdAmt') else '0.00'
+        return '1.00'
+
+    value = name
+    if 'length' in facet:
+        value = (value * facet['length'])[:facet['length']]
+    if 'maxLength' in facet:
+        value = value[:facet['maxLength']]
+    if 'minLength' in facet and len(value) < facet['minLength']:
+        value = value.ljust(facet['minLength'], 'X')
+    return value
+
+def render_message(plan, message_number=1):
+    """
+    Render a planned Document occurrence as an XML tree.
+
+    Group header totals are recomputed from the rendered transactions, so
+    NbOfTxs, CtrlSum and TtlIntrBkSttlmAmt stay consistent.
+
+    Args:
+        plan (dict): Planned Document occurrence from plan_cover
+        message_number (int): Number of the message, used in its identifiers
+
+    Returns:
+        lxml.etree._Element: Document element
+    """
+    counters = {'message': message_number, 'transaction': 0}
+
+    def render(instance, parent):
+        node = instance['node']
+        if parent is None:
+            elem = etree.Element(f"{{{NAMESPACE}}}{node['name']}", nsmap={None: NAMESPACE})
+        else:
+            elem = etree.SubElement(parent, f"{{{NAMESPACE}}}{node['name']}")
+
+        if node['name'] == 'CdtTrfTxInf':
+            counters['transaction'] += 1
+
+        for attribute in instance['attributes']:
+            elem.set(attribute['name'], example_value(attribute, attribute['facet'], counters))
+
+        if node['kind'] == 'leaf':
+            elem.text = example_value(node, node['facet'], counters)
+        elif node['kind'] == 'any':
+            etree.SubElement(elem, f"{{{NAMESPACE}}}Any").text = node['name']
+
+        for child in instance['children']:
+            render(child, elem)
+        return elem
+
+    root = render(plan, None)
+
+    transactions = root.findall(f"{{{NAMESPACE}}}FIToFICstmrCdtTrf/{{{NAMESPACE}}}CdtTrfTxInf")
+    total = sum((Decimal(amount.text) for transaction in transactions
+                 for amount in transaction.findall(f"{{{NAMESPACE}}}IntrBkSttlmAmt")), Decimal(0))
+    header = root.find(f"{{{NAMESPACE}}}FIToFICstmrCdtTrf/{{{NAMESPACE}}}GrpHdr")
+    for name, value in (('NbOfTxs', str(len(transactions))), ('CtrlSum', str(total)),
+                        ('TtlIntrBkSttlmAmt', str(total))):
+        elem = header.find(f"{{{NAMESPACE}}}{name}")
+        if elem is not None:
+            elem.text = value
+
+    return root
+
+def corpus_paths(xml_files):
+    """
+    Collect the paths used by a corpus of messages.
+
+    Args:
+        xml_files (list): List of XML file paths
+
+    Returns:
+        set: Absolute element and attribute paths present in at least one message
+    """
+    paths = set()
+    for xml_file in xml_files:
+        try:
+            paths.update(build_message_index(etree.parse(xml_file).getroot())['paths'])
+        except etree.XMLSyntaxError as e:
+            print(f"  Skipping {os.path.basename(xml_file)}: {e}")
+    return paths
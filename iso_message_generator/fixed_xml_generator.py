@@ -2,10 +2,12 @@
 Generate ISO 20022 XML messages based on payment scenarios.
 """
 import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
 import os
 
-def create_sample_xml(scenario, message_structure, output_dir=None):
+from .c14n import write_if_changed
+from .xml_formatter import serialize_message
+
+def create_sample_xml(scenario, message_structure, output_dir=None, compact=False, xml_declaration=True):
     """
     Create a sample XML message for a payment scenario.
     
@@ -13,9 +15,11 @@ def create_sample_xml(scenario, message_structure, output_dir=None):
         scenario (dict): Dictionary containing payment scenario information
         message_structure (dict): Dictionary containing the message structure
         output_dir (str, optional): Directory to save the XML file. If None, the XML is returned as a string.
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
         
     Returns:
-        str: Pretty-printed XML string
+        str: XML string in the requested output mode
     """
     root = ET.Element("Document")
     root.set("xmlns", "urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08")
@@ -58,9 +62,7 @@ def create_sample_xml(scenario, message_structure, output_dir=None):
         else:
             ET.SubElement(current_element, leaf_name).text = value
     
-    rough_string = ET.tostring(root, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    pretty_xml = reparsed.toprettyxml(indent="  ")
+    xml = serialize_message(ET.tostring(root, 'utf-8'), compact, xml_declaration)
     
     if output_dir:
         os.makedirs(output_dir, exist_ok=True)
@@ -68,9 +70,10 @@ def create_sample_xml(scenario, message_structure, output_dir=None):
         filename = f"{scenario['name'].replace(' ', '_').lower()}.xml"
         file_path = os.path.join(output_dir, filename)
         
-        with open(file_path, 'w') as f:
-            f.write(pretty_xml)
-        
-        print(f"Saved sample message to {file_path}")
+        size = len(xml.encode('utf-8'))
+        if write_if_changed(file_path, xml, compare='bytes'):
+            print(f"Saved sample message to {file_path} ({size} bytes)")
+        else:
+            print(f"Sample message {file_path} is unchanged ({size} bytes)")
     
-    return pretty_xml
+    return xml
@@ -0,0 +1,280 @@
+"""
+Stream pacs.008 messages as compact typed records, one per transaction.
+
+The message is read with iterparse and every CdtTrfTxInf is turned into a
+Transaction record as soon as its end tag is parsed, then cleared together with
+the siblings before it, so memory stays flat however many transactions a file
+holds. Records use __slots__ and share the GroupHeader record of their message
+by reference. Tag names are resolved to interned local names through a cache,
+so the namespace is stripped once per distinct tag instead of once per element.
+
+Amounts, control sums and exchange rates are Decimals, the number of
+transactions is an int, dates and date-times are kept as their ISO strings.
+A value that does not convert is read as None; amount_checks and the XSD
+validation report why.
+"""
+import sys
+from decimal import Decimal, InvalidOperation
+
+from lxml import etree
+
+class GroupHeader:
+    """Group header of a message, shared by all of its Transaction records."""
+
+    __slots__ = ('source', 'msg_id', 'cre_dt_tm', 'nb_of_txs', 'ctrl_sum', 'ttl_amount', 'ttl_currency',
+                 'sttlm_mtd', 'instg_agt', 'instd_agt', 'line')
+
+    def __init__(self, source=None):
+        self.source = source
+        self.msg_id = self.cre_dt_tm = self.nb_of_txs = self.ctrl_sum = None
+        self.ttl_amount = self.ttl_currency = self.sttlm_mtd = None
+        self.instg_agt = self.instd_agt = self.line = None
+
+    def __repr__(self):
+        return f"GroupHeader(msg_id={self.msg_id!r}, nb_of_txs={self.nb_of_txs!r})"
+
+class Transaction:
+    """One CdtTrfTxInf of a message."""
+
+    __slots__ = ('header', 'index', 'line', 'instr_id', 'end_to_end_id', 'tx_id', 'uetr',
+                 'amount', 'currency', 'sttlm_dt', 'instd_amount', 'instd_currency', 'xchg_rate', 'chrg_br',
+                 'dbtr_name', 'dbtr_account', 'dbtr_agt', 'cdtr_name', 'cdtr_account', 'cdtr_agt',
+                 'instg_agt', 'instd_agt', 'purpose', 'remittance')
+
+    def __init__(self, header, index, line):
+        self.header = header
+        self.index = index
+        self.line = line
+        self.instr_id = self.end_to_end_id = self.tx_id = self.uetr = None
+        self.amount = self.currency = self.sttlm_dt = None
+        self.instd_amount = self.instd_currency = self.xchg_rate = self.chrg_br = None
+        self.dbtr_name = self.dbtr_account = self.dbtr_agt = None
+        self.cdtr_name = self.cdtr_account = self.cdtr_agt = None
+        self.instg_agt = self.instd_agt = self.purpose = self.remittance = None
+
+    def __repr__(self):
+        return (f"Transaction(index={self.index!r}, end_to_end_id={self.end_to_end_id!r}, "
+                f"amount={self.amount!r}, currency={self.currency!r})")
+
+# Fields of a Transaction, in the order they are exported
+TRANSACTION_FIELDS = tuple(name for name in Transaction.__slots__ if name != 'header')
+
+# Fields of a GroupHeader, in the order they are exported
+HEADER_FIELDS = tuple(name for name in GroupHeader.__slots__ if name != 'source')
+
+# Namespaced tag to interned local name, filled as tags are met
+_tag_names = {}
+
+def local_name(tag):
+    """
+    Resolve an lxml tag to its interned local name.
+
+    Args:
+        tag: Element tag, a str or, for comments and processing instructions, a function
+
+    Returns:
+        str: Interned local name, or None for comments and processing instructions
+    """
+    name = _tag_names.get(tag)
+    if name is None:
+        if not isinstance(tag, str):
+            return None
+        name = _tag_names[tag] = sys.intern(tag.rsplit('}', 1)[-1])
+    return name
+
+def _text(elem):
+    """Stripped text of an element, None if it is empty."""
+    text = elem.text
+    if text is None:
+        return None
+    return text.strip() or None
+
+def _decimal(text):
+    """Convert text to a Decimal, None if it is missing or not a number."""
+    if text is None:
+        return None
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        return None
+
+def _child_text(elem, *names):
+    """Text of the first descendant reached through the given child names, None if absent."""
+    for name in names:
+        for child in elem:
+            if (_tag_names.get(child.tag) or local_name(child.tag)) == name:
+                elem = child
+                break
+        else:
+            return None
+    return _text(elem)
+
+def _agent_bic(elem):
+    """BIC of a BranchAndFinancialInstitutionIdentification."""
+    return _child_text(elem, 'FinInstnId', 'BICFI')
+
+def _account_id(elem):
+    """IBAN or other identification of a CashAccount."""
+    return _child_text(elem, 'Id', 'IBAN') or _child_text(elem, 'Id', 'Othr', 'Id')
+
+def _read_header(elem, header):
+    """Fill a GroupHeader record from a parsed GrpHdr element."""
+    header.line = elem.sourceline
+    for child in elem:
+        name = local_name(child.tag)
+        if name == 'MsgId':
+            header.msg_id = _text(child)
+        elif name == 'CreDtTm':
+            header.cre_dt_tm = _text(child)
+        elif name == 'NbOfTxs':
+            text = _text(child)
+            header.nb_of_txs = int(text) if text and text.isdigit() else None
+        elif name == 'CtrlSum':
+            header.ctrl_sum = _decimal(_text(child))
+        elif name == 'TtlIntrBkSttlmAmt':
+            header.ttl_amount = _decimal(_text(child))
+            header.ttl_currency = child.get('Ccy')
+        elif name == 'SttlmInf':
+            header.sttlm_mtd = _child_text(child, 'SttlmMtd')
+        elif name == 'InstgAgt':
+            header.instg_agt = _agent_bic(child)
+        elif name == 'InstdAgt':
+            header.instd_agt = _agent_bic(child)
+
+def _read_transaction(elem, record):
+    """Fill a Transaction record from a parsed CdtTrfTxInf element."""
+    # The cache is read inline, these loops run for every element of every transaction
+    for child in elem:
+        name = _tag_names.get(child.tag) or local_name(child.tag)
+        if name == 'PmtId':
+            for item in child:
+                item_name = _tag_names.get(item.tag) or local_name(item.tag)
+                if item_name == 'InstrId':
+                    record.instr_id = _text(item)
+                elif item_name == 'EndToEndId':
+                    record.end_to_end_id = _text(item)
+                elif item_name == 'TxId':
+                    record.tx_id = _text(item)
+                elif item_name == 'UETR':
+                    record.uetr = _text(item)
+        elif name == 'IntrBkSttlmAmt':
+            record.amount = _decimal(_text(child))
+            record.currency = child.get('Ccy')
+        elif name == 'IntrBkSttlmDt':
+            record.sttlm_dt = _text(child)
+        elif name == 'InstdAmt':
+            record.instd_amount = _decimal(_text(child))
+            record.instd_currency = child.get('Ccy')
+        elif name == 'XchgRate':
+            record.xchg_rate = _decimal(_text(child))
+        elif name == 'ChrgBr':
+            record.chrg_br = _text(child)
+        elif name == 'InstgAgt':
+            record.instg_agt = _agent_bic(child)
+        elif name == 'InstdAgt':
+            record.instd_agt = _agent_bic(child)
+        elif name == 'Dbtr':
+            record.dbtr_name = _child_text(child, 'Nm')
+        elif name == 'DbtrAcct':
+            record.dbtr_account = _account_id(child)
+        elif name == 'DbtrAgt':
+            record.dbtr_agt = _agent_bic(child)
+        elif name == 'CdtrAgt':
+            record.cdtr_agt = _agent_bic(child)
+        elif name == 'Cdtr':
+            record.cdtr_name = _child_text(child, 'Nm')
+        elif name == 'CdtrAcct':
+            record.cdtr_account = _account_id(child)
+        elif name == 'Purp':
+            record.purpose = _child_text(child, 'Cd') or _child_text(child, 'Prtry')
+        elif name == 'RmtInf':
+            lines = [_text(item) for item in child if local_name(item.tag) == 'Ustrd' and _text(item)]
+            record.remittance = ' '.join(lines) if lines else None
+
+def iter_transactions(source):
+    """
+    Stream a pacs.008 message and yield one record per transaction.
+
+    The group header precedes the transactions in a pacs.008 message, so every
+    record refers to the complete GroupHeader of its message.
+
+    Args:
+        source (str or file): Path to the XML file or a binary file object
+
+    Yields:
+        Transaction: Record per CdtTrfTxInf, in document order
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If the message is not well-formed
+    """
+    header = GroupHeader(source if isinstance(source, str) else getattr(source, 'name', None))
+    index = 0
+
+    context = etree.iterparse(source, events=('end',), tag=('{*}GrpHdr', '{*}CdtTrfTxInf'),
+                              remove_comments=True, huge_tree=True)
+
+    for _, elem in context:
+        if local_name(elem.tag) == 'GrpHdr':
+            _read_header(elem, header)
+        else:
+            record = Transaction(header, index, elem.sourceline)
+            _read_transaction(elem, record)
+            index += 1
+            yield record
+
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+def read_header(source):
+    """
+    Read only the group header of a message, stopping before the transactions.
+
+    Args:
+        source (str or file): Path to the XML file or a binary file object
+
+    Returns:
+        GroupHeader: Header record, with every field None if the message has no GrpHdr
+    """
+    header = GroupHeader(source if isinstance(source, str) else getattr(source, 'name', None))
+    for _, elem in etree.iterparse(source, events=('end',), tag='{*}GrpHdr', remove_comments=True, huge_tree=True):
+        _read_header(elem, header)
+        break
+    return header
+
+def record_values(record, fields=TRANSACTION_FIELDS, header_fields=()):
+    """
+    Flatten a transaction record into a tuple of values.
+
+    Args:
+        record (Transaction): Record from iter_transactions
+        fields (tuple): Transaction fields to take, in order
+        header_fields (tuple): GroupHeader fields to append, in order
+
+    Returns:
+        tuple: Field values
+    """
+    header = record.header
+    return tuple(getattr(record, name) for name in fields) + tuple(getattr(header, name) for name in header_fields)
+
+def record_to_dict(record, header_fields=HEADER_FIELDS):
+    """
+    Convert a transaction record into a dictionary, for JSON output.
+
+    Decimals are converted to strings so no precision is lost.
+
+    Args:
+        record (Transaction): Record from iter_transactions
+        header_fields (tuple): GroupHeader fields to include, prefixed with 'header_'
+
+    Returns:
+        dict: Field name to value
+    """
+    result = {}
+    for name in TRANSACTION_FIELDS:
+        value = getattr(record, name)
+        result[name] = str(value) if isinstance(value, Decimal) else value
+    for name in header_fields:
+        value = getattr(record.header, name)
+        result[f"header_{name}"] = str(value) if isinstance(value, Decimal) else value
+    return result
@@ -0,0 +1,258 @@
+"""
+Resolve return and related payments against the original payments they reference.
+
+pacs.008 has no original transaction block, so the return scenario carries the
+reference of the original payment in PmtId/ClrSysRef. Every transaction is
+reduced to a small record with its identifiers, settlement amount and parties.
+Originals are looked up by TxId, EndToEndId, UETR or MsgId, either in an indexed
+SQLite message store for incremental checks, or with an in-memory hash join when
+a whole corpus is reconciled at once. Resolved returns are checked for matching
+currency, amount (allowing for charges) and swapped debtor and creditor.
+"""
+import os
+import sqlite3
+from decimal import Decimal, InvalidOperation
+
+DEFAULT_STORE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".message_store.sqlite")
+
+# Transaction-relative paths holding the reference of an original payment
+REFERENCE_PATHS = ('PmtId/ClrSysRef',)
+
+# Identifiers an original payment can be found by, in lookup order
+ORIGINAL_KEYS = ('TxId', 'EndToEndId', 'UETR', 'MsgId')
+
+def _first(component, path):
+    """Return the first non-empty value of a path in a transaction or header index."""
+    entry = component.get(path)
+    if entry:
+        for value in entry['values']:
+            if value:
+                return value
+    return None
+
+def transaction_records(message_index, source=None):
+    """
+    Reduce the transactions of a message to reference records.
+
+    Args:
+        message_index (dict): Message index from rule_engine.build_message_index
+        source (str, optional): Name of the message
+
+    Returns:
+        list: List of dictionaries with 'file', 'index', 'identifiers' (kind to
+        value), 'references', 'amount', 'ccy', 'charges', 'debtor' and 'creditor'
+    """
+    msg_id = _first(message_index['header'], 'MsgId')
+    records = []
+
+    for position, transaction in enumerate(message_index['transactions']):
+        identifiers = {'MsgId': msg_id}
+        for kind in ('TxId', 'EndToEndId', 'UETR'):
+            identifiers[kind] = _first(transaction, f"PmtId/{kind}")
+
+        charges = Decimal(0)
+        for value in (transaction.get('ChrgsInf/Amt') or {'values': []})['values']:
+            try:
+                charges += Decimal(value)
+            except InvalidOperation:
+                pass
+
+        records.append({
+            'file': source,
+            'index': position,
+            'identifiers': {kind: value for kind, value in identifiers.items() if value},
+            'references': [value for path in REFERENCE_PATHS
+                           for value in (transaction.get(path) or {'values': []})['values'] if value],
+            'amount': _first(transaction, 'IntrBkSttlmAmt'),
+            'ccy': _first(transaction, 'IntrBkSttlmAmt/@Ccy'),
+            'charges': str(charges),
+            'debtor': _first(transaction, 'Dbtr/Nm') or _first(transaction, 'Dbtr/Id/OrgId/AnyBIC'),
+            'creditor': _first(transaction, 'Cdtr/Nm') or _first(transaction, 'Cdtr/Id/OrgId/AnyBIC')
+        })
+
+    return records
+
+def check_return(record, original):
+    """
+    Check a return or related payment against its original.
+
+    Args:
+        record (dict): Reference record of the return
+        original (dict): Reference record of the original payment
+
+    Returns:
+        list: List of error messages, empty if the return is consistent
+    """
+    errors = []
+
+    if record['ccy'] and original['ccy'] and record['ccy'] != original['ccy']:
+        errors.append(f"Currency {record['ccy']} differs from the original {original['ccy']}")
+
+    try:
+        amount = Decimal(record['amount'])
+        original_amount = Decimal(original['amount'])
+        if amount > original_amount:
+            errors.append(f"Amount {amount} exceeds the original amount {original_amount}")
+        elif original_amount - amount > Decimal(record['charges']):
+            errors.append(f"Amount {amount} is below the original amount {original_amount} by more than the charges")
+    except (InvalidOperation, TypeError):
+        errors.append("Amount of the return or the original is missing or not a decimal number")
+
+    if record['debtor'] and original['creditor'] and record['debtor'] != original['creditor']:
+        errors.append(f"Debtor '{record['debtor']}' is not the original creditor '{original['creditor']}'")
+    if record['creditor'] and original['debtor'] and record['creditor'] != original['debtor']:
+        errors.append(f"Creditor '{record['creditor']}' is not the original debtor '{original['debtor']}'")
+
+    return errors
+
+def _finding(record, reference, original):
+    """Build the finding for one reference of a return or related payment."""
+    return {
+        'file': record['file'],
+        'index': record['index'],
+        'reference': reference,
+        'original': None if original is None else {'file': original['file'], 'index': original['index']},
+        'errors': ["Referenced original payment not found"] if original is None else check_return(record, original)
+    }
+
+def reconcile_records(records):
+    """
+    Resolve every reference in a corpus with a hash join over the identifiers.
+
+    Args:
+        records (list): Reference records from transaction_records for the whole corpus
+
+    Returns:
+        list: List of findings with 'file', 'index', 'reference', 'original' and 'errors'
+    """
+    build = {}
+    for record in records:
+        for kind in ORIGINAL_KEYS:
+            value = record['identifiers'].get(kind)
+            if value:
+                build.setdefault((kind, value), record)
+
+    findings = []
+    for record in records:
+        for reference in record['references']:
+            original = None
+            for kind in ORIGINAL_KEYS:
+                candidate = build.get((kind, reference))
+                if candidate is not None and candidate is not record:
+                    original = candidate
+                    break
+            findings.append(_finding(record, reference, original))
+
+    return findings
+
+def open_message_store(store_file=None):
+    """
+    Open (and create if needed) the indexed message store.
+
+    Args:
+        store_file (str, optional): Path to the SQLite file, defaults to .message_store.sqlite in the repository
+
+    Returns:
+        sqlite3.Connection: Open store connection
+    """
+    conn = sqlite3.connect(store_file or DEFAULT_STORE_FILE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY,
+            file TEXT,
+            tx_index INTEGER NOT NULL,
+            amount TEXT,
+            ccy TEXT,
+            charges TEXT,
+            debtor TEXT,
+            creditor TEXT,
+            UNIQUE (file, tx_index)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS identifiers (
+            kind TEXT NOT NULL,
+            value TEXT NOT NULL,
+            transaction_id INTEGER NOT NULL,
+            PRIMARY KEY (kind, value, transaction_id)
+        ) WITHOUT ROWID
+    """)
+    return conn
+
+def add_records(conn, records, files=None):
+    """
+    Add reference records to the message store, replacing earlier versions of the same file.
+
+    Every stored transaction of a replaced file is removed first, so a file that
+    now holds fewer transactions, or none, leaves no stale rows behind.
+
+    Args:
+        conn (sqlite3.Connection): Open store connection
+        records (list): Reference records from transaction_records
+        files (iterable, optional): Files the records were read from, including
+            files without transactions, defaults to the files of the records
+    """
+    replaced = set(files) if files is not None else set()
+    replaced.update(record['file'] for record in records)
+    for file in replaced:
+        conn.execute("DELETE FROM identifiers WHERE transaction_id IN (SELECT id FROM transactions WHERE file = ?)",
+                     (file,))
+        conn.execute("DELETE FROM transactions WHERE file = ?", (file,))
+
+    for record in records:
+        transaction_id = conn.execute(
+            "INSERT INTO transactions (file, tx_index, amount, ccy, charges, debtor, creditor) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record['file'], record['index'], record['amount'], record['ccy'], record['charges'],
+             record['debtor'], record['creditor'])).lastrowid
+        conn.executemany("INSERT OR IGNORE INTO identifiers (kind, value, transaction_id) VALUES (?, ?, ?)",
+                         [(kind, value, transaction_id) for kind, value in record['identifiers'].items()])
+
+def find_original(conn, reference, exclude=None):
+    """
+    Look up the original payment a reference points to.
+
+    Args:
+        conn (sqlite3.Connection): Open store connection
+        reference (str): Reference value carried by the return
+        exclude (tuple, optional): (file, index) of the referencing transaction itself
+
+    Returns:
+        dict: Reference record of the original payment, or None if it is not in the store
+    """
+    for kind in ORIGINAL_KEYS:
+        for row in conn.execute("""
+            SELECT t.file, t.tx_index, t.amount, t.ccy, t.charges, t.debtor, t.creditor
+            FROM identifiers i JOIN transactions t ON t.id = i.transaction_id
+            WHERE i.kind = ? AND i.value = ?
+        """, (kind, reference)):
+            if exclude is not None and (row[0], row[1]) == tuple(exclude):
+                continue
+            return {'file': row[0], 'index': row[1], 'amount': row[2], 'ccy': row[3],
+                    'charges': row[4], 'debtor': row[5], 'creditor': row[6]}
+    return None
+
+def check_references(conn, records):
+    """
+    Resolve the references of reference records against the message store.
+
+    Args:
+        conn (sqlite3.Connection): Open store connection
+        records (list): Reference records from transaction_records
+
+    Returns:
+        list: List of findings with 'file', 'index', 'reference', 'original' and 'errors'
+    """
+    return [_finding(record, reference, find_original(conn, reference, (record['file'], record['index'])))
+            for record in records for reference in record['references']]
+
+def close_message_store(conn):
+    """
+    Commit and close the message store.
+
+    Args:
+        conn (sqlite3.Connection): Open store connection
+    """
+    conn.commit()
+    conn.close()
@@ -0,0 +1,646 @@
+"""
+Repair messages with a registry of tree transforms keyed by the XSD errors they fix.
+
+Each repair is registered with the lxml error types it resolves and the elements
+it applies to, and is written so that it only changes an element that still
+shows the error: running the repairs over a repaired message changes nothing.
+A message is parsed once (with libxml2 recovery if it is not well-formed, which
+replaces the tag-closing loops of the old fix scripts), every repair runs during
+a single walk over the tree, and the tree is serialized once.
+
+Repairs that need to know the schema (element order, allowed children, the code
+or proprietary choice of a component) use a path-keyed table compiled from the
+XSD; without it only the schema-independent repairs run.
+"""
+import difflib
+import multiprocessing
+import os
+import re
+import signal
+import time
+
+from lxml import etree
+
+from .atomic_files import atomic_write
+from .coverage_generator import build_schema_tree
+from .xml_formatter import format_bytes, output_options
+from .xsd_facets import check_value
+
+# Pseudo repair reported when a message that is not well-formed is recovered by libxml2
+RECOVER_REPAIR = 'recover_markup'
+
+REPAIRS = {}
+
+# BICs of the early sample generators that no pattern fix can turn into a valid BIC
+LEGACY_BICS = {
+    'INSTGAGT0XXX': 'ABCDUS22XXX',
+    'INSTDAGT0XXX': 'EFGHCA33XXX',
+    'INSTABCD0XXX': 'ABCDUS22XXX',
+    'INSTXYZW0XXX': 'EFGHCA33XXX'
+}
+
+BIC_PATTERN = re.compile(r'[A-Z0-9]{4}[A-Z]{2}[A-Z0-9]{2}([A-Z0-9]{3})?')
+
+# Currency written into the amount text, as in '1000.00" Ccy="CAD' or '1000.00 Ccy="CAD"'
+AMOUNT_CURRENCY_TEXT = re.compile(r'\s*([^\s"]+)"?\s+Ccy="?([A-Z]{3})"?\s*')
+
+_strict_parser = etree.XMLParser(resolve_entities=False, huge_tree=True)
+
+_recover_parser = etree.XMLParser(recover=True, resolve_entities=False, huge_tree=True)
+
+_repair_schemas = {}
+
+PHASES = ('structure', 'content')
+
+def register_repair(name, error_types, elements=None, needs_schema=False, phase='content'):
+    """
+    Register a tree repair.
+
+    The decorated function is called as function(elem, node, ancestors) for
+    every element the repair applies to, where node is the schema table entry of
+    the element (None if the schema is not loaded or does not know the element)
+    and ancestors lists the (element, node) pairs from the root down to the
+    parent. It returns True if it changed the tree.
+
+    Args:
+        name (str): Repair name used in reports and to select repairs
+        error_types (tuple): lxml error type names the repair resolves
+        elements (tuple, optional): Local names of the elements it applies to,
+            None for every element
+        needs_schema (bool): Skip the repair when no schema table is loaded
+        phase (str): 'structure' for repairs that move elements back where
+            they belong, which all run before the 'content' repairs
+
+    Returns:
+        callable: Decorator registering the function
+    """
+    def decorator(function):
+        REPAIRS[name] = {
+            'name': name,
+            'error_types': tuple(error_types),
+            'elements': frozenset(elements) if elements else None,
+            'needs_schema': needs_schema,
+            'phase': phase,
+            'description': (function.__doc__ or '').strip(),
+            'apply': function
+        }
+        return function
+    return decorator
+
+_local_names = {}
+
+def _local_name(tag):
+    """Strip the namespace from an lxml tag, caching the few distinct tags of a message."""
+    name = _local_names.get(tag)
+    if name is None:
+        name = _local_names[tag] = tag.split('}')[-1] if '}' in tag else tag
+    return name
+
+def _next_element(item):
+    """Skip comments and processing instructions, starting at item."""
+    while item is not None and not isinstance(item.tag, str):
+        item = item.getnext()
+    return item
+
+def _child_tag(parent, name):
+    """Qualify a new child element name with the namespace of its parent."""
+    namespace = etree.QName(parent).namespace
+    return f"{{{namespace}}}{name}" if namespace else name
+
+def _element_children(elem):
+    """Child elements, without comments and processing instructions."""
+    return [child for child in elem if isinstance(child.tag, str)]
+
+@register_repair('close_leaf_element', ('SCHEMAV_CVC_TYPE_3_1_2', 'SCHEMAV_CVC_COMPLEX_TYPE_2_2'),
+                 needs_schema=True, phase='structure')
+def close_leaf_element(elem, node, ancestors):
+    """Move elements out of a value element whose end tag was missing, back to follow it."""
+    if node is None or node['kind'] != 'leaf' or (node['facet'] is None and not node['attributes']):
+        return False
+    # Children named after an attribute are left for amount_currency
+    items = [item for item in elem if not isinstance(item.tag, str) or _local_name(item.tag) not in node['attributes']]
+    if not any(isinstance(item.tag, str) for item in items):
+        return False
+
+    for item in reversed(items):
+        elem.addnext(item)
+    return True
+
+@register_repair('misplaced_element', ('SCHEMAV_ELEMENT_CONTENT',), needs_schema=True, phase='structure')
+def misplaced_element(elem, node, ancestors):
+    """Move elements that belong to an enclosing component, with everything after them, back out to it."""
+    if node is None or node['kind'] not in ('sequence', 'choice'):
+        return False
+
+    for child in _element_children(elem):
+        name = _local_name(child.tag)
+        if name in node['children']:
+            continue
+
+        for depth in range(len(ancestors) - 1, -1, -1):
+            ancestor_node = ancestors[depth][1]
+            if ancestor_node is not None and name in ancestor_node['children']:
+                break
+        else:
+            continue
+
+        # An end tag was missing: the element and its following siblings belong after
+        # the element that encloses them at the level of the ancestor that allows them
+        container = ancestors[depth + 1][0] if depth + 1 < len(ancestors) else elem
+        items = [child] + list(child.itersiblings())
+        for item in reversed(items):
+            container.addnext(item)
+        return True
+
+    return False
+
+@register_repair('strip_whitespace', ('SCHEMAV_CVC_PATTERN_VALID', 'SCHEMAV_CVC_ENUMERATION_VALID',
+                                      'SCHEMAV_CVC_MAXLENGTH_VALID', 'SCHEMAV_CVC_LENGTH_VALID',
+                                      'SCHEMAV_CVC_DATATYPE_VALID_1_2_1'), needs_schema=True)
+def strip_whitespace(elem, node, ancestors):
+    """Strip whitespace that pretty-printers put around a leaf value when only the stripped value is valid."""
+    if node is None or node['facet'] is None or elem.text is None or _element_children(elem):
+        return False
+    value = elem.text.strip()
+    if value == elem.text or not check_value(node['facet'], elem.text) or check_value(node['facet'], value):
+        return False
+    elem.text = value
+    return True
+
+@register_repair('bic_value', ('SCHEMAV_CVC_PATTERN_VALID',), elements=('BICFI', 'AnyBIC'))
+def bic_value(elem, node, ancestors):
+    """Normalize malformed BICs and replace the legacy sample BICs."""
+    value = (elem.text or '').strip()
+    if BIC_PATTERN.fullmatch(value):
+        return False
+
+    candidate = LEGACY_BICS.get(value, re.sub(r'\s+', '', value).upper())
+    if not BIC_PATTERN.fullmatch(candidate):
+        return False
+    elem.text = candidate
+    return True
+
+@register_repair('amount_currency', ('SCHEMAV_CVC_COMPLEX_TYPE_4', 'SCHEMAV_CVC_COMPLEX_TYPE_2_2',
+                                     'SCHEMAV_CVC_DATATYPE_VALID_1_2_1'))
+def amount_currency(elem, node, ancestors):
+    """Move a currency written into the amount text or as a Ccy child into the Ccy attribute."""
+    if node is not None:
+        if 'Ccy' not in node['attributes']:
+            return False
+    elif not _local_name(elem.tag).endswith('Amt'):
+        return False
+
+    changed = False
+    for child in _element_children(elem):
+        if _local_name(child.tag) == 'Ccy':
+            if not elem.get('Ccy') and child.text and child.text.strip():
+                elem.set('Ccy', child.text.strip())
+            elem.text = (elem.text or '') + (child.tail or '')
+            elem.remove(child)
+            changed = True
+
+    match = AMOUNT_CURRENCY_TEXT.fullmatch(elem.text or '')
+    if match:
+        elem.text = match.group(1)
+        if not elem.get('Ccy'):
+            elem.set('Ccy', match.group(2))
+        changed = True
+
+    return changed
+
+@register_repair('code_choice_text', ('SCHEMAV_CVC_COMPLEX_TYPE_2_3', 'SCHEMAV_ELEMENT_CONTENT'), needs_schema=True)
+def code_choice_text(elem, node, ancestors):
+    """Wrap a bare code in the Cd (or, if it is not a valid code, the Prtry) element of a code choice."""
+    if node is None or node['kind'] != 'choice' or 'Cd' not in node['children'] or _element_children(elem):
+        return False
+    value = (elem.text or '').strip()
+    if not value:
+        return False
+
+    name = 'Cd'
+    code_facet = node['facets'].get('Cd')
+    if code_facet is not None and check_value(code_facet, value) and 'Prtry' in node['children']:
+        name = 'Prtry'
+
+    elem.text = None
+    etree.SubElement(elem, _child_tag(elem, name)).text = value
+    return True
+
+@register_repair('drop_unknown_element', ('SCHEMAV_ELEMENT_CONTENT',), needs_schema=True)
+def drop_unknown_element(elem, node, ancestors):
+    """Remove children the schema does not define anywhere in the parent, such as RtrRsnInf."""
+    if node is None or node['kind'] not in ('sequence', 'choice'):
+        return False
+
+    changed = False
+    for child in _element_children(elem):
+        if _local_name(child.tag) not in node['children']:
+            previous = child.getprevious()
+            if child.tail and child.tail.strip():
+                if previous is not None:
+                    previous.tail = (previous.tail or '') + child.tail
+                else:
+                    elem.text = (elem.text or '') + child.tail
+            elem.remove(child)
+            changed = True
+    return changed
+
+@register_repair('child_order', ('SCHEMAV_ELEMENT_CONTENT',), needs_schema=True)
+def child_order(elem, node, ancestors):
+    """Put the children of a sequence back in schema order, keeping repeated elements in place."""
+    if node is None or node['kind'] != 'sequence':
+        return False
+
+    children = _element_children(elem)
+    positions = [node['children'].get(_local_name(child.tag), len(node['children'])) for child in children]
+    if positions == sorted(positions):
+        return False
+
+    # Comments travel with the element that follows them
+    groups = []
+    pending = []
+    for item in list(elem):
+        if isinstance(item.tag, str):
+            groups.append((node['children'].get(_local_name(item.tag), len(node['children'])), len(groups), pending + [item]))
+            pending = []
+        else:
+            pending.append(item)
+
+    for item in list(elem):
+        elem.remove(item)
+    for _, _, items in sorted(groups, key=lambda group: group[:2]):
+        elem.extend(items)
+    elem.extend(pending)
+    return True
+
+def load_repair_schema(xsd_file):
+    """
+    Compile the XSD into the path-keyed table the schema-aware repairs use.
+
+    Tables are cached per process, so repeated calls for the same XSD are free.
+
+    Args:
+        xsd_file (str): Path to the pacs.008 XSD schema file
+
+    Returns:
+        dict: Instance path (local names, like /Document/FIToFICstmrCdtTrf) to a
+        dictionary with 'kind', 'facet', 'children' (child name to its position
+        in the content model), 'facets' (child name to its facet) and
+        'attributes' (attribute name to its facet)
+    """
+    key = os.path.abspath(xsd_file)
+    table = _repair_schemas.get(key)
+    if table is not None:
+        return table
+
+    table = {}
+
+    def add(node):
+        entry = table.setdefault(node['path'], {
+            'kind': node['kind'], 'facet': node['facet'], 'children': {}, 'facets': {},
+            'attributes': {attribute['name']: attribute['facet'] for attribute in node['attributes']}
+        })
+        for position, child in enumerate(node['children']):
+            entry['children'].setdefault(child['name'], position)
+            entry['facets'].setdefault(child['name'], child['facet'])
+            if child['path'] not in table:
+                add(child)
+
+    add(build_schema_tree(xsd_file))
+    _repair_schemas[key] = table
+    return table
+
+def select_repairs(names=None):
+    """
+    Look up registered repairs by name.
+
+    Args:
+        names (iterable, optional): Repair names, defaults to every registered repair
+
+    Returns:
+        list: Repair dictionaries in registration order
+
+    Raises:
+        KeyError: If a name is not registered
+    """
+    if names is None:
+        return list(REPAIRS.values())
+    wanted = set(names)
+    unknown = wanted - set(REPAIRS) - {RECOVER_REPAIR}
+    if unknown:
+        raise KeyError(f"Unknown repairs: {', '.join(sorted(unknown))}")
+    return [repair for name, repair in REPAIRS.items() if name in wanted]
+
+def parse_message(data):
+    """
+    Parse a message, recovering what libxml2 can if it is not well-formed.
+
+    Args:
+        data (bytes): Raw message bytes
+
+    Returns:
+        tuple: Root element and whether recovery was needed
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If nothing could be recovered
+    """
+    try:
+        return etree.fromstring(data, _strict_parser), False
+    except etree.XMLSyntaxError:
+        root = etree.fromstring(data, _recover_parser)
+        if root is None:
+            raise
+        return root, True
+
+def repair_tree(root, schema_table=None, repairs=None):
+    """
+    Run repairs over a parsed message, changing it in place.
+
+    The structure repairs run during a first walk over the tree, so elements
+    recovered into the wrong place are back in their component before the
+    content repairs run during a second walk.
+
+    Args:
+        root (lxml.etree._Element): Root element of the message
+        schema_table (dict, optional): Table from load_repair_schema
+        repairs (list, optional): Repairs from select_repairs, defaults to all
+
+    Returns:
+        list: One dictionary per change with 'repair', 'path' and 'line'
+    """
+    fired = []
+
+    def walk(elem, path, ancestors, dispatch):
+        node = schema_table.get(path) if schema_table is not None else None
+        name = _local_name(elem.tag)
+
+        applicable = dispatch.get(name)
+        if applicable is None:
+            applicable = dispatch[name] = [repair for repair in dispatch[None]
+                                           if repair['elements'] is None or name in repair['elements']]
+        for repair in applicable:
+            if repair['apply'](elem, node, ancestors):
+                fired.append({'repair': repair['name'], 'path': path, 'line': elem.sourceline})
+
+        # Repairs may move siblings in behind the current child, so follow the live tree
+        ancestors = ancestors + [(elem, node)]
+        child = _next_element(elem[0] if len(elem) else None)
+        while child is not None:
+            walk(child, f"{path}/{_local_name(child.tag)}", ancestors, dispatch)
+            child = _next_element(child.getnext())
+
+    for phase in PHASES:
+        active = [repair for repair in (repairs if repairs is not None else REPAIRS.values())
+                  if repair['phase'] == phase and (schema_table is not None or not repair['needs_schema'])]
+        if active:
+            # Repairs per element name, filled in as names are met
+            walk(root, f"/{_local_name(root.tag)}", [], {None: active})
+
+    return fired
+
+def element_context(elem, schema_table=None):
+    """
+    Build the path and ancestors a repair is called with for one element.
+
+    Args:
+        elem (lxml.etree._Element): Element of a parsed message
+        schema_table (dict, optional): Table from load_repair_schema
+
+    Returns:
+        tuple: Instance path of local names, schema table entry of the element
+        (None without a table) and the (element, node) pairs from the root down
+        to the parent
+    """
+    chain = list(elem.iterancestors())
+    chain.reverse()
+
+    path = ''
+    ancestors = []
+    for item in chain:
+        path += f"/{_local_name(item.tag)}"
+        ancestors.append((item, schema_table.get(path) if schema_table is not None else None))
+    path += f"/{_local_name(elem.tag)}"
+
+    return path, schema_table.get(path) if schema_table is not None else None, ancestors
+
+def repair_element(elem, schema_table=None, repairs=None):
+    """
+    Run repairs on a single element instead of walking the whole message.
+
+    Args:
+        elem (lxml.etree._Element): Element to repair
+        schema_table (dict, optional): Table from load_repair_schema
+        repairs (list, optional): Repairs from select_repairs, defaults to all
+
+    Returns:
+        list: One dictionary per change with 'repair', 'path' and 'line'
+    """
+    path, node, ancestors = element_context(elem, schema_table)
+    name = _local_name(elem.tag)
+
+    fired = []
+    for repair in (repairs if repairs is not None else REPAIRS.values()):
+        if repair['needs_schema'] and schema_table is None:
+            continue
+        if repair['elements'] is not None and name not in repair['elements']:
+            continue
+        if repair['apply'](elem, node, ancestors):
+            fired.append({'repair': repair['name'], 'path': path, 'line': elem.sourceline})
+    return fired
+
+def serialize_tree(root, compact=False, xml_declaration=True):
+    """
+    Serialize a repaired message in the pretty or compact output mode.
+
+    Args:
+        root (lxml.etree._Element): Root element of the message
+        compact (bool): Compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
+
+    Returns:
+        bytes: UTF-8 message
+    """
+    return format_bytes(etree.tostring(root.getroottree(), encoding='UTF-8'), **output_options(compact, xml_declaration))
+
+def repair_message(data, schema_table=None, repairs=None, compact=False, xml_declaration=True):
+    """
+    Parse, repair and serialize one message.
+
+    Args:
+        data (bytes): Raw message bytes
+        schema_table (dict, optional): Table from load_repair_schema
+        repairs (list, optional): Repairs from select_repairs, defaults to all
+        compact (bool): Serialize in the compact output mode
+        xml_declaration (bool): Start the message with an XML declaration
+
+    Returns:
+        dict: Dictionary with 'data' (repaired bytes, None if nothing needed
+        repairing) and 'repairs' (changes made, see repair_tree)
+
+    Raises:
+        lxml.etree.XMLSyntaxError: If the message could not be parsed at all
+    """
+    root, recovered = parse_message(data)
+    fired = [{'repair': RECOVER_REPAIR, 'path': None, 'line': None}] if recovered else []
+    fired.extend(repair_tree(root, schema_table, repairs))
+
+    if not fired:
+        return {'data': None, 'repairs': []}
+    return {'data': serialize_tree(root, compact, xml_declaration), 'repairs': fired}
+
+def message_diff(before, after, name='message'):
+    """
+    Build a unified diff of a repair.
+
+    A well-formed original is formatted first, so the diff shows what the
+    repairs changed and not how the message was laid out.
+
+    Args:
+        before (bytes): Original message
+        after (bytes): Repaired message
+        name (str): File name shown in the diff header
+
+    Returns:
+        str: Unified diff
+    """
+    try:
+        before = format_bytes(before)
+    except Exception:
+        pass
+
+    return ''.join(difflib.unified_diff(
+        before.decode('utf-8', 'replace').splitlines(True), after.decode('utf-8', 'replace').splitlines(True),
+        fromfile=f"a/{name}", tofile=f"b/{name}"))
+
+def summarize_repairs(fired):
+    """Count the changes made by each repair."""
+    counts = {}
+    for change in fired:
+        counts[change['repair']] = counts.get(change['repair'], 0) + 1
+    return counts
+
+def repair_file(path, schema_table=None, repairs=None, dry_run=False, compact=False, xml_declaration=True):
+    """
+    Repair one file in place, replacing it atomically if anything was repaired.
+
+    Args:
+        path (str): Path to the XML file
+        schema_table (dict, optional): Table from load_repair_schema
+        repairs (list, optional): Repairs from select_repairs, defaults to all
+        dry_run (bool): Compute the diff without writing the file
+        compact (bool): Serialize in the compact output mode
+        xml_declaration (bool): Start the message with an XML declaration
+
+    Returns:
+        dict: Dictionary with 'file', 'status' ('repaired', 'unchanged' or
+        'error'), 'repairs' (repair name to number of changes), 'diff' (dry
+        run only), 'seconds' and 'error'
+    """
+    start = time.perf_counter()
+    result = {'file': path, 'status': 'unchanged', 'repairs': {}, 'diff': None, 'seconds': 0.0, 'error': None}
+
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        repaired = repair_message(data, schema_table, repairs, compact, xml_declaration)
+        if repaired['data'] is not None:
+            result['status'] = 'repaired'
+            result['repairs'] = summarize_repairs(repaired['repairs'])
+            if dry_run:
+                result['diff'] = message_diff(data, repaired['data'], os.path.basename(path))
+            else:
+                atomic_write(path, repaired['data'])
+    except (etree.XMLSyntaxError, OSError) as e:
+        result['status'] = 'error'
+        result['error'] = f"{type(e).__name__}: {e}"
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+_worker_state = {}
+
+def _load_worker_state(xsd_file, names, options):
+    """Keep the repair schema, the repairs and the output options for _repair_item."""
+    _worker_state['schema_table'] = load_repair_schema(xsd_file) if xsd_file else None
+    _worker_state['repairs'] = select_repairs(names)
+    _worker_state['options'] = options
+
+def _init_worker(xsd_file, names, options):
+    """Compile the repair schema once for the lifetime of a worker process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _load_worker_state(xsd_file, names, options)
+
+def _repair_item(path):
+    """Repair one file inside a worker process."""
+    return repair_file(path, _worker_state['schema_table'], _worker_state['repairs'], **_worker_state['options'])
+
+def repair_files(files, xsd_file=None, names=None, dry_run=False, workers=None, chunksize=4,
+                 compact=False, xml_declaration=True):
+    """
+    Repair many files in parallel.
+
+    Args:
+        files (list): Paths to the XML files
+        xsd_file (str, optional): XSD for the schema-aware repairs, which are
+            skipped without it
+        names (iterable, optional): Names of the repairs to run, defaults to all
+        dry_run (bool): Compute diffs without writing any file
+        workers (int, optional): Number of worker processes, defaults to the CPU count
+        chunksize (int): Files handed to a worker at a time
+        compact (bool): Serialize repaired files in the compact output mode
+        xml_declaration (bool): Start repaired files with an XML declaration
+
+    Yields:
+        dict: Result of repair_file for each file, in input order
+    """
+    options = {'dry_run': dry_run, 'compact': compact, 'xml_declaration': xml_declaration}
+    workers = min(workers or os.cpu_count() or 1, max(len(files), 1))
+
+    if workers == 1:
+        _load_worker_state(xsd_file, names, options)
+        for path in files:
+            yield _repair_item(path)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(xsd_file, names, options)) as pool:
+        yield from pool.imap(_repair_item, files, chunksize)
+
+def print_repair_results(results, verbose=True):
+    """
+    Print per-file repairs and timing of a batch repair and return its totals.
+
+    Args:
+        results (iterable): Results from repair_files
+        verbose (bool): Print a line for every file, not only repaired files and errors
+
+    Returns:
+        dict: Dictionary with 'files', 'repaired', 'unchanged', 'errors',
+        'seconds' (summed per-file time) and 'repairs' (repair name to number
+        of changes over all files)
+    """
+    summary = {'files': 0, 'repaired': 0, 'unchanged': 0, 'errors': 0, 'seconds': 0.0, 'repairs': {}}
+
+    for result in results:
+        summary['files'] += 1
+        summary['seconds'] += result['seconds']
+        name = os.path.basename(result['file'])
+
+        if result['status'] == 'error':
+            summary['errors'] += 1
+            print(f"  {name}: error after {result['seconds'] * 1000:.1f} ms: {result['error']}")
+            continue
+
+        summary[result['status']] += 1
+        for repair, count in result['repairs'].items():
+            summary['repairs'][repair] = summary['repairs'].get(repair, 0) + count
+
+        if result['status'] == 'repaired':
+            changes = ', '.join(f"{repair} x{count}" for repair, count in result['repairs'].items())
+            print(f"  {name}: repaired in {result['seconds'] * 1000:.1f} ms ({changes})")
+            if result['diff']:
+                print(result['diff'])
+        elif verbose:
+            print(f"  {name}: nothing to repair ({result['seconds'] * 1000:.1f} ms)")
+
+    return summary
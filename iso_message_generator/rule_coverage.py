@@ -0,0 +1,117 @@
+"""
+Account for the conditional requirements of the usage rules in corpus coverage.
+
+Path coverage alone cannot tell whether a corpus exercises a rule such as "Name
+is mandatory if PstlAdr is present": that needs messages where the condition does
+not trigger, messages where it triggers and holds, and ideally messages where it
+triggers and is violated. Each message is classified per rule into one of those
+branches from the same message index the path coverage uses, so no extra parse
+is needed, and the per-message branches are added to running corpus totals.
+"""
+
+# Branches a message can take through a rule, in report order
+RULE_BRANCHES = ('not_triggered', 'satisfied', 'violated')
+
+# Branches a corpus has to exercise for a rule to count as covered
+COVERAGE_BRANCHES = ('not_triggered', 'satisfied')
+
+def message_rule_branches(compiled_rules, message_index):
+    """
+    Classify a message into a branch of every executable rule.
+
+    Args:
+        compiled_rules (list): Rules returned by rule_engine.compile_rules
+        message_index (dict): Message index from rule_engine.build_message_index
+
+    Returns:
+        dict: Rule ID to a dictionary with 'branch', 'triggered' (number of
+        occurrences the condition triggered on) and 'violations'
+    """
+    branches = {}
+    for rule in compiled_rules:
+        if rule['check'] is None:
+            continue
+
+        triggered, failures = rule['check'](message_index, rule['scope'])
+        if not triggered:
+            branch = 'not_triggered'
+        elif failures:
+            branch = 'violated'
+        else:
+            branch = 'satisfied'
+
+        branches[rule['rule_id']] = {'branch': branch, 'triggered': int(triggered), 'violations': len(failures)}
+
+    return branches
+
+def new_rule_coverage(compiled_rules):
+    """
+    Start empty corpus totals for the executable rules.
+
+    Args:
+        compiled_rules (list): Rules returned by rule_engine.compile_rules
+
+    Returns:
+        dict: Totals with 'messages' and 'rules' (rule ID to 'rule_name',
+        'definition', per-branch message counts in 'branches', and the summed
+        'triggered' and 'violations')
+    """
+    return {
+        'messages': 0,
+        'rules': {
+            rule['rule_id']: {
+                'rule_name': rule['rule_name'],
+                'definition': rule['definition'],
+                'branches': {branch: 0 for branch in RULE_BRANCHES},
+                'triggered': 0,
+                'violations': 0
+            }
+            for rule in compiled_rules if rule['check'] is not None
+        }
+    }
+
+def update_rule_coverage(coverage, branches):
+    """
+    Add the rule branches of one message to the corpus totals.
+
+    Args:
+        coverage (dict): Totals from new_rule_coverage, updated in place
+        branches (dict): Rule branches of the message from message_rule_branches
+    """
+    coverage['messages'] += 1
+    for rule_id, result in branches.items():
+        totals = coverage['rules'].get(rule_id)
+        if totals is None:
+            continue
+        totals['branches'][result['branch']] += 1
+        totals['triggered'] += result['triggered']
+        totals['violations'] += result['violations']
+
+def summarize_rule_coverage(coverage):
+    """
+    Compute which rule branches the corpus exercises.
+
+    Args:
+        coverage (dict): Totals from new_rule_coverage
+
+    Returns:
+        dict: Dictionary with 'total_branches', 'covered_branches',
+        'coverage_percentage' (over COVERAGE_BRANCHES of every rule) and 'rules'
+        (list of per-rule dictionaries with 'rule_id', 'rule_name', 'branches',
+        'triggered', 'violations' and 'missing_branches')
+    """
+    rules = []
+    covered = 0
+
+    for rule_id, totals in sorted(coverage['rules'].items(), key=lambda item: (len(item[0]), item[0])):
+        missing = [branch for branch in COVERAGE_BRANCHES if not totals['branches'][branch]]
+        covered += len(COVERAGE_BRANCHES) - len(missing)
+        rules.append(dict(totals, rule_id=rule_id, missing_branches=missing))
+
+    total = len(rules) * len(COVERAGE_BRANCHES)
+    return {
+        'total_branches': total,
+        'covered_branches': covered,
+        'coverage_percentage': round(covered / total * 100, 2) if total else 0,
+        'rules': rules
+    }
@@ -0,0 +1,447 @@
+"""
+Compile the ISO 20022 Rules sheet into executable predicates over parsed messages.
+
+Each rule from reference/all_rules.json is bound by its rule name to a predicate
+template, and by its index to the message component it constrains (taken from
+the Rules column of the Light_View sheet). Compilation happens once; evaluating
+the compiled rules against a parsed message walks the tree a single time to build
+a path index that every rule queries.
+"""
+import json
+import os
+import re
+
+RULESET_VERSION = "1"
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference", "all_rules.json")
+
+# Component each rule index applies to, as listed in the Light_View sheet
+RULE_SCOPES = {
+    'R2': None,
+    'R3': 'UltmtDbtr',
+    'R4': 'InitgPty',
+    'R5': 'Dbtr',
+    'R6': 'Dbtr',
+    'R7': 'Dbtr',
+    'R8': 'Dbtr',
+    'R9': 'Cdtr',
+    'R10': 'Cdtr',
+    'R11': 'Cdtr',
+    'R12': 'Cdtr',
+    'R13': 'UltmtCdtr',
+    'R14': 'RltdRmtInf',
+    'R15': None,
+    'R16': 'RmtInf',
+    'R17': 'RmtInf'
+}
+
+STRUCTURED_ADDRESS_ELEMENTS = (
+    'Dept', 'SubDept', 'StrtNm', 'BldgNb', 'BldgNm', 'Flr', 'PstBx', 'Room',
+    'PstCd', 'TwnNm', 'TwnLctnNm', 'DstrctNm', 'CtrySubDvsn', 'Ctry'
+)
+
+MAX_REMITTANCE_CHARACTERS = 9000
+
+def local_name(tag):
+    """
+    Strip the namespace from an element tag.
+
+    Args:
+        tag (str): Element tag, possibly in {namespace}name form
+
+    Returns:
+        str: Local element name, or None for comments and processing instructions
+    """
+    if not isinstance(tag, str):
+        return None
+    return tag.rsplit('}', 1)[-1]
+
+def build_message_index(root):
+    """
+    Index a parsed message in a single traversal for rule evaluation.
+
+    Every element and attribute is recorded under its absolute path (for example
+    /Document/FIToFICstmrCdtTrf/GrpHdr/MsgId or .../IntrBkSttlmAmt/@Ccy). Each
+    credit transfer transaction additionally gets its own index of paths relative
+    to CdtTrfTxInf, with the element values and the business text length of every
+    occurrence, so rules never need to walk the tree again.
+
+    Args:
+        root (Element): Root Document element of a parsed pacs.008 message
+
+    Returns:
+        dict: Dictionary with 'paths' (absolute path to values), 'tags' (set of
+        local names), 'header' (GrpHdr-relative paths) and 'transactions'
+        (list of dictionaries mapping relative paths to 'values' and 'lengths')
+    """
+    index = {
+        'paths': {},
+        'tags': set(),
+        'header': {},
+        'transactions': []
+    }
+
+    paths = index['paths']
+    tags = index['tags']
+
+    def visit(elem, path, scope, relative):
+        name = local_name(elem.tag)
+        if name is None:
+            return 0
+
+        tags.add(name)
+        path = f"{path}/{name}"
+
+        if scope is None:
+            if path == '/Document/FIToFICstmrCdtTrf/CdtTrfTxInf':
+                scope = {}
+                index['transactions'].append(scope)
+                relative = ''
+            elif path == '/Document/FIToFICstmrCdtTrf/GrpHdr':
+                scope = index['header']
+                relative = ''
+        else:
+            relative = f"{relative}/{name}" if relative else name
+
+        text = elem.text.strip() if elem.text else ''
+        paths.setdefault(path, []).append(text)
+
+        entry = None
+        if scope is not None and relative:
+            entry = scope.setdefault(relative, {'values': [], 'lengths': []})
+            entry['values'].append(text)
+
+        for attr, value in elem.attrib.items():
+            attr_path = f"{path}/@{local_name(attr)}"
+            paths.setdefault(attr_path, []).append(value)
+            if scope is not None and relative:
+                scope.setdefault(f"{relative}/@{local_name(attr)}", {'values': [], 'lengths': []})['values'].append(value)
+
+        length = len(text)
+        for child in elem:
+            length += visit(child, path, scope, relative)
+            if child.tail and child.tail.strip():
+                length += len(child.tail.strip())
+
+        if entry is not None:
+            entry['lengths'].append(length)
+
+        return length
+
+    visit(root, '', None, '')
+
+    return index
+
+def prepare_message(root):
+    """
+    Build the message index the compiled rules operate on.
+
+    Args:
+        root (Element): Root Document element of a parsed pacs.008 message
+
+    Returns:
+        dict: Message index returned by build_message_index
+    """
+    return build_message_index(root)
+
+def _present(component, path):
+    """Check whether a relative path occurs in a transaction or header index."""
+    return path in component
+
+def _values(component, path):
+    """Return the values recorded for a relative path."""
+    entry = component.get(path)
+    return entry['values'] if entry else []
+
+def _lengths(component, path):
+    """Return the business text length of each occurrence of a relative path."""
+    entry = component.get(path)
+    return entry['lengths'] if entry else []
+
+def _agent_identity(component, agent):
+    """Reduce a branch and financial institution identification to a comparable key."""
+    if not _present(component, f"{agent}/FinInstnId"):
+        return None
+
+    bicfi = _values(component, f"{agent}/FinInstnId/BICFI")
+    if bicfi and bicfi[0]:
+        return ('BICFI', bicfi[0])
+
+    mmb_id = _values(component, f"{agent}/FinInstnId/ClrSysMmbId/MmbId")
+    if mmb_id and mmb_id[0]:
+        return ('MmbId', mmb_id[0])
+
+    prefix = f"{agent}/FinInstnId/"
+    return ('Text', tuple(value for path, entry in sorted(component.items())
+                          if path.startswith(prefix) for value in entry['values'] if value))
+
+def _describe_agent(identity):
+    """Format an agent identity for failure messages."""
+    if identity is None:
+        return "no FinInstnId"
+    if identity[0] == 'Text':
+        return ' '.join(identity[1])
+    return f"{identity[0]} {identity[1]}"
+
+def _scoped_transactions(message, scope):
+    """Yield (transaction index, transaction paths) pairs where the scoped path is present."""
+    for index, transaction in enumerate(message['transactions']):
+        if _present(transaction, scope):
+            yield index, transaction
+
+def _check_agents_match(message, scope):
+    """Instructing Agent must equal Debtor Agent and Instructed Agent must equal Creditor Agent."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in enumerate(message['transactions']):
+        for instructing, party_agent in (('InstgAgt', 'DbtrAgt'), ('InstdAgt', 'CdtrAgt')):
+            if _present(transaction, instructing):
+                agent_identity = _agent_identity(transaction, instructing)
+            elif _present(message['header'], instructing):
+                agent_identity = _agent_identity(message['header'], instructing)
+            else:
+                continue
+
+            if not _present(transaction, party_agent):
+                continue
+
+            applicable += 1
+            counterpart_identity = _agent_identity(transaction, party_agent)
+            if agent_identity != counterpart_identity:
+                failures.append(f"Transaction {index}: {instructing} ({_describe_agent(agent_identity)}) "
+                                f"differs from {party_agent} ({_describe_agent(counterpart_identity)})")
+
+    return applicable, failures
+
+def _check_name_if_postal_address(message, scope):
+    """If Postal Address is present, Name is mandatory."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in _scoped_transactions(message, f"{scope}/PstlAdr"):
+        applicable += 1
+        if not _present(transaction, f"{scope}/Nm"):
+            failures.append(f"Transaction {index}: {scope}/PstlAdr is present but {scope}/Nm is missing")
+
+    return applicable, failures
+
+def _check_name_if_anybic_absent(message, scope):
+    """If AnyBIC is absent, Name is mandatory."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in _scoped_transactions(message, scope):
+        if _present(transaction, f"{scope}/Id/OrgId/AnyBIC"):
+            continue
+        applicable += 1
+        if not _present(transaction, f"{scope}/Nm"):
+            failures.append(f"Transaction {index}: {scope}/Id/OrgId/AnyBIC is absent but {scope}/Nm is missing")
+
+    return applicable, failures
+
+def _check_structured_vs_unstructured(message, scope):
+    """If AddressLine is present, all other optional PostalAddress elements must be absent."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in _scoped_transactions(message, f"{scope}/PstlAdr/AdrLine"):
+        applicable += 1
+        structured = [name for name in STRUCTURED_ADDRESS_ELEMENTS
+                      if _present(transaction, f"{scope}/PstlAdr/{name}")]
+        if structured:
+            failures.append(f"Transaction {index}: {scope}/PstlAdr/AdrLine is present together with "
+                            f"{', '.join(structured)}")
+
+    return applicable, failures
+
+def _check_town_name_and_country(message, scope):
+    """If AddressLine is absent, Town Name and Country must be present."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in _scoped_transactions(message, f"{scope}/PstlAdr"):
+        if _present(transaction, f"{scope}/PstlAdr/AdrLine"):
+            continue
+        applicable += 1
+        missing = [name for name in ('TwnNm', 'Ctry') if not _present(transaction, f"{scope}/PstlAdr/{name}")]
+        if missing:
+            failures.append(f"Transaction {index}: {scope}/PstlAdr without AdrLine is missing {', '.join(missing)}")
+
+    return applicable, failures
+
+def _check_related_remittance_length(message, scope):
+    """Each Related Remittance component must not exceed 9,000 characters of business data."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in _scoped_transactions(message, scope):
+        applicable += 1
+        for length in _lengths(transaction, scope):
+            if length > MAX_REMITTANCE_CHARACTERS:
+                failures.append(f"Transaction {index}: {scope} holds {length} characters "
+                                f"(maximum {MAX_REMITTANCE_CHARACTERS})")
+
+    return applicable, failures
+
+def _check_remittance_mutually_exclusive(message, scope):
+    """Related Remittance Information and Remittance Information are mutually exclusive."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in enumerate(message['transactions']):
+        related = _present(transaction, 'RltdRmtInf')
+        remittance = _present(transaction, 'RmtInf')
+        if not (related or remittance):
+            continue
+        applicable += 1
+        if related and remittance:
+            failures.append(f"Transaction {index}: RltdRmtInf and RmtInf are both present")
+
+    return applicable, failures
+
+def _check_unstructured_structured_exclusive(message, scope):
+    """For Remittance Information, Unstructured and Structured are mutually exclusive."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in _scoped_transactions(message, scope):
+        applicable += 1
+        if _present(transaction, f"{scope}/Ustrd") and _present(transaction, f"{scope}/Strd"):
+            failures.append(f"Transaction {index}: {scope}/Ustrd and {scope}/Strd are both present")
+
+    return applicable, failures
+
+def _check_structured_remittance_length(message, scope):
+    """All Structured Remittance occurrences together must not exceed 9,000 characters of business data."""
+    applicable = 0
+    failures = []
+
+    for index, transaction in _scoped_transactions(message, f"{scope}/Strd"):
+        applicable += 1
+        length = sum(_lengths(transaction, f"{scope}/Strd"))
+        if length > MAX_REMITTANCE_CHARACTERS:
+            failures.append(f"Transaction {index}: {scope}/Strd holds {length} characters "
+                            f"(maximum {MAX_REMITTANCE_CHARACTERS})")
+
+    return applicable, failures
+
+# Predicate template for each rule name in the Rules sheet. Each predicate returns the
+# number of occurrences its condition triggered on and the failure messages
+RULE_PREDICATES = {
+    'Textual_RTR_InstructingAgent/InstructedAgent_DebtorAgent/CreditorAgent_Rule': _check_agents_match,
+    'RTR_Name_MandatoryIf_PstlAdrPresent_Rule': _check_name_if_postal_address,
+    'RTR_DebtorName_MandatoryIf_Rule': _check_name_if_anybic_absent,
+    'RTR_CreditorName_MandatoryIf_Rule': _check_name_if_anybic_absent,
+    'StructuredVsUnstructuredRule': _check_structured_vs_unstructured,
+    'TownNameAndCountryRule': _check_town_name_and_country,
+    'Textual_RTR_RelatedRemittanceRule': _check_related_remittance_length,
+    'Textual_RTR_RelatedRemitInfo_RemitInfo_MutuallyExclusiveRule': _check_remittance_mutually_exclusive,
+    'Textual_RTR_Unstructured_Structured_MutuallyExclusiveRule': _check_unstructured_structured_exclusive,
+    'Textual_RTR_RemittanceRule': _check_structured_remittance_length
+}
+
+def load_rules(rules_file=None):
+    """
+    Load rule definitions exported from the Rules sheet.
+
+    Args:
+        rules_file (str, optional): Path to a rules JSON file, defaults to reference/all_rules.json
+
+    Returns:
+        list: List of dictionaries containing rule information
+    """
+    with open(rules_file or DEFAULT_RULES_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def rule_key(rule_name):
+    """
+    Extract the technical rule name from a Rules sheet name such as 'Rule "X"'.
+
+    Args:
+        rule_name (str): Rule name as it appears in the Rules sheet
+
+    Returns:
+        str: Technical rule name
+    """
+    match = re.search(r'"([^"]+)"', rule_name)
+    return match.group(1) if match else rule_name.strip()
+
+def compile_rules(rules):
+    """
+    Compile rule definitions into executable predicates.
+
+    Args:
+        rules (list): List of dictionaries with 'index', 'name' and 'definition'
+
+    Returns:
+        list: List of compiled rule dictionaries with 'rule_id', 'rule_name',
+        'scope' and 'check' (None for rules without an executable predicate)
+    """
+    compiled = []
+
+    for rule in rules:
+        rule_id = str(rule['index'])
+        compiled.append({
+            'rule_id': rule_id,
+            'rule_name': str(rule['name']),
+            'definition': str(rule.get('definition', '')),
+            'scope': RULE_SCOPES.get(rule_id),
+            'check': RULE_PREDICATES.get(rule_key(str(rule['name'])))
+        })
+
+    return compiled
+
+def evaluate_rules(compiled_rules, root):
+    """
+    Evaluate compiled rules against a parsed message.
+
+    The message is indexed once and every rule queries that index, so the cost
+    is proportional to the number of elements plus the number of rules.
+
+    Args:
+        compiled_rules (list): Rules returned by compile_rules
+        root (Element or dict): Root Document element of a parsed pacs.008 message,
+            or a message index returned by build_message_index
+
+    Returns:
+        dict: Dictionary with 'passed_rules', 'failed_rules' and 'not_applicable_rules' lists
+    """
+    results = {
+        'passed_rules': [],
+        'failed_rules': [],
+        'not_applicable_rules': []
+    }
+
+    message = root if isinstance(root, dict) else prepare_message(root)
+
+    for rule in compiled_rules:
+        if rule['check'] is None:
+            results['not_applicable_rules'].append({
+                'rule_id': rule['rule_id'],
+                'rule_name': rule['rule_name'],
+                'reason': "No executable predicate for this rule"
+            })
+            continue
+
+        applicable, failures = rule['check'](message, rule['scope'])
+
+        if not applicable:
+            results['not_applicable_rules'].append({
+                'rule_id': rule['rule_id'],
+                'rule_name': rule['rule_name'],
+                'reason': "Rule condition not triggered by this message"
+            })
+        elif failures:
+            results['failed_rules'].append({
+                'rule_id': rule['rule_id'],
+                'rule_name': rule['rule_name'],
+                'reason': '; '.join(failures)
+            })
+        else:
+            results['passed_rules'].append({
+                'rule_id': rule['rule_id'],
+                'rule_name': rule['rule_name']
+            })
+
+    return results
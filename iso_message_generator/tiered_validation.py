@@ -0,0 +1,223 @@
+"""
+Validate pacs.008 messages in tiers ordered from the cheapest check to the most expensive.
+
+The tiers are a byte scan of the message header, the simple type facets compiled
+from the XSD by xsd_facets (or, without a local XSD, a built-in table of the most
+commonly broken simple types), XSD validation with the cached compiled schema,
+and the compiled business rules. In fail-fast mode validation stops at
+the first failure; in full mode every tier that can run reports its findings.
+"""
+import re
+from lxml import etree
+
+from .rule_engine import build_message_index, evaluate_rules, local_name
+from .xsd_facets import check_value
+from .xsd_validation import validate_document
+
+PACS008_NAMESPACE = b"urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08"
+
+HEADER_SCAN_BYTES = 16384
+
+TIERS = ('header', 'patterns', 'xsd', 'rules')
+
+# Fallback facets of the simple types most often broken in practice, keyed by element name,
+# used when no facet table compiled from the XSD is available
+ELEMENT_FACETS = {
+    'BICFI': ('BICFIDec2014Identifier', re.compile(r'[A-Z0-9]{4}[A-Z]{2}[A-Z0-9]{2}([A-Z0-9]{3})?')),
+    'AnyBIC': ('AnyBICDec2014Identifier', re.compile(r'[A-Z0-9]{4}[A-Z]{2}[A-Z0-9]{2}([A-Z0-9]{3})?')),
+    'Ctry': ('CountryCode', re.compile(r'[A-Z]{2}')),
+    'CtryOfRes': ('CountryCode', re.compile(r'[A-Z]{2}')),
+    'MsgId': ('Max35Text', re.compile(r'.{1,35}', re.DOTALL)),
+    'InstrId': ('Max35Text', re.compile(r'.{1,35}', re.DOTALL)),
+    'EndToEndId': ('Max35Text', re.compile(r'.{1,35}', re.DOTALL)),
+    'TxId': ('Max35Text', re.compile(r'.{1,35}', re.DOTALL)),
+    'UETR': ('UUIDv4Identifier', re.compile(r'[a-f0-9]{8}-[a-f0-9]{4}-4[a-f0-9]{3}-[89ab][a-f0-9]{3}-[a-f0-9]{12}')),
+    'NbOfTxs': ('Max15NumericText', re.compile(r'[0-9]{1,15}')),
+    'CreDtTm': ('ISODateTime', re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d+)?(Z|[+-]\d{2}:\d{2})?')),
+    'IntrBkSttlmDt': ('ISODate', re.compile(r'\d{4}-\d{2}-\d{2}(Z|[+-]\d{2}:\d{2})?')),
+    'IntrBkSttlmAmt': ('ActiveCurrencyAndAmount', re.compile(r'\d{1,13}(\.\d{1,5})?')),
+    'InstdAmt': ('ActiveOrHistoricCurrencyAndAmount', re.compile(r'\d{1,13}(\.\d{1,5})?')),
+    'TtlIntrBkSttlmAmt': ('ActiveCurrencyAndAmount', re.compile(r'\d{1,13}(\.\d{1,5})?')),
+    'SttlmMtd': ('SettlementMethod1Code', re.compile(r'INDA|INGA|COVE|CLRG')),
+    'ChrgBr': ('ChargeBearerType1Code', re.compile(r'DEBT|CRED|SHAR|SLEV'))
+}
+
+ATTRIBUTE_FACETS = {
+    'Ccy': ('ActiveOrHistoricCurrencyCode', re.compile(r'[A-Z]{3}'))
+}
+
+def scan_header(data):
+    """
+    Check the leading bytes of a message without parsing it.
+
+    Args:
+        data (bytes): Raw message bytes
+
+    Returns:
+        list: List of error messages, empty if the header looks like a pacs.008.001.08 message
+    """
+    head = data[:HEADER_SCAN_BYTES].lstrip(b'\xef\xbb\xbf \t\r\n')
+    errors = []
+
+    if not head.startswith(b'<'):
+        errors.append("Message does not start with an XML declaration or element")
+    if PACS008_NAMESPACE not in head:
+        errors.append(f"pacs.008.001.08 namespace not declared in the first {HEADER_SCAN_BYTES} bytes")
+    if b'Document' not in head or b'FIToFICstmrCdtTrf' not in head:
+        errors.append("Document/FIToFICstmrCdtTrf root not found in the message header")
+
+    return errors
+
+def check_patterns(root, fail_fast=True, element_facets=None, attribute_facets=None):
+    """
+    Check element and attribute values against precompiled pattern facets.
+
+    Args:
+        root (Element): Root element of the parsed message
+        fail_fast (bool): Stop at the first failing value
+        element_facets (dict, optional): Element name to (type name, compiled regex)
+        attribute_facets (dict, optional): Attribute name to (type name, compiled regex)
+
+    Returns:
+        list: List of error dictionaries with line, path and message
+    """
+    element_facets = ELEMENT_FACETS if element_facets is None else element_facets
+    attribute_facets = ATTRIBUTE_FACETS if attribute_facets is None else attribute_facets
+    errors = []
+
+    for elem in root.iter():
+        name = local_name(elem.tag)
+        if name is None:
+            continue
+
+        facet = element_facets.get(name)
+        if facet is not None and len(elem) == 0:
+            value = (elem.text or '').strip()
+            if not facet[1].fullmatch(value):
+                errors.append({
+                    'line': elem.sourceline,
+                    'path': name,
+                    'message': f"Value '{value}' of {name} does not match {facet[0]}"
+                })
+                if fail_fast:
+                    return errors
+
+        for attr, value in elem.attrib.items():
+            facet = attribute_facets.get(local_name(attr))
+            if facet is not None and not facet[1].fullmatch(value):
+                errors.append({
+                    'line': elem.sourceline,
+                    'path': f"{name}/@{local_name(attr)}",
+                    'message': f"Value '{value}' of {name}/@{local_name(attr)} does not match {facet[0]}"
+                })
+                if fail_fast:
+                    return errors
+
+    return errors
+
+def check_facets(root, facet_table, fail_fast=True):
+    """
+    Check element and attribute values against a facet table compiled from the XSD.
+
+    Args:
+        root (Element): Root element of the parsed message
+        facet_table (dict): Path-keyed facet table from xsd_facets.build_facet_table
+        fail_fast (bool): Stop at the first failing value
+
+    Returns:
+        list: List of error dictionaries with line, path and message
+    """
+    errors = []
+    pending = [(root, '')]
+
+    while pending:
+        elem, parent_path = pending.pop()
+        name = local_name(elem.tag)
+        if name is None:
+            continue
+
+        path = f"{parent_path}/{name}"
+
+        facet = facet_table.get(path)
+        if facet is not None and len(elem) == 0:
+            problem = check_value(facet, elem.text or '')
+            if problem:
+                errors.append({'line': elem.sourceline, 'path': path, 'message': f"Value {problem} ({name})"})
+                if fail_fast:
+                    return errors
+
+        for attr, value in elem.attrib.items():
+            attr_path = f"{path}/@{local_name(attr)}"
+            facet = facet_table.get(attr_path)
+            if facet is not None:
+                problem = check_value(facet, value)
+                if problem:
+                    errors.append({'line': elem.sourceline, 'path': attr_path, 'message': f"Value {problem} ({name}/@{local_name(attr)})"})
+                    if fail_fast:
+                        return errors
+
+        pending.extend((child, path) for child in reversed(elem))
+
+    return errors
+
+def _tier_result(tier, errors):
+    """Build the result record for one tier."""
+    return {'tier': tier, 'passed': not errors, 'errors': errors}
+
+def validate_tiered(data, schema=None, compiled_rules=None, fail_fast=True, facet_table=None):
+    """
+    Validate a message tier by tier, cheapest first.
+
+    Args:
+        data (bytes): Raw message bytes
+        schema (lxml.etree.XMLSchema, optional): Compiled schema; the XSD tier is skipped without it
+        compiled_rules (list, optional): Rules from rule_engine.compile_rules; the rules tier is skipped without them
+        fail_fast (bool): Stop at the first failing tier and the first failing value within it
+        facet_table (dict, optional): Facet table from xsd_facets.load_facet_table; the built-in
+            name-keyed facets are used without it
+
+    Returns:
+        dict: Dictionary with 'valid', 'failed_tier' (the first failing tier or None)
+        and 'tiers', the list of results for every tier that ran
+    """
+    results = []
+
+    def finish():
+        failed = [result['tier'] for result in results if not result['passed']]
+        return {
+            'valid': not failed,
+            'failed_tier': failed[0] if failed else None,
+            'tiers': results
+        }
+
+    results.append(_tier_result('header', [{'line': 1, 'path': None, 'message': message}
+                                           for message in scan_header(data)]))
+    if fail_fast and not results[-1]['passed']:
+        return finish()
+
+    try:
+        root = etree.fromstring(data, etree.XMLParser(remove_comments=True, huge_tree=True))
+    except etree.XMLSyntaxError as e:
+        results.append(_tier_result('patterns', [{'line': e.lineno, 'path': None, 'message': str(e)}]))
+        return finish()
+
+    if facet_table is not None:
+        results.append(_tier_result('patterns', check_facets(root, facet_table, fail_fast)))
+    else:
+        results.append(_tier_result('patterns', check_patterns(root, fail_fast)))
+    if fail_fast and not results[-1]['passed']:
+        return finish()
+
+    if schema is not None:
+        xsd_result = validate_document(root, schema)
+        results.append(_tier_result('xsd', [{'line': error['line'], 'path': error['path'], 'message': error['message']}
+                                            for error in xsd_result['errors']]))
+        if fail_fast and not results[-1]['passed']:
+            return finish()
+
+    if compiled_rules:
+        rule_results = evaluate_rules(compiled_rules, build_message_index(root))
+        results.append(_tier_result('rules', [{'line': None, 'path': rule['rule_id'], 'message': rule['reason']}
+                                              for rule in rule_results['failed_rules']]))
+
+    return finish()
@@ -0,0 +1,271 @@
+"""
+Detect reused message and transaction identifiers across historical messages.
+
+GrpHdr/MsgId must be unique per sender for a pre-agreed period, and EndToEndId
+and UETR must not repeat either. Every identifier is reduced to a 64-bit key
+(BLAKE2b of kind, scope and value) stored as the integer primary key of a SQLite
+table, which keeps the on-disk index compact. An in-memory Bloom filter built
+from the same keys sits in front of it, so the common case of a new identifier is
+answered without touching the disk. The filter is saved next to the keys on
+close and only rebuilt from them when it is missing or was not saved cleanly.
+Entries older than the retention window are evicted from the table only: their
+bits stay set in the Bloom filter, which at worst costs a SQLite lookup that
+finds nothing. The filter is rebuilt once evicted keys make up more than
+REBUILD_STALE_FRACTION of the keys it holds.
+
+Checking the same message again is not a reuse: an identifier already recorded
+for the same source is accepted, while an identifier repeated within one
+message is always reported.
+"""
+import hashlib
+import math
+import os
+import sqlite3
+import time
+
+DEFAULT_INDEX_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".uniqueness_index.sqlite")
+
+DEFAULT_EXPECTED_ITEMS = 10000000
+
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+DEFAULT_WINDOW_DAYS = 90
+
+# Share of evicted keys in the Bloom filter above which it is rebuilt from the table
+REBUILD_STALE_FRACTION = 0.5
+
+# Kinds of identifier, stored as small integers to keep rows compact
+IDENTIFIER_KINDS = {'MsgId': 1, 'EndToEndId': 2, 'UETR': 3}
+
+def identifier_key(kind, value, scope=""):
+    """
+    Reduce an identifier to a signed 64-bit key.
+
+    Args:
+        kind (str): Identifier kind, one of IDENTIFIER_KINDS
+        value (str): Identifier value
+        scope (str): Scope the identifier must be unique in, for example the sender of a MsgId
+
+    Returns:
+        int: Signed 64-bit key suitable for a SQLite INTEGER PRIMARY KEY
+    """
+    digest = hashlib.blake2b(f"{kind}\0{scope}\0{value}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def _bloom_positions(bloom, key):
+    """Derive the Bloom filter bit positions of a key by double hashing its two halves."""
+    key &= 0xFFFFFFFFFFFFFFFF
+    first = key & 0xFFFFFFFF
+    second = (key >> 32) | 1
+    return [(first + i * second) % bloom['size'] for i in range(bloom['hashes'])]
+
+def _bloom_add(bloom, key):
+    """Set the bits of a key in the Bloom filter."""
+    bits = bloom['bits']
+    for position in _bloom_positions(bloom, key):
+        bits[position >> 3] |= 1 << (position & 7)
+
+def _bloom_contains(bloom, key):
+    """Return False if the key was certainly never added, True if it may have been."""
+    bits = bloom['bits']
+    return all(bits[position >> 3] & (1 << (position & 7)) for position in _bloom_positions(bloom, key))
+
+def _new_bloom(expected_items, false_positive_rate):
+    """Create an empty Bloom filter sized for the expected number of keys."""
+    size = max(int(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2), 1 << 16)
+    hashes = max(int(round(size / expected_items * math.log(2))), 1)
+    return {'bits': bytearray((size + 7) // 8), 'size': size, 'hashes': hashes}
+
+def _rebuild_bloom(index):
+    """Rebuild the Bloom filter from the keys stored on disk."""
+    bloom = _new_bloom(index['expected_items'], index['false_positive_rate'])
+    for (key,) in index['conn'].execute("SELECT key FROM identifiers"):
+        _bloom_add(bloom, key)
+    index['bloom'] = bloom
+    index['stale'] = 0
+
+def open_uniqueness_index(index_file=None, expected_items=DEFAULT_EXPECTED_ITEMS,
+                          false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+    """
+    Open (and create if needed) the uniqueness index and load its Bloom filter.
+
+    Args:
+        index_file (str, optional): Path to the SQLite file, defaults to .uniqueness_index.sqlite in the repository
+        expected_items (int): Number of identifiers the Bloom filter is sized for
+        false_positive_rate (float): Target false positive rate of the Bloom filter
+
+    Returns:
+        dict: Open index with the SQLite 'conn', the in-memory 'bloom' and the
+        number of evicted keys still set in it ('stale')
+    """
+    conn = sqlite3.connect(index_file or DEFAULT_INDEX_FILE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS identifiers (
+            key INTEGER PRIMARY KEY,
+            kind INTEGER NOT NULL,
+            seen_at INTEGER NOT NULL,
+            source TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS identifiers_seen_at ON identifiers (seen_at)")
+    # The saved filter is only a cache of the keys, so one without the stale count is dropped and rebuilt
+    bloom_columns = [row[1] for row in conn.execute("PRAGMA table_info(bloom_filter)")]
+    if bloom_columns and 'stale' not in bloom_columns:
+        conn.execute("DROP TABLE bloom_filter")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bloom_filter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            size INTEGER NOT NULL,
+            hashes INTEGER NOT NULL,
+            stale INTEGER NOT NULL,
+            bits BLOB NOT NULL
+        )
+    """)
+
+    index = {
+        'conn': conn,
+        'expected_items': expected_items,
+        'false_positive_rate': false_positive_rate
+    }
+
+    expected = _new_bloom(expected_items, false_positive_rate)
+    row = conn.execute("SELECT size, hashes, stale, bits FROM bloom_filter WHERE id = 1").fetchone()
+    if row is not None and row[0] == expected['size'] and row[1] == expected['hashes']:
+        index['bloom'] = {'bits': bytearray(row[3]), 'size': row[0], 'hashes': row[1]}
+        index['stale'] = row[2]
+    else:
+        _rebuild_bloom(index)
+
+    # Drop the saved filter while the index is open, so a crash forces a rebuild
+    conn.execute("DELETE FROM bloom_filter")
+    conn.commit()
+    return index
+
+def check_identifier(index, kind, value, scope="", source=None, seen_at=None):
+    """
+    Check whether an identifier was seen before and record it if not.
+
+    An identifier recorded earlier for the same source is not a duplicate, so
+    checking a message again reports nothing.
+
+    Args:
+        index (dict): Open uniqueness index
+        kind (str): Identifier kind, one of IDENTIFIER_KINDS
+        value (str): Identifier value
+        scope (str): Scope the identifier must be unique in
+        source (str, optional): Message the identifier came from, kept for duplicate reports
+        seen_at (int, optional): Unix time of the message, defaults to now
+
+    Returns:
+        dict: The first occurrence with 'kind', 'value', 'first_seen' and
+        'seen_at' if the identifier is a duplicate, otherwise None
+    """
+    key = identifier_key(kind, value, scope)
+
+    if _bloom_contains(index['bloom'], key):
+        row = index['conn'].execute("SELECT seen_at, source FROM identifiers WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            if source is not None and row[1] == source:
+                return None
+            return {'kind': kind, 'value': value, 'scope': scope, 'first_seen': row[1], 'seen_at': row[0]}
+
+    index['conn'].execute("INSERT INTO identifiers (key, kind, seen_at, source) VALUES (?, ?, ?, ?)",
+                          (key, IDENTIFIER_KINDS[kind], int(seen_at if seen_at is not None else time.time()), source))
+    _bloom_add(index['bloom'], key)
+    return None
+
+def message_identifiers(message_index):
+    """
+    Collect the identifiers of a message that must be unique.
+
+    Args:
+        message_index (dict): Message index from rule_engine.build_message_index
+
+    Returns:
+        list: List of (kind, value, scope) tuples; MsgId is scoped by the instructing agent
+    """
+    header = message_index['header']
+    sender = ''
+    for path in ('InstgAgt/FinInstnId/BICFI', 'InstgAgt/FinInstnId/ClrSysMmbId/MmbId'):
+        if path in header and header[path]['values'][0]:
+            sender = header[path]['values'][0]
+            break
+
+    identifiers = [('MsgId', value, sender) for value in (header.get('MsgId') or {'values': []})['values'] if value]
+    for transaction in message_index['transactions']:
+        for kind in ('EndToEndId', 'UETR'):
+            entry = transaction.get(f"PmtId/{kind}")
+            if entry and entry['values'][0]:
+                identifiers.append((kind, entry['values'][0], ''))
+
+    return identifiers
+
+def check_message_identifiers(index, message_index, source=None, seen_at=None):
+    """
+    Check and record every identifier of a message.
+
+    An identifier that occurs more than once in the message is reported for
+    every repeat, with the message itself as the first occurrence.
+
+    Args:
+        index (dict): Open uniqueness index
+        message_index (dict): Message index from rule_engine.build_message_index
+        source (str, optional): Name of the message
+        seen_at (int, optional): Unix time of the message, defaults to now
+
+    Returns:
+        list: List of duplicate dictionaries from check_identifier
+    """
+    duplicates = []
+    checked = set()
+    for kind, value, scope in message_identifiers(message_index):
+        if (kind, value, scope) in checked:
+            duplicates.append({'kind': kind, 'value': value, 'scope': scope, 'first_seen': source,
+                               'seen_at': int(seen_at if seen_at is not None else time.time())})
+            continue
+        checked.add((kind, value, scope))
+        duplicate = check_identifier(index, kind, value, scope, source, seen_at)
+        if duplicate is not None:
+            duplicates.append(duplicate)
+    return duplicates
+
+def evict_identifiers(index, window_days=DEFAULT_WINDOW_DAYS, now=None):
+    """
+    Forget identifiers older than the retention window.
+
+    Evicted keys stay set in the Bloom filter, which is only rebuilt once they
+    make up more than REBUILD_STALE_FRACTION of its keys, so a rolling window
+    does not rescan the whole index on every run.
+
+    Args:
+        index (dict): Open uniqueness index
+        window_days (float): Number of days identifiers are kept
+        now (int, optional): Unix time the window ends at, defaults to now
+
+    Returns:
+        int: Number of evicted identifiers
+    """
+    cutoff = int((now if now is not None else time.time()) - window_days * 86400)
+    evicted = index['conn'].execute("DELETE FROM identifiers WHERE seen_at < ?", (cutoff,)).rowcount
+    if evicted:
+        index['conn'].commit()
+        index['stale'] += evicted
+        (remaining,) = index['conn'].execute("SELECT COUNT(*) FROM identifiers").fetchone()
+        if index['stale'] > REBUILD_STALE_FRACTION * (remaining + index['stale']):
+            _rebuild_bloom(index)
+    return evicted
+
+def close_uniqueness_index(index):
+    """
+    Save the Bloom filter, commit and close the uniqueness index.
+
+    Args:
+        index (dict): Open uniqueness index
+    """
+    bloom = index['bloom']
+    index['conn'].execute("INSERT OR REPLACE INTO bloom_filter (id, size, hashes, stale, bits) VALUES (1, ?, ?, ?, ?)",
+                          (bloom['size'], bloom['hashes'], index['stale'], bytes(bloom['bits'])))
+    index['conn'].commit()
+    index['conn'].close()
@@ -0,0 +1,230 @@
+"""
+Persist validation results on disk so unchanged messages are not revalidated.
+
+Results are stored in SQLite, keyed by the canonical digest of the message, the
+digest of the specification bundle it was checked against (XSD, rules, field
+lists) and the rule-set version. Results that report line and column positions
+(XSD errors) are keyed by the digest of the raw bytes instead, so a reformatted
+message is validated again rather than given the positions of the old layout. A
+stat memo maps (path, size, mtime) to the message digests so unchanged files are
+not even re-read, and least recently used entries are evicted once the cache
+grows beyond its size bound.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from .c14n import file_digest as canonical_file_digest
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".validation_cache.sqlite")
+
+DEFAULT_MAX_ENTRIES = 2000000
+
+# Result kinds carrying line and column positions, which only hold for the exact bytes
+POSITIONAL_KINDS = ('xsd',)
+
+CHUNK_SIZE = 1 << 20
+
+def spec_digest(*parts):
+    """
+    Compute a digest identifying the specification a result was produced against.
+
+    Args:
+        *parts: File paths, strings, or JSON-serializable objects making up the spec bundle
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+
+    for part in parts:
+        if isinstance(part, str) and os.path.isfile(part):
+            with open(part, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+        elif isinstance(part, str):
+            digest.update(part.encode('utf-8'))
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode('utf-8'))
+        digest.update(b'\0')
+
+    return digest.hexdigest()
+
+def open_cache(cache_file=None):
+    """
+    Open (and create if needed) the validation result cache.
+
+    Args:
+        cache_file (str, optional): Path to the SQLite file, defaults to .validation_cache.sqlite in the repository
+
+    Returns:
+        sqlite3.Connection: Open cache connection
+    """
+    conn = sqlite3.connect(cache_file or DEFAULT_CACHE_FILE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS results (
+            kind TEXT NOT NULL,
+            message_digest TEXT NOT NULL,
+            spec_digest TEXT NOT NULL,
+            ruleset_version TEXT NOT NULL,
+            result TEXT NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (kind, message_digest, spec_digest, ruleset_version)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+    # The memo is rebuilt from the files, so one without the raw digest column is dropped
+    memo_columns = [row[1] for row in conn.execute("PRAGMA table_info(file_digests)")]
+    if memo_columns and 'raw_digest' not in memo_columns:
+        conn.execute("DROP TABLE file_digests")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_digests (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            digest TEXT,
+            raw_digest TEXT
+        ) WITHOUT ROWID
+    """)
+    return conn
+
+def _raw_file_digest(path):
+    """Digest the bytes of a file as they are."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_digest(conn, path, canonical=True):
+    """
+    Return the digest of a file, re-reading it only if its size or mtime changed.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection
+        path (str): Path to the XML file
+        canonical (bool): Digest the canonical form, False to digest the raw bytes
+
+    Returns:
+        str: Canonical or raw digest of the file contents
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+
+    digests = [None, None]
+    row = conn.execute("SELECT size, mtime_ns, digest, raw_digest FROM file_digests WHERE path = ?", (path,)).fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        digests = [row[2], row[3]]
+
+    position = 0 if canonical else 1
+    if digests[position] is not None:
+        return digests[position]
+
+    digests[position] = canonical_file_digest(path) if canonical else _raw_file_digest(path)
+
+    conn.execute("INSERT OR REPLACE INTO file_digests (path, size, mtime_ns, digest, raw_digest) VALUES (?, ?, ?, ?, ?)",
+                 (path, stat.st_size, stat.st_mtime_ns, digests[0], digests[1]))
+    return digests[position]
+
+def cache_get(conn, kind, message_digest, spec, ruleset_version=""):
+    """
+    Look up a cached result and mark it as recently used.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection
+        kind (str): Result kind, for example 'rules', 'xsd' or 'fields'
+        message_digest (str): Canonical digest of the message
+        spec (str): Digest of the specification bundle
+        ruleset_version (str): Version of the rule set
+
+    Returns:
+        The cached result, or None on a cache miss
+    """
+    key = (kind, message_digest, spec, ruleset_version)
+    row = conn.execute("SELECT result FROM results WHERE kind = ? AND message_digest = ? AND spec_digest = ? "
+                       "AND ruleset_version = ?", key).fetchone()
+    if row is None:
+        return None
+
+    conn.execute("UPDATE results SET last_used = ? WHERE kind = ? AND message_digest = ? AND spec_digest = ? "
+                 "AND ruleset_version = ?", (time.time(),) + key)
+    return json.loads(row[0])
+
+def cache_put(conn, kind, message_digest, spec, result, ruleset_version=""):
+    """
+    Store a result in the cache.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection
+        kind (str): Result kind, for example 'rules', 'xsd' or 'fields'
+        message_digest (str): Canonical digest of the message
+        spec (str): Digest of the specification bundle
+        result: JSON-serializable result
+        ruleset_version (str): Version of the rule set
+    """
+    conn.execute("INSERT OR REPLACE INTO results (kind, message_digest, spec_digest, ruleset_version, result, last_used) "
+                 "VALUES (?, ?, ?, ?, ?, ?)",
+                 (kind, message_digest, spec, ruleset_version, json.dumps(result), time.time()))
+
+def cached_result(conn, kind, xml_file, spec, compute, ruleset_version=""):
+    """
+    Return the cached result for a file, computing and storing it on a miss.
+
+    Results of the POSITIONAL_KINDS are keyed by the raw bytes of the file,
+    every other kind by its canonical form.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection, or None to always compute
+        kind (str): Result kind, for example 'rules', 'xsd' or 'fields'
+        xml_file (str): Path to the XML file
+        spec (str): Digest of the specification bundle
+        compute (callable): Function computing the result from the file path
+        ruleset_version (str): Version of the rule set
+
+    Returns:
+        The cached or freshly computed result
+    """
+    if conn is None:
+        return compute(xml_file)
+
+    digest = file_digest(conn, xml_file, canonical=kind not in POSITIONAL_KINDS)
+    result = cache_get(conn, kind, digest, spec, ruleset_version)
+    if result is None:
+        result = compute(xml_file)
+        cache_put(conn, kind, digest, spec, result, ruleset_version)
+    return result
+
+def evict_cache(conn, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Evict the least recently used results beyond the size bound.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection
+        max_entries (int): Maximum number of results to keep
+
+    Returns:
+        int: Number of evicted results
+    """
+    count = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+    excess = count - max_entries
+    if excess <= 0:
+        return 0
+
+    conn.execute("DELETE FROM results WHERE rowid IN (SELECT rowid FROM results ORDER BY last_used LIMIT ?)", (excess,))
+    return excess
+
+def close_cache(conn, max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    Evict old results, commit and close the cache.
+
+    Args:
+        conn (sqlite3.Connection): Open cache connection
+        max_entries (int): Maximum number of results to keep
+    """
+    evict_cache(conn, max_entries)
+    conn.commit()
+    conn.close()
@@ -0,0 +1,93 @@
+"""
+Watch an inbox directory and hand new or modified messages to a validator.
+
+The directory is polled with os.scandir and each file's size and modification
+time are compared with the previous poll. A file is only handed over once it has
+the same size and modification time on two consecutive polls, so messages that
+are still being written into the drop folder are not picked up half-written.
+"""
+import fnmatch
+import os
+import time
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+def scan_directory(directory, pattern="*.xml"):
+    """
+    Collect the size and modification time of every matching file under a directory.
+
+    Args:
+        directory (str): Directory to scan recursively
+        pattern (str): Glob pattern matched against file names
+
+    Returns:
+        dict: Dictionary mapping file paths to (size, mtime_ns) tuples
+    """
+    found = {}
+    pending = [directory]
+
+    while pending:
+        try:
+            entries = list(os.scandir(pending.pop()))
+        except OSError:
+            continue
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                    stat = entry.stat()
+                    found[entry.path] = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                continue
+
+    return found
+
+def watch_directory(directory, handle, interval=DEFAULT_POLL_INTERVAL, pattern="*.xml", max_polls=None):
+    """
+    Poll a directory and call a handler with every batch of new or modified files.
+
+    Files already present when watching starts are handled together on the second poll.
+
+    Args:
+        directory (str): Inbox directory to watch
+        handle (callable): Function called with a sorted list of file paths
+        interval (float): Seconds between polls
+        pattern (str): Glob pattern matched against file names
+        max_polls (int, optional): Stop after this many polls, defaults to watching until interrupted
+
+    Returns:
+        int: Number of files handed to the handler
+    """
+    handled = {}
+    previous = {}
+    handled_count = 0
+    polls = 0
+
+    try:
+        while max_polls is None or polls < max_polls:
+            current = scan_directory(directory, pattern)
+
+            ready = sorted(path for path, signature in current.items()
+                           if previous.get(path) == signature and handled.get(path) != signature)
+
+            if ready:
+                handle(ready)
+                for path in ready:
+                    handled[path] = current[path]
+                handled_count += len(ready)
+
+            for path in list(handled):
+                if path not in current:
+                    del handled[path]
+
+            previous = current
+            polls += 1
+
+            if max_polls is None or polls < max_polls:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        print(f"Stopped watching {directory}")
+
+    return handled_count
@@ -0,0 +1,254 @@
+"""
+Format XML messages in a single streaming pass.
+
+The message is fed to an expat parser in fixed-size chunks and written back out
+as it is parsed, so memory is bounded by the nesting depth and the longest text
+value, never by the size of the file. Whitespace between elements is replaced by
+the configured indentation and line ending, text values are kept exactly,
+elements without content are self-closed, and comments are kept on their own
+line at the depth they appear, so formatting an already formatted file gives
+back the same bytes.
+"""
+import io
+import json
+import os
+from xml.parsers import expat
+from xml.sax.saxutils import escape
+
+from .atomic_files import discard_temp_file, open_temp_file, replace_file
+
+DEFAULT_INDENT = "  "
+
+DEFAULT_NEWLINE = "\n"
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>'
+
+# Characters of formatted output collected before each write
+CHUNK_SIZE = 1 << 16
+
+# Wire format: no indentation and no line breaks, so no insignificant whitespace
+COMPACT_OPTIONS = {'indent': '', 'newline': ''}
+
+OUTPUT_MODES = ('pretty', 'compact')
+
+_ATTRIBUTE_ENTITIES = {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'}
+
+def format_stream(source, output, indent=DEFAULT_INDENT, newline=DEFAULT_NEWLINE,
+                  xml_declaration=True, comments=True):
+    """
+    Format an XML document from a binary input stream to a binary output stream.
+
+    Args:
+        source (file): Binary file object to read the document from
+        output (file): Binary file object the UTF-8 formatted document is written to
+        indent (str): Indentation per nesting level, '' for none
+        newline (str): Line ending, '' to put the whole document on one line
+        xml_declaration (bool): Start the output with an XML declaration
+        comments (bool): Keep comments, or drop them
+
+    Raises:
+        xml.parsers.expat.ExpatError: If the document is not well-formed
+    """
+    parser = expat.ParserCreate()
+    parser.buffer_text = True
+    parser.ordered_attributes = True
+
+    pieces = []
+    size = [0]
+    # Per open element: whether it has child elements or comments, and its text so far
+    stack = []
+    state = {'open_tag': False, 'first_line': True}
+
+    def write(text):
+        pieces.append(text)
+        size[0] += len(text)
+        if size[0] >= CHUNK_SIZE:
+            output.write(''.join(pieces).encode('utf-8'))
+            pieces.clear()
+            size[0] = 0
+
+    def start_line(depth):
+        if state['first_line']:
+            state['first_line'] = False
+        else:
+            write(newline)
+        write(indent * depth)
+
+    def close_open_tag():
+        """Finish the start tag of the current element once it turns out to have children."""
+        if state['open_tag']:
+            write('>')
+            state['open_tag'] = False
+        if stack:
+            frame = stack[-1]
+            frame['children'] = True
+            text = ''.join(frame['text']).strip()
+            if text:
+                # Text mixed with child elements goes on its own line
+                start_line(len(stack))
+                write(escape(text))
+            frame['text'] = []
+
+    def start_element(name, attributes):
+        close_open_tag()
+        start_line(len(stack))
+        write(f'<{name}')
+        for position in range(0, len(attributes), 2):
+            write(f' {attributes[position]}="{escape(attributes[position + 1], _ATTRIBUTE_ENTITIES)}"')
+        state['open_tag'] = True
+        stack.append({'name': name, 'children': False, 'text': []})
+
+    def end_element(name):
+        frame = stack.pop()
+        if frame['children']:
+            text = ''.join(frame['text']).strip()
+            if text:
+                start_line(len(stack) + 1)
+                write(escape(text))
+            start_line(len(stack))
+            write(f'</{name}>')
+        elif frame['text']:
+            write(f'>{escape("".join(frame["text"]))}</{name}>')
+        else:
+            write('/>')
+        state['open_tag'] = False
+
+    def character_data(data):
+        if stack:
+            stack[-1]['text'].append(data)
+
+    def comment(data):
+        if not comments:
+            return
+        close_open_tag()
+        start_line(len(stack))
+        write(f'<!--{data}-->')
+
+    def processing_instruction(target, data):
+        close_open_tag()
+        start_line(len(stack))
+        write(f'<?{target} {data}?>' if data else f'<?{target}?>')
+
+    parser.StartElementHandler = start_element
+    parser.EndElementHandler = end_element
+    parser.CharacterDataHandler = character_data
+    parser.CommentHandler = comment
+    parser.ProcessingInstructionHandler = processing_instruction
+
+    if xml_declaration:
+        write(XML_DECLARATION)
+        state['first_line'] = False
+
+    parser.ParseFile(source)
+
+    write(newline)
+    output.write(''.join(pieces).encode('utf-8'))
+
+def format_bytes(data, **options):
+    """
+    Format an XML document held in memory.
+
+    Args:
+        data (bytes or str): XML document
+        **options: Formatting options of format_stream
+
+    Returns:
+        bytes: UTF-8 formatted document
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    output = io.BytesIO()
+    format_stream(io.BytesIO(data), output, **options)
+    return output.getvalue()
+
+def format_file(xml_file, output_file=None, **options):
+    """
+    Format an XML file, in place unless an output file is given.
+
+    The output is written to a temporary file next to the target and moved into
+    place, so the file is never left half written and can be formatted in place.
+
+    Args:
+        xml_file (str): Path to the XML file
+        output_file (str, optional): Path to write to, defaults to xml_file
+        **options: Formatting options of format_stream
+
+    Raises:
+        xml.parsers.expat.ExpatError: If the document is not well-formed
+    """
+    target = output_file or xml_file
+    output, temp_file = open_temp_file(target)
+
+    try:
+        with open(xml_file, 'rb') as source, output:
+            format_stream(source, output, **options)
+            output.flush()
+            os.fsync(output.fileno())
+        replace_file(temp_file, target, target if os.path.exists(target) else xml_file)
+    except BaseException:
+        discard_temp_file(temp_file)
+        raise
+
+def output_options(compact=False, xml_declaration=True):
+    """
+    Build the format_stream options for a generator output mode.
+
+    Args:
+        compact (bool): Compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
+
+    Returns:
+        dict: Keyword arguments for format_stream, format_bytes and format_file
+    """
+    options = dict(COMPACT_OPTIONS) if compact else {}
+    options['xml_declaration'] = xml_declaration
+    return options
+
+def serialize_message(data, compact=False, xml_declaration=True):
+    """
+    Serialize a generated message in the pretty or the compact output mode.
+
+    Args:
+        data (bytes or str): Message as produced by ElementTree or lxml tostring
+        compact (bool): Compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
+
+    Returns:
+        str: Formatted message
+    """
+    return format_bytes(data, **output_options(compact, xml_declaration)).decode('utf-8')
+
+def size_record(name, data, compact=False, xml_declaration=True):
+    """
+    Describe the size of a serialized message for the size log.
+
+    Args:
+        name (str): Message file name or identifier
+        data (bytes or str): Serialized message
+        compact (bool): Whether the message was serialized compactly
+        xml_declaration (bool): Whether the message has an XML declaration
+
+    Returns:
+        dict: Dictionary with 'message', 'mode', 'xml_declaration' and 'bytes'
+    """
+    size = len(data.encode('utf-8') if isinstance(data, str) else data)
+    return {'message': name, 'mode': OUTPUT_MODES[compact], 'xml_declaration': xml_declaration, 'bytes': size}
+
+def append_size_log(log_file, records):
+    """
+    Append message size records to a JSON lines log.
+
+    The log is appended to, so runs in the pretty and the compact mode can be
+    collected in one file and compared.
+
+    Args:
+        log_file (str): Path to the JSON lines file
+        records (list): Records from size_record
+
+    Returns:
+        int: Total bytes of the recorded messages
+    """
+    with open(log_file, 'a', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return sum(record['bytes'] for record in records)
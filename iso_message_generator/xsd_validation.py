@@ -0,0 +1,265 @@
+"""
+Validate ISO 20022 XML messages against the pacs.008 XSD schema.
+"""
+import copy
+import os
+import tempfile
+from lxml import etree
+
+XSD_URL = "https://www.iso20022.org/sites/default/files/documents/messages/pacs/schemas/pacs.008.001.08.xsd"
+XSD_FILENAME = "pacs.008.001.08.xsd"
+
+_compiled_schemas = {}
+
+def download_xsd_schema():
+    """
+    Download the ISO 20022 XSD schema for pacs.008.001.08.
+
+    Returns:
+        str: Path to the downloaded XSD file, or None if the download failed
+    """
+    import requests
+
+    print("Downloading ISO 20022 XSD schema...")
+
+    try:
+        response = requests.get(XSD_URL)
+
+        if response.status_code == 200:
+            xsd_file = os.path.join(tempfile.gettempdir(), XSD_FILENAME)
+            with open(xsd_file, 'wb') as f:
+                f.write(response.content)
+
+            print(f"Downloaded XSD schema to {xsd_file}")
+            return xsd_file
+        else:
+            print(f"Failed to download XSD schema: {response.status_code}")
+            return None
+
+    except Exception as e:
+        print(f"Error downloading XSD schema: {e}")
+        return None
+
+def find_xsd_schema(xsd_file=None):
+    """
+    Locate the pacs.008 XSD schema, downloading it only if no local copy exists.
+
+    The lookup order is the explicit path, the repository's reference directory
+    and the temp directory used by the download scripts.
+
+    Args:
+        xsd_file (str, optional): Explicit path to the XSD schema file
+
+    Returns:
+        str: Path to the XSD file, or None if it could not be found or downloaded
+    """
+    if xsd_file:
+        return xsd_file if os.path.exists(xsd_file) else None
+
+    candidates = [
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference", XSD_FILENAME),
+        os.path.join(tempfile.gettempdir(), XSD_FILENAME)
+    ]
+
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+
+    return download_xsd_schema()
+
+def load_schema(xsd_file):
+    """
+    Compile an XSD schema, reusing the compiled schema for repeated calls in the same process.
+
+    Args:
+        xsd_file (str): Path to the XSD schema file
+
+    Returns:
+        lxml.etree.XMLSchema: Compiled schema
+    """
+    key = os.path.abspath(xsd_file)
+
+    schema = _compiled_schemas.get(key)
+    if schema is None:
+        schema = etree.XMLSchema(etree.parse(xsd_file))
+        _compiled_schemas[key] = schema
+
+    return schema
+
+def format_schema_errors(error_log):
+    """
+    Convert an lxml error log into plain dictionaries.
+
+    Args:
+        error_log (lxml.etree._ListErrorLog): Error log from a parser or schema
+
+    Returns:
+        list: List of dictionaries with line, column, domain, type, path and message
+    """
+    return [
+        {
+            'line': error.line,
+            'column': error.column,
+            'domain': error.domain_name,
+            'type': error.type_name,
+            'path': error.path,
+            'message': error.message
+        }
+        for error in error_log
+    ]
+
+def validate_document(xml_doc, schema):
+    """
+    Validate a parsed XML document against a compiled schema.
+
+    Args:
+        xml_doc (lxml.etree._ElementTree): Parsed XML document or element
+        schema (lxml.etree.XMLSchema): Compiled schema
+
+    Returns:
+        dict: Dictionary with 'valid' flag and 'errors' list
+    """
+    valid = schema.validate(xml_doc)
+
+    return {
+        'valid': bool(valid),
+        'errors': [] if valid else format_schema_errors(schema.error_log)
+    }
+
+def validate_message(source, schema):
+    """
+    Parse and validate a single XML message.
+
+    Args:
+        source (str or bytes): Path to the XML file, or the raw message bytes
+        schema (lxml.etree.XMLSchema): Compiled schema
+
+    Returns:
+        dict: Dictionary with 'valid' flag and 'errors' list
+    """
+    try:
+        if isinstance(source, bytes):
+            xml_doc = etree.ElementTree(etree.fromstring(source))
+        else:
+            xml_doc = etree.parse(source)
+    except etree.XMLSyntaxError as e:
+        return {
+            'valid': False,
+            'errors': format_schema_errors(e.error_log) or [{
+                'line': e.lineno,
+                'column': e.offset,
+                'domain': 'PARSER',
+                'type': 'XML_SYNTAX_ERROR',
+                'path': None,
+                'message': str(e)
+            }]
+        }
+
+    return validate_document(xml_doc, schema)
+
+def _local_name(tag):
+    """Strip the namespace from an lxml tag."""
+    return tag.split('}')[-1] if '}' in tag else tag
+
+def _build_envelope(document, body, header):
+    """Create a Document/FIToFICstmrCdtTrf envelope holding a copy of the group header."""
+    envelope = etree.Element(document.tag, nsmap=document.nsmap)
+    envelope_body = etree.SubElement(envelope, body.tag)
+    envelope_body.append(copy.deepcopy(header))
+    return envelope, envelope_body
+
+def _split_header_errors(errors):
+    """Separate errors located in the group header from the remaining errors."""
+    header_errors = []
+    other_errors = []
+    for error in errors:
+        if error['path'] and 'GrpHdr' in error['path']:
+            header_errors.append(error)
+        else:
+            other_errors.append(error)
+    return header_errors, other_errors
+
+def iter_validate_transactions(source, schema):
+    """
+    Stream-validate a pacs.008 message one credit transfer transaction at a time.
+
+    The file is read with iterparse. The group header is kept, and each CdtTrfTxInf
+    subtree is validated inside a minimal envelope holding a copy of the header.
+    Processed transactions are cleared behind the parser, so memory stays flat
+    however many transactions the message holds. Source line numbers are kept
+    on the copied elements, so errors point back into the original file.
+
+    Args:
+        source (str or file): Path to the XML file or a binary file object
+        schema (lxml.etree.XMLSchema): Compiled schema
+
+    Yields:
+        dict: Result per item with 'index' (None for the group header, otherwise
+        the zero-based transaction index), 'valid' flag and 'errors' list
+    """
+    envelope = None
+    envelope_body = None
+    header = None
+    header_reported = False
+    index = 0
+
+    context = etree.iterparse(source, events=('end',), tag=('{*}GrpHdr', '{*}CdtTrfTxInf'),
+                              remove_comments=True, huge_tree=True)
+
+    try:
+        for _, elem in context:
+            name = _local_name(elem.tag)
+            body = elem.getparent()
+
+            if name == 'GrpHdr':
+                header = elem
+                envelope, envelope_body = _build_envelope(body.getparent(), body, header)
+                continue
+
+            if envelope is None:
+                yield {
+                    'index': index,
+                    'valid': False,
+                    'errors': [{'line': elem.sourceline, 'column': 0, 'domain': 'SCHEMASV',
+                                'type': 'SCHEMAV_ELEMENT_CONTENT', 'path': None,
+                                'message': 'CdtTrfTxInf found before GrpHdr'}]
+                }
+            else:
+                transaction = copy.deepcopy(elem)
+                envelope_body.append(transaction)
+                result = validate_document(envelope, schema)
+                envelope_body.remove(transaction)
+
+                header_errors, errors = _split_header_errors(result['errors'])
+                if not header_reported:
+                    header_reported = True
+                    yield {'index': None, 'valid': not header_errors, 'errors': header_errors}
+
+                yield {'index': index, 'valid': not errors, 'errors': errors}
+
+            index += 1
+
+            elem.clear()
+            while elem.getprevious() is not None and elem.getprevious() is not header:
+                body.remove(elem.getprevious())
+
+    except etree.XMLSyntaxError as e:
+        yield {
+            'index': index,
+            'valid': False,
+            'errors': [{'line': e.lineno, 'column': e.offset, 'domain': 'PARSER',
+                        'type': 'XML_SYNTAX_ERROR', 'path': None, 'message': str(e)}]
+        }
+        return
+
+    if not header_reported:
+        if envelope is None:
+            yield {
+                'index': None,
+                'valid': False,
+                'errors': [{'line': None, 'column': 0, 'domain': 'SCHEMASV',
+                            'type': 'SCHEMAV_ELEMENT_CONTENT', 'path': None,
+                            'message': 'GrpHdr not found'}]
+            }
+        else:
+            yield dict(validate_document(envelope, schema), index=None)
@@ -1,14 +1,22 @@
 """
 Add comments to XML files indicating which rules they comply with.
+
+Files are updated in parallel and replaced atomically, and only files whose
+bytes change are rewritten.
 """
+import argparse
 import os
 import sys
 import glob
+import functools
 import pandas as pd
 import xml.etree.ElementTree as ET
-import re
 from xml.dom import minidom
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.batch_rewrite import print_rewrite_results, rewrite_file, rewrite_files, text_transform
+from iso_message_generator.xml_formatter import append_size_log, serialize_message, size_record
+
 def extract_rules(excel_file):
     """
     Extract rules from the Rules sheet of an ISO 20022 Excel file.
@@ -64,53 +72,88 @@ def extract_rules(excel_file):
         print(f"Error extracting rules from Excel: {e}")
         return []
 
-def add_rule_comments_to_xml(xml_file, rules):
+def add_rule_comments_content(content, rules, compact=False, xml_declaration=True):
+    """
+    Add a comment listing the rules a message complies with to the text of a message.
+    
+    Args:
+        content (str): Message text
+        rules (list): List of dictionaries containing rule information
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
+        
+    Returns:
+        str: The message with the rule comment
+    """
+    root = ET.fromstring(content)
+    
+    comment_text = "\nThis XML file complies with the following ISO 20022 rules:\n"
+    for rule in rules:
+        comment_text += f"- Rule {rule['index']}: {rule['name']} - {rule['definition']}\n"
+    
+    xml_str = ET.tostring(root, encoding='utf-8')
+    dom = minidom.parseString(xml_str)
+    
+    comment = dom.createComment(comment_text)
+    
+    dom.insertBefore(comment, dom.documentElement)
+    
+    return serialize_message(dom.toxml(encoding='utf-8'), compact, xml_declaration)
+
+def rule_comments_transform(rules, compact=False, xml_declaration=True):
+    """
+    Build the stream transform that adds the rule comment, for rewrite_file and rewrite_files.
+    
+    Args:
+        rules (list): List of dictionaries containing rule information
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
+        
+    Returns:
+        callable: Picklable stream transform
+    """
+    return functools.partial(text_transform, functools.partial(add_rule_comments_content, rules=rules, compact=compact,
+                                                               xml_declaration=xml_declaration))
+
+def add_rule_comments_to_xml(xml_file, rules, compact=False, xml_declaration=True):
     """
     Add comments to XML file indicating which rules it complies with.
     
+    The file is replaced atomically, and only if its bytes change.
+    
     Args:
         xml_file (str): Path to the XML file
         rules (list): List of dictionaries containing rule information
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
         
     Returns:
-        bool: True if file was updated, False otherwise
+        str: The updated message as written, or None if the file could not be updated
     """
     print(f"Adding rule comments to {os.path.basename(xml_file)}...")
     
-    try:
-        with open(xml_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        comment_text = "\nThis XML file complies with the following ISO 20022 rules:\n"
-        for rule in rules:
-            comment_text += f"- Rule {rule['index']}: {rule['name']} - {rule['definition']}\n"
-        
-        xml_str = ET.tostring(root, encoding='utf-8')
-        dom = minidom.parseString(xml_str)
-        
-        comment = dom.createComment(comment_text)
-        
-        dom.insertBefore(comment, dom.documentElement)
-        
-        pretty_xml = dom.toprettyxml(indent="  ")
-        
-        if not pretty_xml.startswith('<?xml'):
-            pretty_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + pretty_xml
-        
-        with open(xml_file, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
-        
-        print(f"  Successfully added rule comments to {os.path.basename(xml_file)}")
-        return True
+    transform = rule_comments_transform(rules, compact, xml_declaration)
+    result = rewrite_file(xml_file, transform, compare='bytes')
+    if result['status'] == 'error':
+        print(f"  Error adding rule comments to {os.path.basename(xml_file)}: {result['error']}")
+        return None
     
-    except Exception as e:
-        print(f"  Error adding rule comments to {os.path.basename(xml_file)}: {e}")
-        return False
+    with open(xml_file, 'r', encoding='utf-8') as f:
+        xml = f.read()
+    
+    print(f"  Rule comments in {os.path.basename(xml_file)} {result['status']} ({result['bytes_after']} bytes)")
+    return xml
 
 def main():
+    parser = argparse.ArgumentParser(description='Add comments listing the rules each sample message complies with.')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    
+    args = parser.parse_args()
+    
+    compact, xml_declaration, size_log = args.compact, not args.no_declaration, args.size_log
+    
     excel_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
                              "data/rtr_fi_to_fi_customer_credit_transfer_pacs.008excel.xlsx")
     
@@ -126,12 +169,23 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    updated_files = 0
-    for sample_file in sample_files:
-        if add_rule_comments_to_xml(sample_file, rules):
-            updated_files += 1
+    transform = rule_comments_transform(rules, compact, xml_declaration)
+    results = list(rewrite_files(sample_files, transform, compare='bytes'))
+    summary = print_rewrite_results(results)
+    
+    sizes = []
+    for result in results:
+        if result['status'] != 'error':
+            with open(result['file'], 'rb') as f:
+                sizes.append(size_record(os.path.basename(result['file']), f.read(), compact, xml_declaration))
     
-    print(f"Added rule comments to {updated_files} of {len(sample_files)} sample files")
+    print(f"Added rule comments to {summary['rewritten']} of {len(sample_files)} sample files, "
+          f"{summary['unchanged']} unchanged, {summary['errors']} errors")
+    total_bytes = sum(record['bytes'] for record in sizes)
+    print(f"Wrote {len(sizes)} {'compact' if compact else 'pretty'} messages, {total_bytes} bytes in total")
+    if size_log:
+        append_size_log(size_log, sizes)
+        print(f"Appended message sizes to {size_log}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,121 @@
+"""
+Repair pacs.008 messages from their XSD validation errors until they validate.
+
+Each message is validated against the cached compiled schema, and the errors in
+the lxml error log pick the registered repairs to run. The repaired tree is
+validated again, until the message is valid, no repair applies to the remaining
+errors, or --max-iterations rounds have run. Messages are repaired in parallel,
+and the repairs that fired are reported per message and in total.
+
+Usage:
+    python auto_repair_messages.py <directory|xml_file> [...] [--xsd FILE] [--max-iterations 5]
+        [--repair NAME ...] [--dry-run] [--workers N] [--compact] [--no-declaration] [--quiet]
+        [--output results.jsonl]
+
+Example:
+    python auto_repair_messages.py generated_corpus --dry-run
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.auto_repair import MAX_ITERATIONS, STOP_REASONS, auto_repair_files
+from iso_message_generator.repairs import RECOVER_REPAIR, select_repairs
+from iso_message_generator.xsd_validation import find_xsd_schema
+from scripts.format_xml import collect_files
+
+def main():
+    parser = argparse.ArgumentParser(description='Repair pacs.008 messages from their XSD validation errors.')
+    parser.add_argument('sources', nargs='*', help='XML files or directories (defaults to sample_messages)')
+    parser.add_argument('--xsd', type=str, help='Path to the pacs.008 XSD schema file')
+    parser.add_argument('--max-iterations', type=int, default=MAX_ITERATIONS, help='Rounds of repairs per message before giving up')
+    parser.add_argument('--repair', action='append', dest='repairs', metavar='NAME', help='Only use this repair (repeatable)')
+    parser.add_argument('--dry-run', action='store_true', help='Print the diff of each repair without writing files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--compact', action='store_true', help='Write repaired files in the compact output mode')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration in repaired files')
+    parser.add_argument('--quiet', action='store_true', help='Only report files that were repaired, failed or are still invalid')
+    parser.add_argument('--output', type=str, help='Write per-message results to this JSON lines file')
+
+    args = parser.parse_args()
+
+    try:
+        select_repairs(args.repairs)
+    except KeyError as e:
+        print(f"Error: {e.args[0]}")
+        sys.exit(1)
+
+    xsd_file = find_xsd_schema(args.xsd)
+    if not xsd_file:
+        print("Error: XSD schema not found")
+        sys.exit(1)
+
+    sources = args.sources or [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")]
+    files = collect_files(sources)
+    print(f"Found {len(files)} XML files")
+
+    start = time.perf_counter()
+    counts = {'repaired': 0, 'unchanged': 0, 'error': 0}
+    stops = {reason: 0 for reason in STOP_REASONS}
+    repair_totals = {}
+    error_totals = {}
+    output = open(args.output, 'w', encoding='utf-8') if args.output else None
+
+    try:
+        for result in auto_repair_files(files, xsd_file, args.repairs, args.max_iterations, dry_run=args.dry_run,
+                                        workers=args.workers, compact=args.compact,
+                                        xml_declaration=not args.no_declaration):
+            counts[result['status']] += 1
+            name = os.path.basename(result['file'])
+
+            if output:
+                record = {key: value for key, value in result.items() if key != 'diff'}
+                output.write(json.dumps(record) + "\n")
+
+            if result['status'] == 'error':
+                print(f"  {name}: error: {result['error']}")
+                continue
+
+            stops[result['stop']] += 1
+            for change in result['changes']:
+                repair_totals[change['repair']] = repair_totals.get(change['repair'], 0) + 1
+                if change['error']:
+                    key = (change['error'], change['repair'])
+                    error_totals[key] = error_totals.get(key, 0) + 1
+
+            if result['status'] == 'unchanged' and result['valid']:
+                if not args.quiet:
+                    print(f"  {name}: valid ({result['seconds'] * 1000:.1f} ms)")
+                continue
+
+            changes = ', '.join(f"{repair} x{count}" for repair, count in result['repairs'].items()) or 'no repair applies'
+            state = 'valid' if result['valid'] else f"still invalid ({result['stop'].replace('_', ' ')})"
+            print(f"  {name}: {state} after {result['iterations']} round{'s' if result['iterations'] != 1 else ''} in {result['seconds'] * 1000:.1f} ms ({changes})")
+            for error in result['errors'][:3]:
+                print(f"      line {error['line']}: {error['type']}: {error['message']}")
+            if len(result['errors']) > 3:
+                print(f"      ... {len(result['errors']) - 3} more errors")
+            if result['diff']:
+                print(result['diff'])
+    finally:
+        if output:
+            output.close()
+
+    verb = 'Would repair' if args.dry_run else 'Repaired'
+    print(f"{verb} {counts['repaired']} of {len(files)} XML files in {time.perf_counter() - start:.2f}s: "
+          f"{stops['valid']} valid, {stops['fixed_point']} invalid with no applicable repair, "
+          f"{stops['iteration_cap']} invalid after {args.max_iterations} rounds, {counts['error']} errors")
+    if repair_totals:
+        print("Repairs fired per validation error:")
+        if repair_totals.get(RECOVER_REPAIR):
+            print(f"  not well-formed -> {RECOVER_REPAIR}: {repair_totals[RECOVER_REPAIR]}")
+        for (error_type, repair), count in sorted(error_totals.items(), key=lambda item: -item[1]):
+            print(f"  {error_type} -> {repair}: {count}")
+    if args.output:
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
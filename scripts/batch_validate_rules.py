@@ -0,0 +1,92 @@
+"""
+Validate thousands of pacs.008 messages against the ISO 20022 rules with vectorized batch evaluation.
+
+The fields referenced by the rules are extracted into columnar NumPy arrays and
+every rule runs as an array operation over the whole batch. The per-message result
+bitmap is saved together with the file names and rule identifiers.
+
+Usage:
+    python batch_validate_rules.py <directory> [--output rule_bitmap.npz] [--batch-size 10000]
+
+Example:
+    python batch_validate_rules.py sample_messages --output rule_bitmap.npz
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.rule_engine import build_message_index, compile_rules, load_rules
+from iso_message_generator.batch_rules import extract_rule_columns, evaluate_rules_batch
+
+def iter_batches(files, batch_size):
+    """
+    Parse files in fixed-size batches.
+
+    Args:
+        files (list): List of XML file paths
+        batch_size (int): Number of messages per batch
+
+    Yields:
+        tuple: List of file names and list of message indexes for each batch
+    """
+    for start in range(0, len(files), batch_size):
+        names = []
+        indexes = []
+        for xml_file in files[start:start + batch_size]:
+            try:
+                indexes.append(build_message_index(ET.parse(xml_file).getroot()))
+                names.append(xml_file)
+            except ET.ParseError as e:
+                print(f"  Skipping {os.path.basename(xml_file)}: {e}")
+        yield names, indexes
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate many pacs.008 messages against the rules with columnar batch evaluation.')
+    parser.add_argument('directory', type=str, help='Directory containing XML messages')
+    parser.add_argument('--rules', type=str, help='Rules JSON file (defaults to reference/all_rules.json)')
+    parser.add_argument('--output', type=str, help='Write the result bitmap, file names and rule ids to this .npz file')
+    parser.add_argument('--batch-size', type=int, default=10000, help='Messages evaluated per vectorized batch')
+
+    args = parser.parse_args()
+
+    compiled_rules = compile_rules(load_rules(args.rules))
+
+    files = sorted(glob.glob(os.path.join(args.directory, '**', '*.xml'), recursive=True))
+    print(f"Found {len(files)} XML files")
+
+    all_names = []
+    bitmaps = []
+    failures = None
+    rule_ids = []
+
+    start = time.perf_counter()
+
+    for names, indexes in iter_batches(files, args.batch_size):
+        results = evaluate_rules_batch(compiled_rules, extract_rule_columns(indexes))
+        rule_ids = results['rule_ids']
+
+        batch_failures = (~results['passed']).sum(axis=0)
+        failures = batch_failures if failures is None else failures + batch_failures
+
+        all_names.extend(names)
+        bitmaps.append(results['bitmap'])
+
+    elapsed = time.perf_counter() - start
+
+    print(f"Evaluated {len(rule_ids)} rules over {len(all_names)} messages in {elapsed:.2f}s")
+    for position, rule_id in enumerate(rule_ids):
+        print(f"  {rule_id}: {int(failures[position]) if failures is not None else 0} failing messages")
+
+    if args.output:
+        bitmap = np.concatenate(bitmaps) if bitmaps else np.zeros((0, 0), dtype=np.uint8)
+        np.savez_compressed(args.output, bitmap=bitmap, files=np.array(all_names), rule_ids=np.array(rule_ids))
+        print(f"Result bitmap saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
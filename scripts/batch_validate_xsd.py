@@ -0,0 +1,308 @@
+"""
+Validate a batch of pacs.008 messages against the XSD schema using a process pool.
+
+Messages can be read from a directory, a zip archive or a stream on stdin where
+each message starts with its own XML declaration. Each worker compiles the XSD
+once at startup and results are written as JSON lines in input order.
+
+Usage:
+    python batch_validate_xsd.py <directory|archive.zip|-> [--output results.jsonl] [--workers N]
+    python batch_validate_xsd.py <inbox directory> --watch [--interval 1.0] [--output results.jsonl]
+    python batch_validate_xsd.py --benchmark 100000
+
+Example:
+    python batch_validate_xsd.py sample_messages --output xsd_results.jsonl
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.watch import DEFAULT_POLL_INTERVAL, watch_directory
+from iso_message_generator.xsd_validation import find_xsd_schema, load_schema, validate_message
+
+_worker_schema = None
+_worker_archives = {}
+
+def _init_worker(xsd_file):
+    """Compile the XSD once for the lifetime of a worker process."""
+    global _worker_schema
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_schema = load_schema(xsd_file)
+
+def _read_item(kind, payload):
+    """Resolve a work item payload to a file path or the raw message bytes."""
+    if kind == 'zip':
+        archive_path, member = payload
+        archive = _worker_archives.get(archive_path)
+        if archive is None:
+            archive = zipfile.ZipFile(archive_path)
+            _worker_archives[archive_path] = archive
+        return archive.read(member)
+
+    return payload
+
+def _validate_item(item):
+    """Validate one work item inside a worker process."""
+    name, kind, payload = item
+
+    try:
+        result = validate_message(_read_item(kind, payload), _worker_schema)
+    except Exception as e:
+        result = {'valid': False, 'errors': [{'line': None, 'message': str(e)}]}
+
+    return {
+        'file': name,
+        'valid': result['valid'],
+        'errors': [{'line': error['line'], 'message': error['message']} for error in result['errors']]
+    }
+
+def iter_stream_messages(stream, chunk_size=1 << 16):
+    """
+    Split a byte stream of concatenated XML messages on their XML declarations.
+
+    Bytes are collected in one buffer that is searched only from where the
+    previous search stopped, so splitting stays linear in the stream size
+    however large a single message is.
+
+    Args:
+        stream (file): Binary stream containing one or more messages
+        chunk_size (int): Number of bytes read from the stream at a time
+
+    Yields:
+        bytes: Raw bytes of each message
+    """
+    declaration = b'<?xml'
+    buffer = bytearray()
+    begin = 0
+    scanned = 0
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+
+        # A declaration may straddle the previous chunk boundary
+        start = buffer.find(declaration, max(begin + 1, scanned - len(declaration) + 1))
+        while start != -1:
+            message = bytes(buffer[begin:start]).strip()
+            if message:
+                yield message
+            begin = start
+            start = buffer.find(declaration, begin + 1)
+        scanned = len(buffer)
+
+        if begin:
+            del buffer[:begin]
+            scanned -= begin
+            begin = 0
+
+    message = bytes(buffer).strip()
+    if message:
+        yield message
+
+def iter_work_items(source):
+    """
+    Enumerate the messages in a directory, zip archive or stdin stream.
+
+    Args:
+        source (str): Directory path, zip archive path, or '-' for stdin
+
+    Yields:
+        tuple: Work item (name, kind, payload) understood by the workers
+    """
+    if source == '-':
+        for i, message in enumerate(iter_stream_messages(sys.stdin.buffer)):
+            yield (f"stdin:{i}", 'bytes', message)
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = sorted(name for name in archive.namelist() if name.endswith('.xml'))
+        for name in names:
+            yield (name, 'zip', (source, name))
+    else:
+        for path in sorted(glob.glob(os.path.join(source, '**', '*.xml'), recursive=True)):
+            yield (path, 'file', path)
+
+def validate_batch(source, xsd_file, output, workers=None, chunksize=64):
+    """
+    Validate every message from a source and write JSON lines results in input order.
+
+    Args:
+        source (str): Directory path, zip archive path, or '-' for stdin
+        xsd_file (str): Path to the XSD schema file
+        output (file): Text stream receiving one JSON object per message
+        workers (int, optional): Number of worker processes, defaults to the CPU count
+        chunksize (int): Number of messages handed to a worker at a time
+
+    Returns:
+        dict: Summary with total, valid and invalid message counts
+    """
+    summary = {'total': 0, 'valid': 0, 'invalid': 0}
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(xsd_file,)) as pool:
+        for result in pool.imap(_validate_item, iter_work_items(source), chunksize):
+            output.write(json.dumps(result) + "\n")
+            summary['total'] += 1
+            summary['valid' if result['valid'] else 'invalid'] += 1
+
+    return summary
+
+def watch_batch(directory, xsd_file, output, workers=None, chunksize=64, interval=DEFAULT_POLL_INTERVAL):
+    """
+    Watch an inbox directory and validate new or modified messages as they arrive.
+
+    The worker pool, and with it every worker's compiled schema, stays alive
+    between polls so each new batch only pays for validation.
+
+    Args:
+        directory (str): Inbox directory to watch
+        xsd_file (str): Path to the XSD schema file
+        output (file): Text stream that results are appended to
+        workers (int, optional): Number of worker processes, defaults to the CPU count
+        chunksize (int): Number of messages handed to a worker at a time
+        interval (float): Seconds between polls
+
+    Returns:
+        dict: Summary with total, valid and invalid message counts
+    """
+    summary = {'total': 0, 'valid': 0, 'invalid': 0}
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(xsd_file,)) as pool:
+        def handle(xml_files):
+            items = [(xml_file, 'file', xml_file) for xml_file in xml_files]
+            for result in pool.imap(_validate_item, items, chunksize):
+                result['validated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                output.write(json.dumps(result) + "\n")
+                summary['total'] += 1
+                summary['valid' if result['valid'] else 'invalid'] += 1
+            output.flush()
+            print(f"Validated {len(xml_files)} new or modified messages", file=sys.stderr)
+
+        print(f"Watching {directory} for new or modified messages (Ctrl+C to stop)", file=sys.stderr)
+        watch_directory(directory, handle, interval)
+
+    return summary
+
+def build_benchmark_corpus(count, directory):
+    """
+    Build a zip corpus by cloning the sample messages with unique message identifiers.
+
+    Args:
+        count (int): Number of messages to generate
+        directory (str): Directory in which to create the archive
+
+    Returns:
+        str: Path to the generated zip archive
+    """
+    sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
+    templates = []
+    for sample_file in sorted(glob.glob(os.path.join(sample_dir, "*.xml"))):
+        with open(sample_file, 'rb') as f:
+            templates.append(f.read())
+
+    msg_id_pattern = re.compile(rb'(<(?:\w+:)?MsgId>)[^<]*(</(?:\w+:)?MsgId>)')
+
+    archive_path = os.path.join(directory, "benchmark_corpus.zip")
+    with zipfile.ZipFile(archive_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for i in range(count):
+            template = templates[i % len(templates)]
+            message = msg_id_pattern.sub(rb'\g<1>BENCH-%d\g<2>' % i, template, count=1)
+            archive.writestr(f"msg_{i:07d}.xml", message)
+
+    return archive_path
+
+def run_benchmark(count, xsd_file, workers):
+    """
+    Report validation throughput in messages per second for increasing worker counts.
+
+    Args:
+        count (int): Number of messages in the benchmark corpus
+        xsd_file (str): Path to the XSD schema file
+        workers (int): Maximum number of worker processes
+    """
+    directory = tempfile.mkdtemp(prefix="xsd_benchmark_")
+
+    try:
+        print(f"Building benchmark corpus of {count} messages...")
+        archive_path = build_benchmark_corpus(count, directory)
+
+        worker_counts = []
+        n = 1
+        while n < workers:
+            worker_counts.append(n)
+            n *= 2
+        worker_counts.append(workers)
+
+        with open(os.devnull, 'w') as devnull:
+            for n in worker_counts:
+                start = time.perf_counter()
+                summary = validate_batch(archive_path, xsd_file, devnull, workers=n)
+                elapsed = time.perf_counter() - start
+                print(f"  {n:3d} worker(s): {summary['total']} messages in {elapsed:.2f}s "
+                      f"({summary['total'] / elapsed:,.0f} messages/s)")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate a batch of pacs.008 messages against the XSD schema in parallel.')
+    parser.add_argument('source', nargs='?', help="Directory, zip archive, or '-' to read concatenated messages from stdin")
+    parser.add_argument('--output', type=str, help='JSON lines output file (defaults to stdout)')
+    parser.add_argument('--xsd', type=str, help='Path to the pacs.008 XSD schema')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--chunksize', type=int, default=64, help='Messages handed to a worker at a time')
+    parser.add_argument('--benchmark', type=int, metavar='N', help='Benchmark throughput against an N-message corpus')
+    parser.add_argument('--watch', action='store_true', help='Watch the source directory and validate new or modified messages, appending to the output')
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help='Seconds between polls in watch mode')
+
+    args = parser.parse_args()
+
+    xsd_file = find_xsd_schema(args.xsd)
+    if not xsd_file:
+        print("Error: XSD schema not available")
+        sys.exit(1)
+
+    if args.benchmark:
+        run_benchmark(args.benchmark, xsd_file, args.workers)
+        return
+
+    if not args.source:
+        parser.error("a source directory, zip archive or '-' is required")
+
+    if args.watch:
+        if not os.path.isdir(args.source):
+            parser.error("--watch requires a source directory")
+
+        if args.output:
+            with open(args.output, 'a', encoding='utf-8') as output:
+                summary = watch_batch(args.source, xsd_file, output, args.workers, args.chunksize, args.interval)
+        else:
+            summary = watch_batch(args.source, xsd_file, sys.stdout, args.workers, args.chunksize, args.interval)
+
+        print(f"Validated {summary['total']} messages ({summary['valid']} valid, {summary['invalid']} invalid)",
+              file=sys.stderr)
+        return
+
+    start = time.perf_counter()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            summary = validate_batch(args.source, xsd_file, output, args.workers, args.chunksize)
+    else:
+        summary = validate_batch(args.source, xsd_file, sys.stdout, args.workers, args.chunksize)
+
+    elapsed = time.perf_counter() - start
+    print(f"Validated {summary['total']} messages ({summary['valid']} valid, {summary['invalid']} invalid) "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Check amounts and currencies of pacs.008 messages with exact decimal arithmetic in constant memory.
+
+Checks ISO 4217 minor-unit precision of every amount, NbOfTxs, CtrlSum and
+TtlIntrBkSttlmAmt against the transactions, and InstdAmt/XchgRate/IntrBkSttlmAmt
+coherence, streaming one transaction at a time.
+
+Usage:
+    python check_amounts.py <directory|xml_file> [--output amount_results.jsonl] [--max-errors 1000]
+
+Example:
+    python check_amounts.py sample_messages
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.amount_checks import check_amounts
+
+def main():
+    parser = argparse.ArgumentParser(description='Check pacs.008 amounts and currencies with exact decimal arithmetic.')
+    parser.add_argument('source', type=str, help='XML file or directory of XML files')
+    parser.add_argument('--output', type=str, help='JSON lines output file (defaults to stdout)')
+    parser.add_argument('--max-errors', type=int, default=1000, help='Maximum number of errors reported per message')
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        files = sorted(glob.glob(os.path.join(args.source, '**', '*.xml'), recursive=True))
+    else:
+        files = [args.source]
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    invalid = 0
+    start = time.perf_counter()
+
+    try:
+        for xml_file in files:
+            result = check_amounts(xml_file, args.max_errors)
+            if not result['valid']:
+                invalid += 1
+            output.write(json.dumps(dict(result, file=xml_file)) + "\n")
+    finally:
+        if args.output:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Checked amounts of {len(files)} messages in {elapsed:.2f}s: {len(files) - invalid} consistent, {invalid} with errors",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Check pacs.008 messages for reused MsgId (per sender), EndToEndId and UETR against the history of earlier messages.
+
+Identifiers are recorded in an on-disk uniqueness index fronted by an in-memory
+Bloom filter, so every run is checked against all messages seen within the
+retention window.
+
+Usage:
+    python check_duplicates.py <directory|xml_file> [--index identifiers.sqlite] [--window-days 90] [--expected 10000000]
+
+Example:
+    python check_duplicates.py inbox/ --window-days 30
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.rule_engine import build_message_index
+from iso_message_generator.uniqueness_index import (DEFAULT_EXPECTED_ITEMS, DEFAULT_WINDOW_DAYS, check_message_identifiers,
+                                                    close_uniqueness_index, evict_identifiers, open_uniqueness_index)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check pacs.008 messages for reused identifiers.')
+    parser.add_argument('source', type=str, help='XML file or directory of XML files')
+    parser.add_argument('--index', type=str, help='Uniqueness index file (defaults to .uniqueness_index.sqlite in the repository)')
+    parser.add_argument('--window-days', type=float, default=DEFAULT_WINDOW_DAYS, help='Days identifiers are remembered')
+    parser.add_argument('--expected', type=int, default=DEFAULT_EXPECTED_ITEMS, help='Number of identifiers the Bloom filter is sized for')
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        files = sorted(glob.glob(os.path.join(args.source, '**', '*.xml'), recursive=True))
+    else:
+        files = [args.source]
+
+    index = open_uniqueness_index(args.index, args.expected)
+    duplicate_count = 0
+    start = time.perf_counter()
+
+    try:
+        evicted = evict_identifiers(index, args.window_days)
+        if evicted:
+            print(f"Evicted {evicted} identifiers older than {args.window_days} days", file=sys.stderr)
+
+        for xml_file in files:
+            try:
+                message_index = build_message_index(ET.parse(xml_file).getroot())
+            except ET.ParseError as e:
+                print(f"Skipping {xml_file}: {e}", file=sys.stderr)
+                continue
+
+            duplicates = check_message_identifiers(index, message_index, xml_file)
+            for duplicate in duplicates:
+                print(json.dumps(dict(duplicate, file=xml_file)))
+            duplicate_count += len(duplicates)
+    finally:
+        close_uniqueness_index(index)
+
+    elapsed = time.perf_counter() - start
+    print(f"Checked {len(files)} messages in {elapsed:.2f}s: {duplicate_count} reused identifiers", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
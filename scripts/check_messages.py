@@ -0,0 +1,70 @@
+"""
+Check pacs.008 messages with XSD validation, business rules, coverage and duplicate detection.
+
+Each message is parsed once and every check runs on the same in-memory tree; the
+findings are merged into one JSON record per message.
+
+Usage:
+    python check_messages.py <directory|xml_file> [--xsd pacs.008.001.08.xsd] [--rules all_rules.json] [--output check_results.jsonl]
+
+Example:
+    python check_messages.py sample_messages --output check_results.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.check import check_message, load_spec_paths
+from iso_message_generator.rule_engine import compile_rules, load_rules
+from iso_message_generator.xsd_validation import find_xsd_schema, load_schema
+
+def main():
+    parser = argparse.ArgumentParser(description='Check pacs.008 messages with every validator on a single parse.')
+    parser.add_argument('source', type=str, help='XML file or directory of XML files')
+    parser.add_argument('--xsd', type=str, help='Path to the pacs.008 XSD schema')
+    parser.add_argument('--rules', type=str, help='Rules JSON file (defaults to reference/all_rules.json)')
+    parser.add_argument('--fields', type=str, help='Fields JSON file (defaults to reference/all_fields.json)')
+    parser.add_argument('--output', type=str, help='JSON lines output file (defaults to stdout)')
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        files = sorted(glob.glob(os.path.join(args.source, '**', '*.xml'), recursive=True))
+    else:
+        files = [args.source]
+
+    xsd_file = find_xsd_schema(args.xsd)
+    schema = load_schema(xsd_file) if xsd_file else None
+    if schema is None:
+        print("XSD schema not available, skipping XSD validation", file=sys.stderr)
+
+    compiled_rules = compile_rules(load_rules(args.rules))
+    spec_paths = load_spec_paths(args.fields)
+    seen = {}
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    counts = {'valid': 0, 'invalid': 0, 'duplicates': 0}
+    start = time.perf_counter()
+
+    try:
+        for xml_file in files:
+            record = check_message(xml_file, schema, compiled_rules, spec_paths, seen)
+
+            counts['valid' if record['valid'] else 'invalid'] += 1
+            counts['duplicates'] += len(record.get('duplicates', []))
+
+            output.write(json.dumps(record) + "\n")
+    finally:
+        if args.output:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Checked {len(files)} messages in {elapsed:.2f}s: {counts['valid']} valid, {counts['invalid']} invalid, "
+          f"{counts['duplicates']} duplicate identifiers", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Check that return and related payments reference an existing original payment with matching amounts.
+
+Without --store the whole corpus is reconciled in memory with a hash join over the
+payment identifiers. With --store every message is added to an indexed SQLite
+message store, and references are resolved against everything stored so far,
+including originals from earlier runs.
+
+Usage:
+    python check_references.py <directory|xml_file> [--store message_store.sqlite] [--output reference_results.jsonl]
+
+Example:
+    python check_references.py sample_messages
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.rule_engine import build_message_index
+from iso_message_generator.reference_checks import (add_records, check_references, close_message_store,
+                                                    open_message_store, reconcile_records, transaction_records)
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolve return and related payments against their originals.')
+    parser.add_argument('source', type=str, help='XML file or directory of XML files')
+    parser.add_argument('--store', type=str, help='Indexed message store file kept across runs')
+    parser.add_argument('--output', type=str, help='JSON lines output file (defaults to stdout)')
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        files = sorted(glob.glob(os.path.join(args.source, '**', '*.xml'), recursive=True))
+    else:
+        files = [args.source]
+
+    start = time.perf_counter()
+    records = []
+    read_files = []
+    for xml_file in files:
+        try:
+            records.extend(transaction_records(build_message_index(ET.parse(xml_file).getroot()), xml_file))
+            read_files.append(xml_file)
+        except ET.ParseError as e:
+            print(f"Skipping {xml_file}: {e}", file=sys.stderr)
+
+    if args.store:
+        conn = open_message_store(args.store)
+        try:
+            add_records(conn, records, read_files)
+            findings = check_references(conn, records)
+        finally:
+            close_message_store(conn)
+    else:
+        findings = reconcile_records(records)
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for finding in findings:
+            output.write(json.dumps(finding) + "\n")
+    finally:
+        if args.output:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for finding in findings if finding['errors'])
+    print(f"Resolved {len(findings)} references from {len(records)} transactions in {elapsed:.2f}s: "
+          f"{len(findings) - failed} consistent, {failed} unresolved or inconsistent", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compare the size and parse cost of messages in the pretty and the compact output modes.
+
+Each message is serialized in both modes, with and without the XML declaration
+as requested, and parsed repeatedly with lxml. The byte count and the best parse
+time of every variant are reported per message and in total, to estimate the
+bandwidth and parse cost saved by sending the compact wire format.
+
+Usage:
+    python compare_output_modes.py <directory|xml_file> [...] [--no-declaration] [--repeat 20]
+        [--output sizes.jsonl]
+
+Example:
+    python compare_output_modes.py coverage_messages --output output_modes.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from xml.parsers.expat import ExpatError
+
+from lxml import etree
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.xml_formatter import OUTPUT_MODES, format_bytes, output_options
+from scripts.format_xml import collect_files
+
+def parse_seconds(data, repeat):
+    """
+    Measure how long lxml takes to parse a message.
+
+    Args:
+        data (bytes): Serialized message
+        repeat (int): Number of parses
+
+    Returns:
+        float: Fastest parse time in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        etree.fromstring(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def compare_message(xml_file, xml_declaration, repeat):
+    """
+    Serialize one message in every output mode and measure each variant.
+
+    Args:
+        xml_file (str): Path to the XML file
+        xml_declaration (bool): Keep the XML declaration in both modes
+        repeat (int): Number of parses per variant
+
+    Returns:
+        dict: Dictionary with 'message' and, per output mode, 'bytes' and 'parse_seconds'
+    """
+    with open(xml_file, 'rb') as f:
+        data = f.read()
+
+    result = {'message': xml_file, 'xml_declaration': xml_declaration}
+    for mode in OUTPUT_MODES:
+        serialized = format_bytes(data, **output_options(mode == 'compact', xml_declaration))
+        result[mode] = {'bytes': len(serialized), 'parse_seconds': parse_seconds(serialized, repeat)}
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare message size and parse cost of the pretty and compact output modes.')
+    parser.add_argument('sources', nargs='*', help='XML files or directories (defaults to sample_messages)')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration in both modes')
+    parser.add_argument('--repeat', type=int, default=20, help='Parses per variant, the fastest is reported')
+    parser.add_argument('--output', type=str, help='Write per-message results to this JSON lines file')
+
+    args = parser.parse_args()
+
+    sources = args.sources or [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")]
+    files = collect_files(sources)
+    print(f"Found {len(files)} XML files")
+
+    results = []
+    for xml_file in files:
+        try:
+            result = compare_message(xml_file, not args.no_declaration, args.repeat)
+        except (ExpatError, etree.XMLSyntaxError, OSError) as e:
+            print(f"  Error reading {xml_file}: {e}")
+            continue
+        results.append(result)
+
+        pretty, compact = result['pretty'], result['compact']
+        print(f"  {os.path.basename(xml_file)}: {pretty['bytes']} -> {compact['bytes']} bytes "
+              f"({(1 - compact['bytes'] / pretty['bytes']) * 100:.1f}% smaller), parse "
+              f"{pretty['parse_seconds'] * 1e6:.0f} -> {compact['parse_seconds'] * 1e6:.0f} us")
+
+    if not results:
+        return
+
+    totals = {mode: {'bytes': sum(result[mode]['bytes'] for result in results),
+                     'parse_seconds': sum(result[mode]['parse_seconds'] for result in results)}
+              for mode in OUTPUT_MODES}
+    pretty, compact = totals['pretty'], totals['compact']
+    print(f"Total: {pretty['bytes']} -> {compact['bytes']} bytes "
+          f"({(1 - compact['bytes'] / pretty['bytes']) * 100:.1f}% smaller), parse "
+          f"{pretty['parse_seconds'] * 1000:.2f} -> {compact['parse_seconds'] * 1000:.2f} ms "
+          f"({(1 - compact['parse_seconds'] / pretty['parse_seconds']) * 100:.1f}% faster)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,16 @@
 Create clean XML files for ISO 20022 payment scenarios.
 This script generates well-formed XML files from scratch based on the payment scenarios.
 """
+import argparse
 import os
 import sys
 import glob
 import json
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.c14n import write_if_changed
+from iso_message_generator.xml_formatter import append_size_log, serialize_message, size_record
+
 def create_domestic_payment_xml():
     """Create a clean XML for domestic payment scenario."""
     xml = """<?xml version="1.0" encoding="UTF-8"?>
@@ -552,6 +557,15 @@ def create_international_payment_xml():
     return xml
 
 def main():
+    parser = argparse.ArgumentParser(description='Create clean XML files for the payment scenarios.')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    
+    args = parser.parse_args()
+    
+    compact, xml_declaration, size_log = args.compact, not args.no_declaration, args.size_log
+    
     sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
     
     os.makedirs(sample_dir, exist_ok=True)
@@ -566,10 +580,19 @@ def main():
         "international_payment.xml": create_international_payment_xml()
     }
     
+    sizes = []
     for filename, xml_content in scenarios.items():
         file_path = os.path.join(sample_dir, filename)
+        xml_content = serialize_message(xml_content.encode('utf-8'), compact, xml_declaration)
+        sizes.append(size_record(filename, xml_content, compact, xml_declaration))
         
+        # Bytes are compared, so switching the output mode rewrites the file
         if os.path.exists(file_path):
+            with open(file_path, 'rb') as f:
+                if f.read() == xml_content.encode('utf-8'):
+                    print(f"  {filename} is unchanged, skipping")
+                    continue
+            
             backup_path = file_path + '.bak'
             try:
                 with open(file_path, 'r', encoding='utf-8') as f:
@@ -583,14 +606,19 @@ def main():
                 print(f"  Error backing up {filename}: {e}")
         
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(xml_content)
+            write_if_changed(file_path, xml_content, compare='bytes')
             
             print(f"  Created clean XML for {filename}")
         except Exception as e:
             print(f"  Error creating clean XML for {filename}: {e}")
     
     print(f"Created clean XML files for {len(scenarios)} payment scenarios")
+    
+    total_bytes = sum(record['bytes'] for record in sizes)
+    print(f"Wrote {len(sizes)} {'compact' if compact else 'pretty'} messages, {total_bytes} bytes in total")
+    if size_log:
+        append_size_log(size_log, sizes)
+        print(f"Appended message sizes to {size_log}")
 
 if __name__ == "__main__":
     main()
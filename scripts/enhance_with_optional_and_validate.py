@@ -1,17 +1,21 @@
 """
 Enhance XML files with optional parameters and validate against XSD schema.
 """
+import argparse
 import os
 import sys
 import glob
 import pandas as pd
 import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
 import re
 import requests
 import tempfile
 from lxml import etree
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.c14n import write_if_changed
+from iso_message_generator.xml_formatter import XML_DECLARATION, append_size_log, serialize_message, size_record
+
 def extract_optional_fields(excel_file):
     """
     Extract optional fields from the Full_View sheet of an ISO 20022 Excel file.
@@ -122,16 +126,18 @@ def validate_against_xsd(xml_file, xsd_file):
         print(f"  Error validating {os.path.basename(xml_file)}: {e}")
         return False
 
-def enhance_xml_with_optional_fields(xml_file, optional_fields):
+def enhance_xml_with_optional_fields(xml_file, optional_fields, compact=False, xml_declaration=True):
     """
     Enhance an XML file with optional fields.
     
     Args:
         xml_file (str): Path to the XML file
         optional_fields (dict): Dictionary containing optional fields by path
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
         
     Returns:
-        bool: True if file was updated, False otherwise
+        str: The enhanced message as written, or None if it could not be enhanced
     """
     print(f"Enhancing {os.path.basename(xml_file)} with optional fields...")
     
@@ -178,32 +184,39 @@ def enhance_xml_with_optional_fields(xml_file, optional_fields):
             if not elem.tag.startswith('{'):
                 elem.tag = f"{{urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08}}{elem.tag}"
         
-        rough_string = ET.tostring(root, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        pretty_xml = reparsed.toprettyxml(indent="  ")
-        
-        if not pretty_xml.startswith('<?xml'):
-            pretty_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + pretty_xml
+        xml = serialize_message(ET.tostring(root, 'utf-8'), compact, xml_declaration)
         
         with open(xml_file, 'r', encoding='utf-8') as f:
             original_content = f.read()
         
+        # ElementTree drops comments, so the leading comment is put back after the declaration
         comment_match = re.search(r'<!--(.*?)-->', original_content, re.DOTALL)
         if comment_match:
-            comment = comment_match.group(0)
-            pretty_xml = re.sub(r'<\?xml.*?\?>', f'<?xml version="1.0" encoding="UTF-8"?>\n{comment}', pretty_xml)
+            separator = "" if compact else "\n"
+            if xml.startswith(XML_DECLARATION):
+                xml = XML_DECLARATION + separator + comment_match.group(0) + xml[len(XML_DECLARATION):]
+            else:
+                xml = comment_match.group(0) + separator + xml
         
-        with open(xml_file, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
+        write_if_changed(xml_file, xml, compare='bytes')
         
-        print(f"  Successfully enhanced {os.path.basename(xml_file)} with optional fields")
-        return True
+        print(f"  Successfully enhanced {os.path.basename(xml_file)} with optional fields ({len(xml.encode('utf-8'))} bytes)")
+        return xml
     
     except Exception as e:
         print(f"  Error enhancing {os.path.basename(xml_file)}: {e}")
-        return False
+        return None
 
 def main():
+    parser = argparse.ArgumentParser(description='Enhance the sample messages with optional fields and validate them against the XSD schema.')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    
+    args = parser.parse_args()
+    
+    compact, xml_declaration, size_log = args.compact, not args.no_declaration, args.size_log
+    
     excel_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
                              "data/rtr_fi_to_fi_customer_credit_transfer_pacs.008excel.xlsx")
     
@@ -219,12 +232,19 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    enhanced_files = 0
+    sizes = []
     for sample_file in sample_files:
-        if enhance_xml_with_optional_fields(sample_file, optional_fields):
-            enhanced_files += 1
+        xml = enhance_xml_with_optional_fields(sample_file, optional_fields, compact, xml_declaration)
+        if xml is not None:
+            sizes.append(size_record(os.path.basename(sample_file), xml, compact, xml_declaration))
+    enhanced_files = len(sizes)
     
     print(f"Enhanced {enhanced_files} of {len(sample_files)} sample files with optional fields")
+    total_bytes = sum(record['bytes'] for record in sizes)
+    print(f"Wrote {enhanced_files} {'compact' if compact else 'pretty'} messages, {total_bytes} bytes in total")
+    if size_log:
+        append_size_log(size_log, sizes)
+        print(f"Appended message sizes to {size_log}")
     
     xsd_file = download_xsd_schema()
     
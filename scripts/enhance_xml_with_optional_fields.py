@@ -1,14 +1,17 @@
 """
 Enhance XML sample messages with optional fields from the ISO 20022 standard.
 """
+import argparse
 import os
 import sys
 import json
 import glob
 import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
+from xml.parsers.expat import ExpatError
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.c14n import write_if_changed
+from iso_message_generator.xml_formatter import XML_DECLARATION, append_size_log, serialize_message, size_record
 
 def load_json_file(file_path):
     """Load a JSON file."""
@@ -83,8 +86,20 @@ def get_scenario_fields(scenario_name, examples):
     
     return scenario_fields
 
-def enhance_xml_file(xml_file, fields, rules):
-    """Enhance an XML file with optional fields."""
+def enhance_xml_file(xml_file, fields, rules, compact=False, xml_declaration=True):
+    """
+    Enhance an XML file with optional fields.
+    
+    Args:
+        xml_file (str): Path to the XML file
+        fields (dict): Field lists from reference/all_fields.json
+        rules (list): Rules from reference/all_rules.json
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
+        
+    Returns:
+        str: The enhanced message as written
+    """
     print(f"Enhancing {os.path.basename(xml_file)}...")
     
     filename = os.path.basename(xml_file)
@@ -131,28 +146,28 @@ def enhance_xml_file(xml_file, fields, rules):
     rough_string = ET.tostring(root, 'utf-8')
     
     try:
-        reparsed = minidom.parseString(rough_string)
-        pretty_xml = reparsed.toprettyxml(indent="  ")
-    except Exception as e:
+        xml = serialize_message(rough_string, compact, xml_declaration)
+    except ExpatError as e:
         print(f"  Error formatting XML: {e}")
-        decoded = rough_string.decode('utf-8')
-        pretty_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + decoded
-    
-    lines = pretty_xml.splitlines()
-    cleaned_lines = []
-    for line in lines:
-        if line.strip():  # Keep non-empty lines
-            cleaned_lines.append(line)
+        xml = rough_string.decode('utf-8')
+        if xml_declaration:
+            xml = XML_DECLARATION + "\n" + xml
     
-    cleaned_xml = "\n".join(cleaned_lines)
+    write_if_changed(xml_file, xml, compare='bytes')
     
-    with open(xml_file, 'w') as f:
-        f.write(cleaned_xml)
-    
-    print(f"  Enhanced {os.path.basename(xml_file)} with optional fields")
-    return True
+    print(f"  Enhanced {os.path.basename(xml_file)} with optional fields ({len(xml.encode('utf-8'))} bytes)")
+    return xml
 
 def main():
+    parser = argparse.ArgumentParser(description='Enhance the sample messages with optional fields.')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    
+    args = parser.parse_args()
+    
+    compact, xml_declaration, size_log = args.compact, not args.no_declaration, args.size_log
+    
     fields_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference/all_fields.json")
     rules_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "reference/all_rules.json")
     
@@ -164,12 +179,17 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    enhanced_files = 0
+    sizes = []
     for sample_file in sample_files:
-        if enhance_xml_file(sample_file, fields, rules):
-            enhanced_files += 1
-    
-    print(f"Enhanced {enhanced_files} of {len(sample_files)} sample files with optional fields")
+        xml = enhance_xml_file(sample_file, fields, rules, compact, xml_declaration)
+        sizes.append(size_record(os.path.basename(sample_file), xml, compact, xml_declaration))
+    
+    print(f"Enhanced {len(sizes)} of {len(sample_files)} sample files with optional fields")
+    total_bytes = sum(record['bytes'] for record in sizes)
+    print(f"Wrote {len(sizes)} {'compact' if compact else 'pretty'} messages, {total_bytes} bytes in total")
+    if size_log:
+        append_size_log(size_log, sizes)
+        print(f"Appended message sizes to {size_log}")
 
 if __name__ == "__main__":
     main()
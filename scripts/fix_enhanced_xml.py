@@ -1,12 +1,20 @@
 """
 Fix formatting issues in enhanced XML files.
+
+Escaped markup left by the enhancer is cleaned up in the text, then the message
+is parsed once, repaired with the tree repairs of iso_message_generator.repairs
+and serialized once.
 """
 import os
 import sys
 import glob
 import re
-import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
+import functools
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.batch_rewrite import print_rewrite_results, rewrite_file, rewrite_files
+from iso_message_generator.repairs import load_repair_schema, repair_message
+from iso_message_generator.xsd_validation import find_xsd_schema
 
 def clean_xml_content(content):
     """Clean XML content by removing HTML entities and fixing formatting."""
@@ -19,45 +27,36 @@ def clean_xml_content(content):
     
     content = re.sub(r'<@Ccy>([^<]+)</@Ccy>', r' Ccy="\1"', content)
     
-    content = re.sub(r'(\d+\.\d+)\s+Ccy="([^"]+)"', r'\1" Ccy="\2', content)
-    
     return content
 
-def fix_xml_file(xml_file):
-    """Fix XML formatting in a file."""
+def fix_enhanced_stream(source, output, xsd_file=None):
+    """
+    Clean an enhanced XML message and repair it in one pass over its tree.
+    
+    The text is cleaned first, since escaped markup and <@Ccy> elements are not
+    XML a parser can recover; everything else is left to the tree repairs.
+    
+    Args:
+        source (file): Binary file object to read the message from
+        output (file): Binary file object to write the fixed message to
+        xsd_file (str, optional): XSD for the schema-aware repairs
+    """
+    data = clean_xml_content(source.read().decode('utf-8')).encode('utf-8')
+    schema_table = load_repair_schema(xsd_file) if xsd_file else None
+    repaired = repair_message(data, schema_table)
+    output.write(repaired['data'] if repaired['data'] is not None else data)
+
+def fix_xml_file(xml_file, xsd_file=None):
+    """Fix XML formatting in a file, replacing it atomically if its content changes."""
     print(f"Fixing {os.path.basename(xml_file)}...")
     
-    try:
-        with open(xml_file, 'r') as f:
-            content = f.read()
-        
-        cleaned_content = clean_xml_content(content)
-        
-        try:
-            root = ET.fromstring(cleaned_content)
-            rough_string = ET.tostring(root, 'utf-8')
-            reparsed = minidom.parseString(rough_string)
-            pretty_xml = reparsed.toprettyxml(indent="  ")
-            
-            lines = pretty_xml.splitlines()
-            cleaned_lines = []
-            for line in lines:
-                if line.strip():  # Keep non-empty lines
-                    cleaned_lines.append(line)
-            
-            pretty_xml = "\n".join(cleaned_lines)
-        except Exception as e:
-            print(f"  Error parsing XML after cleaning: {e}")
-            pretty_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + cleaned_content
-        
-        with open(xml_file, 'w') as f:
-            f.write(pretty_xml)
-        
-        print(f"  Fixed {os.path.basename(xml_file)}")
-        return True
-    except Exception as e:
-        print(f"  Error fixing {os.path.basename(xml_file)}: {e}")
+    result = rewrite_file(xml_file, functools.partial(fix_enhanced_stream, xsd_file=xsd_file))
+    if result['status'] == 'error':
+        print(f"  Error fixing {os.path.basename(xml_file)}: {result['error']}")
         return False
+    
+    print(f"  {os.path.basename(xml_file)} {result['status']}")
+    return True
 
 def main():
     sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
@@ -65,12 +64,11 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    fixed_files = 0
-    for sample_file in sample_files:
-        if fix_xml_file(sample_file):
-            fixed_files += 1
+    results = rewrite_files(sample_files, functools.partial(fix_enhanced_stream, xsd_file=find_xsd_schema()))
+    summary = print_rewrite_results(results)
     
-    print(f"Fixed {fixed_files} of {len(sample_files)} sample files")
+    print(f"Fixed {summary['rewritten']} of {len(sample_files)} sample files, "
+          f"{summary['unchanged']} unchanged, {summary['errors']} errors")
 
 if __name__ == "__main__":
     main()
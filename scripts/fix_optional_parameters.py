@@ -4,38 +4,15 @@ Fix XML files with optional parameters to ensure they validate against XSD schem
 import os
 import sys
 import glob
-import re
-import requests
-import tempfile
 from lxml import etree
 
-def download_xsd_schema():
-    """
-    Download the ISO 20022 XSD schema for pacs.008.001.08.
-    
-    Returns:
-        str: Path to the downloaded XSD file
-    """
-    print("Downloading ISO 20022 XSD schema...")
-    
-    try:
-        url = "https://www.iso20022.org/sites/default/files/documents/messages/pacs/schemas/pacs.008.001.08.xsd"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            xsd_file = os.path.join(tempfile.gettempdir(), "pacs.008.001.08.xsd")
-            with open(xsd_file, 'wb') as f:
-                f.write(response.content)
-            
-            print(f"Downloaded XSD schema to {xsd_file}")
-            return xsd_file
-        else:
-            print(f"Failed to download XSD schema: {response.status_code}")
-            return None
-    
-    except Exception as e:
-        print(f"Error downloading XSD schema: {e}")
-        return None
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.repairs import print_repair_results, repair_file, repair_files, select_repairs
+from iso_message_generator.xsd_validation import find_xsd_schema
+
+# Registered repairs (see iso_message_generator/repairs.py) this script runs
+OPTIONAL_PARAMETER_REPAIRS = ('close_leaf_element', 'misplaced_element', 'strip_whitespace', 'code_choice_text',
+                              'drop_unknown_element', 'child_order')
 
 def validate_against_xsd(xml_file, xsd_file):
     """
@@ -70,71 +47,32 @@ def validate_against_xsd(xml_file, xsd_file):
         print(f"  Error validating {os.path.basename(xml_file)}: {e}")
         return False
 
-def fix_xml_file(xml_file):
+def fix_xml_file(xml_file, schema_table=None):
     """
     Fix XML file with optional parameters to ensure it validates against XSD schema.
     
+    The message is repaired in one pass over its tree and replaced atomically,
+    only if a repair changed it. Optional components are repaired in place
+    instead of being replaced with fixed sample content.
+    
     Args:
         xml_file (str): Path to the XML file
+        schema_table (dict, optional): Table from load_repair_schema, without it
+            only the repairs that do not need the XSD run
         
     Returns:
-        bool: True if file was updated, False otherwise
+        bool: True if file was repaired or needed no repair, False on error
     """
     print(f"Fixing {os.path.basename(xml_file)}...")
     
-    try:
-        with open(xml_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        content = re.sub(r'<(ns\d+):Cd>(.*?)</\1:Cd', r'<\1:Cd>\2</\1:Cd>', content)
-        
-        if 'return_payment.xml' in xml_file:
-            content = re.sub(r'<(ns\d+):RtrRsnInf>.*?</\1:RtrRsnInf>', '', content, flags=re.DOTALL)
-        
-        ns_match = re.search(r'<(\w+):Document', content)
-        ns_prefix = ns_match.group(1) if ns_match else "ns0"
-        
-        instr_for_cdtr_agt_pattern = r'<{}:InstrForCdtrAgt>.*?</{}:InstrForCdtrAgt>'.format(ns_prefix, ns_prefix)
-        if re.search(instr_for_cdtr_agt_pattern, content, re.DOTALL):
-            correct_instr = f"""
-      <{ns_prefix}:InstrForCdtrAgt>
-        <{ns_prefix}:Cd>PHOB</{ns_prefix}:Cd>
-        <{ns_prefix}:InstrInf>Please contact beneficiary by phone before credit</{ns_prefix}:InstrInf>
-      </{ns_prefix}:InstrForCdtrAgt>"""
-            
-            content = re.sub(instr_for_cdtr_agt_pattern, correct_instr, content, flags=re.DOTALL)
-        
-        purp_pattern = r'<{}:Purp>.*?</{}:Purp>'.format(ns_prefix, ns_prefix)
-        if re.search(purp_pattern, content, re.DOTALL):
-            correct_purp = f"""
-      <{ns_prefix}:Purp>
-        <{ns_prefix}:Cd>CASH</{ns_prefix}:Cd>
-      </{ns_prefix}:Purp>"""
-            
-            content = re.sub(purp_pattern, correct_purp, content, flags=re.DOTALL)
-        
-        rgltry_rptg_pattern = r'<{}:RgltryRptg>.*?</{}:RgltryRptg>'.format(ns_prefix, ns_prefix)
-        if re.search(rgltry_rptg_pattern, content, re.DOTALL):
-            correct_rgltry = f"""
-      <{ns_prefix}:RgltryRptg>
-        <{ns_prefix}:DbtCdtRptgInd>CRED</{ns_prefix}:DbtCdtRptgInd>
-        <{ns_prefix}:Authrty>
-          <{ns_prefix}:Nm>Regulatory Authority</{ns_prefix}:Nm>
-          <{ns_prefix}:Ctry>CA</{ns_prefix}:Ctry>
-        </{ns_prefix}:Authrty>
-      </{ns_prefix}:RgltryRptg>"""
-            
-            content = re.sub(rgltry_rptg_pattern, correct_rgltry, content, flags=re.DOTALL)
-        
-        with open(xml_file, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        print(f"  Successfully fixed {os.path.basename(xml_file)}")
-        return True
-    
-    except Exception as e:
-        print(f"  Error fixing {os.path.basename(xml_file)}: {e}")
+    result = repair_file(xml_file, schema_table, select_repairs(OPTIONAL_PARAMETER_REPAIRS))
+    if result['status'] == 'error':
+        print(f"  Error repairing {os.path.basename(xml_file)}: {result['error']}")
         return False
+    
+    changes = ', '.join(f"{repair} x{count}" for repair, count in result['repairs'].items())
+    print(f"  {os.path.basename(xml_file)} {result['status']}" + (f" ({changes})" if changes else ""))
+    return True
 
 def create_validation_report(sample_files, validation_results):
     """
@@ -186,14 +124,13 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    fixed_files = 0
-    for sample_file in sample_files:
-        if fix_xml_file(sample_file):
-            fixed_files += 1
+    xsd_file = find_xsd_schema()
     
-    print(f"Fixed {fixed_files} of {len(sample_files)} sample files")
+    results = repair_files(sample_files, xsd_file, OPTIONAL_PARAMETER_REPAIRS)
+    summary = print_repair_results(results)
     
-    xsd_file = download_xsd_schema()
+    print(f"Fixed {summary['repaired']} of {len(sample_files)} sample files, "
+          f"{summary['unchanged']} unchanged, {summary['errors']} errors")
     
     validation_results = {}
     
@@ -1,42 +1,57 @@
 """
 Fix XML declaration issues in sample messages.
+
+Files are fixed in parallel and replaced atomically, and only files whose
+canonical content changes are rewritten.
 """
 import os
 import sys
 import glob
 import re
+import functools
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.batch_rewrite import print_rewrite_results, rewrite_file, rewrite_files, text_transform
+
+def fix_declaration_content(content):
+    """
+    Fix XML declaration issues in the text of a message.
+
+    Args:
+        content (str): Message text
+
+    Returns:
+        str: Fixed message text
+    """
+    if '</?xml>' in content:
+        content = content.replace('<?xml version="1.0" encoding="UTF-8"?></?xml>', 
+                                 '<?xml version="1.0" encoding="UTF-8"?>')
+    
+    content = re.sub(r'(\d+\.\d+)"?\s+Ccy="([^"]+)', r'\1" Ccy="\2"', content)
+    
+    return content
 
 def fix_xml_declaration(file_path):
     """
     Fix XML declaration issues in a file.
     
+    The file is replaced atomically, and only if its canonical content changes.
+    
     Args:
         file_path (str): Path to the XML file
         
     Returns:
-        bool: True if file was updated, False otherwise
+        bool: True if file was fixed or needed no fix, False on error
     """
     print(f"Fixing XML declaration in {os.path.basename(file_path)}...")
     
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        if '</?xml>' in content:
-            content = content.replace('<?xml version="1.0" encoding="UTF-8"?></?xml>', 
-                                     '<?xml version="1.0" encoding="UTF-8"?>')
-        
-        content = re.sub(r'(\d+\.\d+)"?\s+Ccy="([^"]+)', r'\1" Ccy="\2"', content)
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        print(f"  Fixed XML declaration in {os.path.basename(file_path)}")
-        return True
-    
-    except Exception as e:
-        print(f"  Error fixing XML declaration in {os.path.basename(file_path)}: {e}")
+    result = rewrite_file(file_path, functools.partial(text_transform, fix_declaration_content))
+    if result['status'] == 'error':
+        print(f"  Error fixing XML declaration in {os.path.basename(file_path)}: {result['error']}")
         return False
+    
+    print(f"  XML declaration in {os.path.basename(file_path)} {result['status']}")
+    return True
 
 def main():
     sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
@@ -45,12 +60,11 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    fixed_files = 0
-    for sample_file in sample_files:
-        if fix_xml_declaration(sample_file):
-            fixed_files += 1
+    results = rewrite_files(sample_files, functools.partial(text_transform, fix_declaration_content))
+    summary = print_rewrite_results(results)
     
-    print(f"Fixed {fixed_files} of {len(sample_files)} sample files")
+    print(f"Fixed {summary['rewritten']} of {len(sample_files)} sample files, "
+          f"{summary['unchanged']} unchanged, {summary['errors']} errors")
 
 if __name__ == "__main__":
     main()
@@ -4,8 +4,10 @@ Fix XML formatting in sample messages to remove extra spaces and ensure consiste
 import os
 import sys
 import glob
-import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
+from xml.parsers.expat import ExpatError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.xml_formatter import format_file
 
 def fix_xml_formatting(xml_file):
     """
@@ -19,38 +21,12 @@ def fix_xml_formatting(xml_file):
     """
     print(f"Fixing formatting in {os.path.basename(xml_file)}...")
     
-    with open(xml_file, 'r') as f:
-        content = f.read()
-    
     try:
-        root = ET.fromstring(content)
-    except ET.ParseError as e:
+        format_file(xml_file)
+    except (ExpatError, OSError) as e:
         print(f"  Error parsing XML: {e}")
         return False
     
-    for elem in root.iter():
-        if '}' in elem.tag:
-            elem.tag = elem.tag.split('}', 1)[1]  # Remove namespace prefix
-    
-    rough_string = ET.tostring(root, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    
-    pretty_xml = reparsed.toprettyxml(indent="  ")
-    
-    lines = pretty_xml.splitlines()
-    cleaned_lines = []
-    for line in lines:
-        if line.strip():  # Keep non-empty lines
-            cleaned_lines.append(line)
-    
-    cleaned_xml = "\n".join(cleaned_lines)
-    
-    if not cleaned_xml.startswith('<?xml'):
-        cleaned_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + cleaned_xml
-    
-    with open(xml_file, 'w') as f:
-        f.write(cleaned_xml)
-    
     print(f"  Fixed formatting in {os.path.basename(xml_file)}")
     return True
 
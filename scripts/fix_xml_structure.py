@@ -1,56 +1,51 @@
 """
 Fix XML structure issues in sample messages to ensure well-formed XML.
 This script handles complex XML structure issues that standard prettifiers cannot fix.
+
+Messages are repaired with the tree repairs of iso_message_generator.repairs:
+each file is parsed once (recovering markup that is not well-formed instead of
+closing tags with a regex per tag), repaired and serialized once. Files are
+repaired in parallel and replaced atomically, only when a repair changed them.
 """
 import os
 import sys
 import glob
 import re
 
-def fix_xml_file(file_path):
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.atomic_files import atomic_write
+from iso_message_generator.repairs import print_repair_results, repair_file, repair_files, select_repairs
+from iso_message_generator.xsd_validation import find_xsd_schema
+
+# Registered repairs (see iso_message_generator/repairs.py) this script runs
+STRUCTURE_REPAIRS = ('close_leaf_element', 'misplaced_element', 'strip_whitespace', 'amount_currency')
+
+def fix_xml_file(file_path, schema_table=None):
     """
     Fix XML structure issues in a file.
     
+    Markup that is not well-formed is recovered by the parser and elements left
+    in the wrong place are moved back, in one pass over the tree. The file is
+    replaced atomically, and only if a repair changed it.
+    
     Args:
         file_path (str): Path to the XML file
+        schema_table (dict, optional): Table from load_repair_schema, without it
+            elements recovered into the wrong place are not moved back
         
     Returns:
-        bool: True if file was updated, False otherwise
+        bool: True if file was fixed or needed no fix, False on error
     """
     print(f"Fixing structure in {os.path.basename(file_path)}...")
     
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        fixed_content = content
-        
-        if fixed_content.count('<?xml') > 1:
-            fixed_content = re.sub(r'<\?xml.*?\?>\s*', '', fixed_content, count=1)
-        
-        fixed_content = fixed_content.replace('</UltmtCdtr>', '</Dbtr>')
-        
-        fixed_content = re.sub(r'(\d+\.\d+)"?\s+Ccy="([^"]+)', r'\1" Ccy="\2"', fixed_content)
-        
-        fixed_content = re.sub(r'<([^/>\s]+)([^>]*)></\1>', r'<\1\2/>', fixed_content)
-        
-        fixed_content = re.sub(r'<([^>]+)>ID-<\1>-001', r'<\1>ID-\1-001', fixed_content)
-        
-        tag_pattern = r'<([^/>\s]+)([^>]*)>'
-        tags = re.findall(tag_pattern, fixed_content)
-        for tag, attrs in tags:
-            if f'</{tag}>' not in fixed_content and f'{tag}/>' not in fixed_content:
-                fixed_content = fixed_content.replace(f'<{tag}{attrs}>', f'<{tag}{attrs}></{tag}>')
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(fixed_content)
-        
-        print(f"  Fixed structure in {os.path.basename(file_path)}")
-        return True
-    
-    except Exception as e:
-        print(f"  Error fixing structure in {os.path.basename(file_path)}: {e}")
+    result = repair_file(file_path, schema_table, select_repairs(STRUCTURE_REPAIRS))
+    if result['status'] == 'error':
+        print(f"  Error fixing structure in {os.path.basename(file_path)}: {result['error']}")
         return False
+    
+    changes = ', '.join(f"{repair} x{count}" for repair, count in result['repairs'].items())
+    print(f"  Structure of {os.path.basename(file_path)} {result['status']}" + (f" ({changes})" if changes else ""))
+    return True
 
 def create_clean_xml(file_path):
     """
@@ -132,8 +127,7 @@ def create_clean_xml(file_path):
         with open(backup_path, 'w', encoding='utf-8') as f:
             f.write(content)
         
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(clean_xml)
+        atomic_write(file_path, clean_xml.encode('utf-8'))
         
         print(f"  Created clean XML for {os.path.basename(file_path)}")
         print(f"  Original file backed up to {os.path.basename(backup_path)}")
@@ -150,15 +144,15 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    fixed_files = 0
-    for sample_file in sample_files:
-        if fix_xml_file(sample_file):
-            fixed_files += 1
-        else:
-            create_clean_xml(sample_file)
-            fixed_files += 1
+    results = list(repair_files(sample_files, find_xsd_schema(), STRUCTURE_REPAIRS))
+    summary = print_repair_results(results)
+    
+    for result in results:
+        if result['status'] == 'error':
+            create_clean_xml(result['file'])
     
-    print(f"Fixed {fixed_files} of {len(sample_files)} sample files")
+    print(f"Fixed {summary['repaired']} of {len(sample_files)} sample files, "
+          f"{summary['unchanged']} unchanged, {summary['errors']} recreated from scratch")
 
 if __name__ == "__main__":
     main()
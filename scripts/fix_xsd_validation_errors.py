@@ -4,38 +4,14 @@ Fix XSD validation errors in XML files.
 import os
 import sys
 import glob
-import re
-import requests
-import tempfile
-from lxml import etree
 
-def download_xsd_schema():
-    """
-    Download the ISO 20022 XSD schema for pacs.008.001.08.
-    
-    Returns:
-        str: Path to the downloaded XSD file
-    """
-    print("Downloading ISO 20022 XSD schema...")
-    
-    try:
-        url = "https://www.iso20022.org/sites/default/files/documents/messages/pacs/schemas/pacs.008.001.08.xsd"
-        response = requests.get(url)
-        
-        if response.status_code == 200:
-            xsd_file = os.path.join(tempfile.gettempdir(), "pacs.008.001.08.xsd")
-            with open(xsd_file, 'wb') as f:
-                f.write(response.content)
-            
-            print(f"Downloaded XSD schema to {xsd_file}")
-            return xsd_file
-        else:
-            print(f"Failed to download XSD schema: {response.status_code}")
-            return None
-    
-    except Exception as e:
-        print(f"Error downloading XSD schema: {e}")
-        return None
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.repairs import print_repair_results, repair_file, repair_files, select_repairs
+from iso_message_generator.xsd_validation import find_xsd_schema, load_schema, validate_message
+from iso_message_generator.validation_cache import cached_result, close_cache, open_cache, spec_digest
+
+# Registered repairs (see iso_message_generator/repairs.py) this script runs
+XSD_ERROR_REPAIRS = ('strip_whitespace', 'bic_value', 'amount_currency', 'code_choice_text', 'drop_unknown_element', 'child_order')
 
 def validate_against_xsd(xml_file, xsd_file):
     """
@@ -51,75 +27,45 @@ def validate_against_xsd(xml_file, xsd_file):
     print(f"Validating {os.path.basename(xml_file)} against XSD schema...")
     
     try:
-        xmlschema_doc = etree.parse(xsd_file)
-        xmlschema = etree.XMLSchema(xmlschema_doc)
-        
-        xml_doc = etree.parse(xml_file)
-        
-        result = xmlschema.validate(xml_doc)
+        result = validate_message(xml_file, load_schema(xsd_file))
         
-        if result:
+        if result['valid']:
             print(f"  {os.path.basename(xml_file)} is valid according to the XSD schema")
         else:
             print(f"  {os.path.basename(xml_file)} is NOT valid according to the XSD schema")
-            print(f"  Validation errors: {xmlschema.error_log}")
+            print(f"  Validation errors: {[error['message'] for error in result['errors']]}")
         
-        return result
+        return result['valid']
     
     except Exception as e:
         print(f"  Error validating {os.path.basename(xml_file)}: {e}")
         return False
 
-def fix_xsd_validation_errors(xml_file):
+def fix_xsd_validation_errors(xml_file, schema_table=None):
     """
     Fix XSD validation errors in an XML file.
     
+    The message is repaired in one pass over its tree and replaced atomically,
+    only if a repair changed it.
+    
     Args:
         xml_file (str): Path to the XML file
+        schema_table (dict, optional): Table from load_repair_schema, without it
+            only the repairs that do not need the XSD run
         
     Returns:
-        bool: True if file was updated, False otherwise
+        bool: True if file was repaired or needed no repair, False on error
     """
     print(f"Fixing XSD validation errors in {os.path.basename(xml_file)}...")
     
-    try:
-        with open(xml_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        ns_match = re.search(r'<(\w+):Document', content)
-        ns_prefix = ns_match.group(1) if ns_match else "ns0"
-        
-        content = content.replace('INSTGAGT0XXX', 'INSTABCD0XXX')
-        content = content.replace('INSTDAGT0XXX', 'INSTXYZW0XXX')
-        
-        svc_lvl_pattern = r'<{}:SvcLvl>([^<]*)</{}:SvcLvl>'.format(ns_prefix, ns_prefix)
-        if re.search(svc_lvl_pattern, content):
-            correct_svc_lvl = f"""
-      <{ns_prefix}:SvcLvl>
-        <{ns_prefix}:Cd>NURG</{ns_prefix}:Cd>
-      </{ns_prefix}:SvcLvl>"""
-            
-            content = re.sub(svc_lvl_pattern, correct_svc_lvl, content)
-        
-        if 'return_payment.xml' in xml_file:
-            lcl_instrm_pattern = r'<{}:LclInstrm>([^<]*)</{}:LclInstrm>'.format(ns_prefix, ns_prefix)
-            if re.search(lcl_instrm_pattern, content):
-                correct_lcl_instrm = f"""
-      <{ns_prefix}:LclInstrm>
-        <{ns_prefix}:Cd>RTGS</{ns_prefix}:Cd>
-      </{ns_prefix}:LclInstrm>"""
-                
-                content = re.sub(lcl_instrm_pattern, correct_lcl_instrm, content)
-        
-        with open(xml_file, 'w', encoding='utf-8') as f:
-            f.write(content)
-        
-        print(f"  Successfully fixed XSD validation errors in {os.path.basename(xml_file)}")
-        return True
-    
-    except Exception as e:
-        print(f"  Error fixing XSD validation errors in {os.path.basename(xml_file)}: {e}")
+    result = repair_file(xml_file, schema_table, select_repairs(XSD_ERROR_REPAIRS))
+    if result['status'] == 'error':
+        print(f"  Error repairing {os.path.basename(xml_file)}: {result['error']}")
         return False
+    
+    changes = ', '.join(f"{repair} x{count}" for repair, count in result['repairs'].items())
+    print(f"  {os.path.basename(xml_file)} {result['status']}" + (f" ({changes})" if changes else ""))
+    return True
 
 def create_validation_report(sample_files, validation_results):
     """
@@ -171,41 +117,44 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    fixed_files = 0
-    for sample_file in sample_files:
-        if fix_xsd_validation_errors(sample_file):
-            fixed_files += 1
+    xsd_file = find_xsd_schema()
     
-    print(f"Fixed XSD validation errors in {fixed_files} of {len(sample_files)} sample files")
+    results = repair_files(sample_files, xsd_file, XSD_ERROR_REPAIRS)
+    summary = print_repair_results(results)
     
-    xsd_file = download_xsd_schema()
+    print(f"Fixed XSD validation errors in {summary['repaired']} of {len(sample_files)} sample files, "
+          f"{summary['unchanged']} unchanged, {summary['errors']} errors")
     
     validation_results = {}
     
     if xsd_file:
-        for sample_file in sample_files:
-            try:
-                result = validate_against_xsd(sample_file, xsd_file)
-                
-                validation_results[sample_file] = {
-                    'valid': result
-                }
-                
-                if not result:
-                    xmlschema_doc = etree.parse(xsd_file)
-                    xmlschema = etree.XMLSchema(xmlschema_doc)
-                    
-                    xml_doc = etree.parse(sample_file)
-                    
-                    xmlschema.validate(xml_doc)
-                    
-                    validation_results[sample_file]['errors'] = [str(error) for error in xmlschema.error_log]
-            except Exception as e:
-                validation_results[sample_file] = {
-                    'valid': False,
-                    'errors': [str(e)]
-                }
-        
+        schema = load_schema(xsd_file)
+        spec = spec_digest(xsd_file)
+        cache = open_cache()
+
+        try:
+            for sample_file in sample_files:
+                try:
+                    result = cached_result(cache, 'xsd', sample_file, spec,
+                                           lambda xml_file: validate_message(xml_file, schema))
+
+                    validation_results[sample_file] = {
+                        'valid': result['valid']
+                    }
+
+                    if result['valid']:
+                        print(f"  {os.path.basename(sample_file)} is valid according to the XSD schema")
+                    else:
+                        print(f"  {os.path.basename(sample_file)} is NOT valid according to the XSD schema")
+                        validation_results[sample_file]['errors'] = [f"{os.path.basename(sample_file)}:{error['line']}:{error['column']}: {error['message']}" for error in result['errors']]
+                except Exception as e:
+                    validation_results[sample_file] = {
+                        'valid': False,
+                        'errors': [str(e)]
+                    }
+        finally:
+            close_cache(cache)
+
         valid_count = sum(1 for result in validation_results.values() if result['valid'])
         print(f"{valid_count} of {len(sample_files)} sample files are valid according to the XSD schema")
     
@@ -0,0 +1,135 @@
+"""
+Format XML messages with a single streaming pass per file.
+
+Replaces the ElementTree/minidom/regex chain of the older prettify scripts: each
+file is parsed and written back in one pass in constant memory, with configurable
+indentation and line endings, and comments kept on their own lines.
+
+In place, files are formatted by a process pool into temporary files that are
+renamed over the originals only when the bytes change, and the time taken for
+each file is reported.
+
+Usage:
+    python format_xml.py <directory|xml_file> [...] [--indent 2 | --tabs] [--newline lf|crlf]
+        [--compact] [--no-declaration] [--strip-comments] [--output-dir DIR] [--workers N] [--quiet]
+        [--size-log FILE]
+
+Example:
+    python format_xml.py sample_messages
+"""
+import argparse
+import functools
+import glob
+import os
+import sys
+import time
+from xml.parsers.expat import ExpatError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.batch_rewrite import print_rewrite_results, rewrite_files
+from iso_message_generator.xml_formatter import OUTPUT_MODES, append_size_log, format_file, format_stream
+
+NEWLINES = {'lf': "\n", 'crlf': "\r\n"}
+
+def collect_files(sources):
+    """
+    Expand files and directories into the list of XML files they hold.
+
+    Args:
+        sources (list): XML files and directories
+
+    Returns:
+        list: XML file paths, directories searched recursively
+    """
+    files = []
+    for source in sources:
+        if os.path.isdir(source):
+            files.extend(sorted(glob.glob(os.path.join(source, '**', '*.xml'), recursive=True)))
+        else:
+            files.append(source)
+    return files
+
+def formatting_options(args):
+    """
+    Build the format_stream options from parsed command line arguments.
+
+    Args:
+        args (argparse.Namespace): Parsed arguments
+
+    Returns:
+        dict: Keyword arguments for format_file
+    """
+    if args.compact:
+        indent, newline = '', ''
+    else:
+        indent = '\t' if args.tabs else ' ' * args.indent
+        newline = NEWLINES[args.newline]
+    return {'indent': indent, 'newline': newline,
+            'xml_declaration': not args.no_declaration, 'comments': not args.strip_comments}
+
+def add_formatting_arguments(parser):
+    """
+    Add the formatting options to an argument parser.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser to extend
+    """
+    parser.add_argument('--indent', type=int, default=2, help='Spaces per nesting level')
+    parser.add_argument('--tabs', action='store_true', help='Indent with one tab per nesting level')
+    parser.add_argument('--newline', choices=sorted(NEWLINES), default='lf', help='Line ending')
+    parser.add_argument('--compact', action='store_true', help='No indentation and no line breaks')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--strip-comments', action='store_true', help='Drop comments')
+
+def main():
+    parser = argparse.ArgumentParser(description='Format XML messages in a single streaming pass.')
+    parser.add_argument('sources', nargs='*', help='XML files or directories (defaults to sample_messages)')
+    parser.add_argument('--output-dir', type=str, help='Write formatted files here instead of in place')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes for in-place formatting')
+    parser.add_argument('--quiet', action='store_true', help='Only report files that were rewritten or failed')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    add_formatting_arguments(parser)
+
+    args = parser.parse_args()
+
+    sources = args.sources or [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")]
+    files = collect_files(sources)
+    options = formatting_options(args)
+
+    print(f"Found {len(files)} XML files")
+
+    mode = OUTPUT_MODES[args.compact]
+    sizes = []
+
+    if not args.output_dir:
+        start = time.perf_counter()
+        results = list(rewrite_files(files, functools.partial(format_stream, **options), compare='bytes', workers=args.workers))
+        summary = print_rewrite_results(results, verbose=not args.quiet)
+        print(f"Rewrote {summary['rewritten']} of {len(files)} XML files, {summary['unchanged']} already formatted, "
+              f"{summary['errors']} errors in {time.perf_counter() - start:.2f}s "
+              f"({summary['seconds']:.2f}s of per-file work)")
+        sizes = [{'message': result['file'], 'mode': mode, 'xml_declaration': options['xml_declaration'],
+                  'bytes': result['bytes_after']} for result in results if result['status'] != 'error']
+    else:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+        formatted = 0
+        for xml_file in files:
+            output_file = os.path.join(args.output_dir, os.path.basename(xml_file))
+            try:
+                format_file(xml_file, output_file, **options)
+                formatted += 1
+                sizes.append({'message': output_file, 'mode': mode, 'xml_declaration': options['xml_declaration'],
+                              'bytes': os.path.getsize(output_file)})
+            except (ExpatError, OSError) as e:
+                print(f"  Error formatting {xml_file}: {e}")
+
+        print(f"Formatted {formatted} of {len(files)} XML files")
+
+    print(f"{sum(record['bytes'] for record in sizes)} bytes of {mode} output")
+    if args.size_log:
+        append_size_log(args.size_log, sizes)
+        print(f"Appended message sizes to {args.size_log}")
+
+if __name__ == "__main__":
+    main()
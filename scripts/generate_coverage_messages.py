@@ -0,0 +1,116 @@
+"""
+Generate the smallest set of additional pacs.008 messages that fills the specification
+paths a corpus leaves uncovered.
+
+Reads the paths the corpus covers (from a coverage bitset store when given, by
+parsing the messages otherwise), plans messages as a greedy set cover over the
+uncovered paths of the XSD, and writes them until the target coverage is reached.
+The generated messages are validated against the XSD, the usage rules and the
+amount checks.
+
+Usage:
+    python generate_coverage_messages.py [--corpus sample_messages] [--bitsets STORE]
+        [--target 100] [--max-messages N] [--output-dir coverage_messages] [--xsd PATH]
+        [--compact] [--no-declaration] [--size-log FILE]
+
+Example:
+    python generate_coverage_messages.py --target 95
+"""
+import argparse
+import glob
+import os
+import sys
+
+from lxml import etree
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.amount_checks import check_amounts
+from iso_message_generator.c14n import write_if_changed
+from iso_message_generator.check import load_spec_paths
+from iso_message_generator.coverage_bitsets import covered_paths, open_coverage_store, save_coverage_store, update_coverage_store
+from iso_message_generator.coverage_generator import DEFAULT_TARGET, build_schema_tree, corpus_paths, plan_cover, render_message
+from iso_message_generator.rule_engine import compile_rules, evaluate_rules, load_rules
+from iso_message_generator.xml_formatter import append_size_log, serialize_message, size_record
+from iso_message_generator.xsd_validation import find_xsd_schema, load_schema
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(description='Generate messages that cover the specification paths a corpus misses.')
+    parser.add_argument('--corpus', type=str, default=os.path.join(base_dir, "sample_messages"),
+                        help='Directory of existing XML messages (defaults to sample_messages)')
+    parser.add_argument('--bitsets', type=str, metavar='STORE', help='Coverage bitset store (.npz) of the corpus, updated incrementally')
+    parser.add_argument('--fields', type=str, help='Fields JSON file (defaults to reference/all_fields.json)')
+    parser.add_argument('--target', type=float, default=DEFAULT_TARGET, help='Target path coverage percentage')
+    parser.add_argument('--max-messages', type=int, help='Maximum number of messages to generate')
+    parser.add_argument('--output-dir', type=str, default=os.path.join(base_dir, "coverage_messages"),
+                        help='Directory for the generated messages (defaults to coverage_messages)')
+    parser.add_argument('--xsd', type=str, help='Path to the pacs.008 XSD schema')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+
+    args = parser.parse_args()
+
+    xsd_file = find_xsd_schema(args.xsd)
+    if not xsd_file:
+        print("XSD schema not found, it is needed to plan the messages")
+        sys.exit(1)
+
+    spec_paths = load_spec_paths(args.fields)
+    files = sorted(glob.glob(os.path.join(args.corpus, "**", "*.xml"), recursive=True))
+
+    if args.bitsets:
+        store = open_coverage_store(args.bitsets, spec_paths)
+        parsed = update_coverage_store(store, files)
+        save_coverage_store(store, args.bitsets)
+        print(f"Parsed {parsed} new or modified files, {len(store['files'])} messages in {args.bitsets}")
+        covered = set(covered_paths(store))
+    else:
+        covered = corpus_paths(files) & spec_paths
+
+    print(f"Corpus of {len(files)} messages covers {len(covered)} of {len(spec_paths)} specification paths "
+          f"({len(covered) / len(spec_paths) * 100:.2f}%)")
+
+    tree = build_schema_tree(xsd_file)
+    plans, covered_after = plan_cover(tree, covered, spec_paths, args.target, args.max_messages)
+
+    if not plans:
+        print(f"No additional messages needed for {args.target}% coverage")
+        return
+
+    schema = load_schema(xsd_file)
+    compiled_rules = compile_rules(load_rules())
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    xml_declaration = not args.no_declaration
+    sizes = []
+    for number, plan in enumerate(plans, 1):
+        root = render_message(plan, number)
+        output_file = os.path.join(args.output_dir, f"coverage_message_{number:03d}.xml")
+        xml = serialize_message(etree.tostring(root, encoding='UTF-8'), args.compact, xml_declaration)
+        write_if_changed(output_file, xml, compare='bytes')
+        sizes.append(size_record(os.path.basename(output_file), xml, args.compact, xml_declaration))
+
+        problems = []
+        if schema is not None and not schema.validate(root):
+            problems.append(f"XSD: {schema.error_log.last_error.message}")
+        problems.extend(f"Rule {rule['rule_id']}: {rule['reason']}" for rule in evaluate_rules(compiled_rules, root)['failed_rules'])
+        problems.extend(error['message'] for error in check_amounts(output_file)['errors'])
+
+        status = "valid" if not problems else "; ".join(problems)
+        print(f"  {os.path.basename(output_file)}: {plan['gain']} new paths, "
+              f"{len(root.findall('.//{*}CdtTrfTxInf'))} transactions, {sizes[-1]['bytes']} bytes, {status}")
+
+    print(f"Generated {len(plans)} {sizes[0]['mode']} messages in {args.output_dir}, "
+          f"{sum(record['bytes'] for record in sizes)} bytes in total")
+    if args.size_log:
+        append_size_log(args.size_log, sizes)
+        print(f"Appended message sizes to {args.size_log}")
+    print(f"Coverage: {len(covered)} -> {len(covered_after)} of {len(spec_paths)} specification paths "
+          f"({len(covered_after) / len(spec_paths) * 100:.2f}%)")
+    if len(covered_after) / len(spec_paths) * 100 < args.target:
+        print(f"Target of {args.target}% not reached within the message limit or the paths the XSD can reach")
+
+if __name__ == "__main__":
+    main()
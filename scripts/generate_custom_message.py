@@ -2,7 +2,7 @@
 Generate custom ISO 20022 pacs.008 messages for specific payment scenarios.
 
 Usage:
-    python generate_custom_message.py --scenario <scenario_name> [--output <output_file>]
+    python generate_custom_message.py --scenario <scenario_name> [--output <output_file>] [--compact] [--no-declaration]
     
 Example:
     python generate_custom_message.py --scenario "Domestic Payment" --output custom_domestic.xml
@@ -21,6 +21,8 @@ def main():
     parser.add_argument('--scenario', type=str, required=True, help='Name of the payment scenario')
     parser.add_argument('--output', type=str, help='Output file path')
     parser.add_argument('--excel', type=str, help='Path to ISO Excel file')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
     
     args = parser.parse_args()
     
@@ -45,12 +47,12 @@ def main():
         sys.exit(1)
     
     output_dir = os.path.dirname(args.output) if args.output else None
-    xml = create_sample_xml(scenario, message_structure, output_dir)
+    xml = create_sample_xml(scenario, message_structure, output_dir, args.compact, not args.no_declaration)
     
     if args.output:
-        with open(args.output, 'w') as f:
+        with open(args.output, 'w', encoding='utf-8') as f:
             f.write(xml)
-        print(f"XML message written to {args.output}")
+        print(f"XML message written to {args.output} ({len(xml.encode('utf-8'))} bytes)")
     else:
         print(xml)
 
@@ -1,11 +1,22 @@
 """
 Manually prettify XML files to improve readability with consistent indentation.
-This script handles malformed XML that standard XML parsers cannot process.
+This script handles malformed XML that standard XML parsers cannot process: known
+defects are repaired first, then the streaming formatter is used, and the regex
+indentation is only the fallback for files that are still not well-formed.
+
+Files are prettified in parallel and replaced atomically, and only files whose
+bytes change are rewritten.
 """
 import os
 import sys
 import glob
 import re
+import functools
+from xml.parsers.expat import ExpatError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.batch_rewrite import print_rewrite_results, rewrite_file, rewrite_files, text_transform
+from iso_message_generator.xml_formatter import format_bytes
 
 def remove_duplicate_xml_declaration(content):
     """Remove duplicate XML declarations."""
@@ -95,28 +106,45 @@ def add_indentation(content):
     result += '</Document>'
     return result
 
-def prettify_xml_file(file_path):
-    """Prettify an XML file with consistent indentation."""
-    print(f"Prettifying {os.path.basename(file_path)}...")
+def prettify_content(content):
+    """
+    Repair the known defects of a message and prettify it with consistent indentation.
+
+    Args:
+        content (str): Message text
+
+    Returns:
+        str: Prettified message text
+    """
+    content = remove_duplicate_xml_declaration(content)
+    content = fix_malformed_tags(content)
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        content = remove_duplicate_xml_declaration(content)
-        content = fix_malformed_tags(content)
-        
-        pretty_content = add_indentation(content)
-        
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(pretty_content)
+        return format_bytes(content).decode('utf-8')
+    except ExpatError:
+        return add_indentation(content)
+
+def prettify_xml_file(file_path):
+    """
+    Prettify an XML file with consistent indentation.
+    
+    The file is replaced atomically, and only if its bytes change.
+    
+    Args:
+        file_path (str): Path to the XML file
         
-        print(f"  Successfully prettified {os.path.basename(file_path)}")
-        return True
+    Returns:
+        bool: True if the file was prettified or needed no change, False on error
+    """
+    print(f"Prettifying {os.path.basename(file_path)}...")
     
-    except Exception as e:
-        print(f"  Error prettifying {os.path.basename(file_path)}: {e}")
+    result = rewrite_file(file_path, functools.partial(text_transform, prettify_content), compare='bytes')
+    if result['status'] == 'error':
+        print(f"  Error prettifying {os.path.basename(file_path)}: {result['error']}")
         return False
+    
+    print(f"  {os.path.basename(file_path)} {result['status']}")
+    return True
 
 def main():
     sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
@@ -125,12 +153,11 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
-    prettified_files = 0
-    for sample_file in sample_files:
-        if prettify_xml_file(sample_file):
-            prettified_files += 1
+    results = rewrite_files(sample_files, functools.partial(text_transform, prettify_content), compare='bytes')
+    summary = print_rewrite_results(results)
     
-    print(f"Prettified {prettified_files} of {len(sample_files)} sample files")
+    print(f"Prettified {summary['rewritten']} of {len(sample_files)} sample files, "
+          f"{summary['unchanged']} unchanged, {summary['errors']} errors")
 
 if __name__ == "__main__":
     main()
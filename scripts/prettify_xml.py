@@ -4,8 +4,10 @@ Prettify XML files to improve readability with consistent indentation.
 import os
 import sys
 import glob
-import xml.dom.minidom as minidom
-from xml.etree import ElementTree as ET
+from xml.parsers.expat import ExpatError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.xml_formatter import format_file
 
 def prettify_xml(xml_file):
     """
@@ -20,28 +22,12 @@ def prettify_xml(xml_file):
     print(f"Prettifying {os.path.basename(xml_file)}...")
     
     try:
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        xml_str = ET.tostring(root, encoding='utf-8')
-        dom = minidom.parseString(xml_str)
-        
-        pretty_xml = dom.toprettyxml(indent='  ')
-        
-        lines = pretty_xml.splitlines()
-        non_empty_lines = [line for line in lines if line.strip()]
-        pretty_xml = '\n'.join(non_empty_lines)
-        
-        if not pretty_xml.startswith('<?xml'):
-            pretty_xml = '<?xml version="1.0" encoding="UTF-8"?>\n' + pretty_xml
-        
-        with open(xml_file, 'w', encoding='utf-8') as f:
-            f.write(pretty_xml)
+        format_file(xml_file)
         
         print(f"  Successfully prettified {os.path.basename(xml_file)}")
         return True
     
-    except Exception as e:
+    except (ExpatError, OSError) as e:
         print(f"  Error prettifying {os.path.basename(xml_file)}: {e}")
         return False
 
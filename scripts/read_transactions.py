@@ -0,0 +1,70 @@
+"""
+Stream pacs.008 messages and write one record per transaction.
+
+Messages are read with the streaming reader of iso_message_generator, so files
+of any size are processed in flat memory. Each transaction is written as a JSON
+line with the group header fields of its message, or only counted with
+--count-only to measure read throughput.
+
+Usage:
+    python read_transactions.py <directory|xml_file> [...] [--output transactions.jsonl] [--count-only]
+
+Example:
+    python read_transactions.py inbound/ --output transactions.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from lxml import etree
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.message_reader import iter_transactions, record_to_dict
+from scripts.format_xml import collect_files
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream pacs.008 messages as one record per transaction.')
+    parser.add_argument('sources', nargs='*', help='XML files or directories (defaults to sample_messages)')
+    parser.add_argument('--output', type=str, help='Write JSON lines to this file instead of standard output')
+    parser.add_argument('--count-only', action='store_true', help='Only count transactions and report throughput')
+
+    args = parser.parse_args()
+
+    sources = args.sources or [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")]
+    files = collect_files(sources)
+    print(f"Found {len(files)} XML files", file=sys.stderr)
+
+    output = None
+    if not args.count_only:
+        output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+
+    start = time.perf_counter()
+    transactions = 0
+    size = 0
+
+    try:
+        for xml_file in files:
+            try:
+                for record in iter_transactions(xml_file):
+                    transactions += 1
+                    if output:
+                        output.write(json.dumps(record_to_dict(record)) + "\n")
+            except (etree.XMLSyntaxError, FileNotFoundError, PermissionError) as e:
+                print(f"  Error reading {xml_file}: {e}", file=sys.stderr)
+                continue
+            size += os.path.getsize(xml_file)
+    finally:
+        if output and output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Read {transactions} transactions from {len(files)} XML files ({size / 1e6:.1f} MB) in {elapsed:.2f}s "
+          f"({transactions / elapsed if elapsed else 0:.0f} transactions/s, {size / 1e6 / elapsed if elapsed else 0:.1f} MB/s)",
+          file=sys.stderr)
+    if args.output:
+        print(f"Records written to {args.output}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 Regenerate sample messages using the improved XML generator with proper amount handling.
 """
+import argparse
 import os
 import sys
 import json
@@ -9,8 +10,18 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from iso_message_generator.message_structure import extract_message_structure
 from iso_message_generator.rule_processor import extract_rules
 from iso_message_generator.improved_xml_generator import create_sample_xml
+from iso_message_generator.xml_formatter import append_size_log, size_record
 
 def main():
+    parser = argparse.ArgumentParser(description='Regenerate sample messages with proper amount handling.')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    
+    args = parser.parse_args()
+    
+    compact, xml_declaration, size_log = args.compact, not args.no_declaration, args.size_log
+    
     excel_file = os.path.expanduser("~/attachments/a3d8f110-7f59-403b-9340-98c29a674930/rtr_fi_to_fi_customer_credit_transfer_pacs.008excel.xlsx")
     
     output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
@@ -105,9 +116,17 @@ def main():
     
     os.makedirs(output_dir, exist_ok=True)
     
+    sizes = []
     for scenario in scenarios:
         print(f"Creating sample message for {scenario['name']}...")
-        xml_content = create_sample_xml(scenario, message_structure, output_dir)
+        xml_content = create_sample_xml(scenario, message_structure, output_dir, compact, xml_declaration)
+        sizes.append(size_record(f"{scenario['name'].replace(' ', '_').lower()}.xml", xml_content, compact, xml_declaration))
+    
+    total_bytes = sum(record['bytes'] for record in sizes)
+    print(f"Wrote {len(sizes)} {'compact' if compact else 'pretty'} messages, {total_bytes} bytes in total")
+    if size_log:
+        append_size_log(size_log, sizes)
+        print(f"Appended message sizes to {size_log}")
     
     scenarios_json = []
     for scenario in scenarios:
@@ -4,8 +4,10 @@ Remove extra spaces from XML files to ensure clean formatting.
 import os
 import sys
 import glob
-import re
-from lxml import etree
+from xml.parsers.expat import ExpatError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.xml_formatter import format_file
 
 def remove_extra_spaces(xml_file):
     """
@@ -20,50 +22,12 @@ def remove_extra_spaces(xml_file):
     print(f"Removing extra spaces from {os.path.basename(xml_file)}...")
     
     try:
-        parser = etree.XMLParser(remove_blank_text=True)
-        tree = etree.parse(xml_file, parser)
-        
-        xml_str = etree.tostring(tree, encoding='utf-8', xml_declaration=True, pretty_print=True)
-        
-        xml_str = xml_str.decode('utf-8')
-        
-        xml_str = re.sub(r'>\s+<', '><', xml_str)
-        
-        xml_str = re.sub(r'><', '>\n<', xml_str)
-        
-        lines = xml_str.split('\n')
-        indent = 0
-        result = []
-        
-        for line in lines:
-            if not line.strip():
-                continue
-                
-            if '</' in line and not line.strip().startswith('</'):
-                pass
-            elif '</' in line:
-                indent -= 1
-            
-            if indent > 0 and not line.strip().startswith('<?xml'):
-                result.append('  ' * indent + line.strip())
-            else:
-                result.append(line.strip())
-            
-            if '<' in line and not '</' in line and not '/>' in line:
-                indent += 1
-        
-        xml_str = '\n'.join(result)
-        
-        comment_pattern = r'<!--(.*?)-->'
-        comments = re.findall(comment_pattern, xml_str, re.DOTALL)
-        
-        with open(xml_file, 'w', encoding='utf-8') as f:
-            f.write(xml_str)
+        format_file(xml_file)
         
         print(f"  Successfully removed extra spaces from {os.path.basename(xml_file)}")
         return True
     
-    except Exception as e:
+    except (ExpatError, OSError) as e:
         print(f"  Error removing extra spaces from {os.path.basename(xml_file)}: {e}")
         return False
 
@@ -0,0 +1,84 @@
+"""
+Repair pacs.008 messages with the registered tree repairs.
+
+Replaces the regex passes of the fix_* scripts: each message is parsed once,
+every registered repair runs during a walk over the tree and the message is
+serialized once. Repairs only touch elements that still show the error they fix,
+so running this over repaired messages changes nothing. With --dry-run no file
+is written and the diff of each repair is printed instead.
+
+Usage:
+    python repair_messages.py <directory|xml_file> [...] [--xsd FILE] [--no-schema] [--repair NAME ...]
+        [--dry-run] [--list] [--workers N] [--compact] [--no-declaration] [--quiet]
+
+Example:
+    python repair_messages.py sample_messages --dry-run
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.repairs import REPAIRS, RECOVER_REPAIR, print_repair_results, repair_files, select_repairs
+from iso_message_generator.xsd_validation import find_xsd_schema
+from scripts.format_xml import collect_files
+
+def list_repairs():
+    """Print the registered repairs with the XSD errors they fix."""
+    print(f"  {RECOVER_REPAIR}: recover markup that is not well-formed (always runs)")
+    for repair in REPAIRS.values():
+        scope = f" on {', '.join(sorted(repair['elements']))}" if repair['elements'] else ""
+        schema = ", needs the XSD" if repair['needs_schema'] else ""
+        print(f"  {repair['name']}: {repair['description']}")
+        print(f"      fixes {', '.join(repair['error_types'])}{scope} ({repair['phase']} phase{schema})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Repair pacs.008 messages with the registered tree repairs.')
+    parser.add_argument('sources', nargs='*', help='XML files or directories (defaults to sample_messages)')
+    parser.add_argument('--xsd', type=str, help='Path to the pacs.008 XSD schema file')
+    parser.add_argument('--no-schema', action='store_true', help='Run only the repairs that do not need the XSD')
+    parser.add_argument('--repair', action='append', dest='repairs', metavar='NAME', help='Run only this repair (repeatable)')
+    parser.add_argument('--dry-run', action='store_true', help='Print the diff of each repair without writing files')
+    parser.add_argument('--list', action='store_true', help='List the registered repairs and exit')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--compact', action='store_true', help='Write repaired files in the compact output mode')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration in repaired files')
+    parser.add_argument('--quiet', action='store_true', help='Only report files that were repaired or failed')
+
+    args = parser.parse_args()
+
+    if args.list:
+        print(f"{len(REPAIRS)} registered repairs:")
+        list_repairs()
+        return
+
+    try:
+        select_repairs(args.repairs)
+    except KeyError as e:
+        print(f"Error: {e.args[0]}")
+        sys.exit(1)
+
+    xsd_file = None
+    if not args.no_schema:
+        xsd_file = find_xsd_schema(args.xsd)
+        if not xsd_file:
+            print("Warning: XSD schema not found, running only the repairs that do not need it")
+
+    sources = args.sources or [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")]
+    files = collect_files(sources)
+    print(f"Found {len(files)} XML files")
+
+    start = time.perf_counter()
+    results = repair_files(files, xsd_file, args.repairs, dry_run=args.dry_run, workers=args.workers,
+                           compact=args.compact, xml_declaration=not args.no_declaration)
+    summary = print_repair_results(results, verbose=not args.quiet)
+
+    verb = 'Would repair' if args.dry_run else 'Repaired'
+    print(f"{verb} {summary['repaired']} of {len(files)} XML files, {summary['unchanged']} unchanged, "
+          f"{summary['errors']} errors in {time.perf_counter() - start:.2f}s ({summary['seconds']:.2f}s of per-file work)")
+    for repair, count in sorted(summary['repairs'].items(), key=lambda item: -item[1]):
+        print(f"  {repair}: {count}")
+
+if __name__ == "__main__":
+    main()
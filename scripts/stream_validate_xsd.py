@@ -0,0 +1,84 @@
+"""
+Validate very large multi-transaction pacs.008 files against the XSD schema in constant memory.
+
+The group header and every CdtTrfTxInf subtree are validated as they are parsed,
+and errors are reported with the index of the transaction they belong to.
+
+Usage:
+    python stream_validate_xsd.py <xml_file> [--xsd pacs.008.001.08.xsd] [--output errors.jsonl]
+
+Example:
+    python stream_validate_xsd.py bulk_pacs008.xml --output bulk_errors.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.xsd_validation import find_xsd_schema, load_schema, iter_validate_transactions
+
+def stream_validate(xml_file, schema, output):
+    """
+    Stream-validate a file and write one JSON line per invalid header or transaction.
+
+    Args:
+        xml_file (str): Path to the XML file
+        schema (lxml.etree.XMLSchema): Compiled schema
+        output (file): Text stream receiving the error records
+
+    Returns:
+        dict: Summary with transaction, invalid transaction and header validity counts
+    """
+    summary = {'transactions': 0, 'invalid_transactions': 0, 'header_valid': True}
+
+    for result in iter_validate_transactions(xml_file, schema):
+        if result['index'] is None:
+            summary['header_valid'] = result['valid']
+        else:
+            summary['transactions'] += 1
+            if not result['valid']:
+                summary['invalid_transactions'] += 1
+
+        if not result['valid']:
+            output.write(json.dumps({
+                'transaction': result['index'],
+                'errors': [{'line': error['line'], 'message': error['message']} for error in result['errors']]
+            }) + "\n")
+
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream-validate a large pacs.008 file against the XSD schema.')
+    parser.add_argument('xml_file', type=str, help='Path to the XML file')
+    parser.add_argument('--xsd', type=str, help='Path to the pacs.008 XSD schema')
+    parser.add_argument('--output', type=str, help='JSON lines error output file (defaults to stdout)')
+
+    args = parser.parse_args()
+
+    xsd_file = find_xsd_schema(args.xsd)
+    if not xsd_file:
+        print("Error: XSD schema not available")
+        sys.exit(1)
+
+    schema = load_schema(xsd_file)
+
+    start = time.perf_counter()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            summary = stream_validate(args.xml_file, schema, output)
+    else:
+        summary = stream_validate(args.xml_file, schema, sys.stdout)
+
+    elapsed = time.perf_counter() - start
+    print(f"Validated {summary['transactions']} transactions in {elapsed:.2f}s: "
+          f"group header {'valid' if summary['header_valid'] else 'invalid'}, "
+          f"{summary['invalid_transactions']} invalid transactions", file=sys.stderr)
+
+    if summary['invalid_transactions'] or not summary['header_valid']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
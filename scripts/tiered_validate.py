@@ -0,0 +1,76 @@
+"""
+Validate pacs.008 messages with tiered checks ordered from cheapest to most expensive.
+
+Tiers: header byte scan, simple type facets compiled from the XSD, XSD schema and
+business rules.
+Fail-fast mode stops at the first failure for fast gateway rejections; full mode
+runs every tier and reports all findings for the reporting scripts.
+
+Usage:
+    python tiered_validate.py <directory|xml_file> [--full] [--xsd pacs.008.001.08.xsd] [--output results.jsonl]
+
+Example:
+    python tiered_validate.py sample_messages --full --output tiered_results.jsonl
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.rule_engine import compile_rules, load_rules
+from iso_message_generator.tiered_validation import validate_tiered
+from iso_message_generator.xsd_facets import load_facet_table
+from iso_message_generator.xsd_validation import find_xsd_schema, load_schema
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate pacs.008 messages with tiered checks.')
+    parser.add_argument('source', type=str, help='XML file or directory of XML files')
+    parser.add_argument('--full', action='store_true', help='Run every tier and report all findings instead of failing fast')
+    parser.add_argument('--xsd', type=str, help='Path to the pacs.008 XSD schema')
+    parser.add_argument('--rules', type=str, help='Rules JSON file (defaults to reference/all_rules.json)')
+    parser.add_argument('--output', type=str, help='JSON lines output file (defaults to stdout)')
+
+    args = parser.parse_args()
+
+    if os.path.isdir(args.source):
+        files = sorted(glob.glob(os.path.join(args.source, '**', '*.xml'), recursive=True))
+    else:
+        files = [args.source]
+
+    xsd_file = find_xsd_schema(args.xsd)
+    schema = load_schema(xsd_file) if xsd_file else None
+    facet_table = load_facet_table(xsd_file) if schema is not None else None
+    if schema is None:
+        print("XSD schema not available, skipping the XSD tier and using the built-in pattern facets", file=sys.stderr)
+
+    compiled_rules = compile_rules(load_rules(args.rules))
+
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    failed_tiers = {}
+    start = time.perf_counter()
+
+    try:
+        for xml_file in files:
+            with open(xml_file, 'rb') as f:
+                data = f.read()
+
+            result = validate_tiered(data, schema, compiled_rules, fail_fast=not args.full, facet_table=facet_table)
+            if result['failed_tier']:
+                failed_tiers[result['failed_tier']] = failed_tiers.get(result['failed_tier'], 0) + 1
+
+            output.write(json.dumps(dict(result, file=xml_file)) + "\n")
+    finally:
+        if args.output:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    rejected = sum(failed_tiers.values())
+    print(f"Validated {len(files)} messages in {elapsed:.2f}s: {len(files) - rejected} valid, {rejected} rejected", file=sys.stderr)
+    for tier, count in failed_tiers.items():
+        print(f"  first failure in {tier}: {count}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,29 @@
 """
 Update sample messages to include all mandatory fields from ISO 20022 pacs.008 standard.
 """
+import argparse
 import os
 import sys
 import glob
 import xml.etree.ElementTree as ET
-import xml.dom.minidom as minidom
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.c14n import write_if_changed
+from iso_message_generator.xml_formatter import append_size_log, serialize_message, size_record
 from scripts.verify_coverage import extract_mandatory_fields, extract_fields_from_xml
 
-def ensure_mandatory_fields(xml_file, mandatory_fields):
+def ensure_mandatory_fields(xml_file, mandatory_fields, compact=False, xml_declaration=True):
     """
     Ensure that an XML file includes all mandatory fields.
     
     Args:
         xml_file (str): Path to the XML file
         mandatory_fields (list): List of mandatory field dictionaries
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start the message with an XML declaration
         
     Returns:
-        bool: True if file was updated, False otherwise
+        str: The updated message as written, or None if no field was missing
     """
     print(f"Checking {os.path.basename(xml_file)}...")
     
@@ -43,7 +47,7 @@ def ensure_mandatory_fields(xml_file, mandatory_fields):
     
     if not missing_fields:
         print(f"  All mandatory fields are present")
-        return False
+        return None
     
     print(f"  Missing {len(missing_fields)} mandatory fields: {[f['xml_tag'] for f in missing_fields]}")
     
@@ -102,19 +106,26 @@ def ensure_mandatory_fields(xml_file, mandatory_fields):
             
             updated = True
     
-    if updated:
-        rough_string = ET.tostring(root, 'utf-8')
-        reparsed = minidom.parseString(rough_string)
-        pretty_xml = reparsed.toprettyxml(indent="  ")
-        
-        with open(xml_file, 'w') as f:
-            f.write(pretty_xml)
-        
-        print(f"  Updated {xml_file} with missing mandatory fields")
+    if not updated:
+        return None
+    
+    xml = serialize_message(ET.tostring(root, 'utf-8'), compact, xml_declaration)
+    
+    write_if_changed(xml_file, xml, compare='bytes')
     
-    return updated
+    print(f"  Updated {xml_file} with missing mandatory fields ({len(xml.encode('utf-8'))} bytes)")
+    return xml
 
 def main():
+    parser = argparse.ArgumentParser(description='Add missing mandatory fields to the sample messages.')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    
+    args = parser.parse_args()
+    
+    compact, xml_declaration, size_log = args.compact, not args.no_declaration, args.size_log
+    
     excel_file = os.path.expanduser("~/attachments/a3d8f110-7f59-403b-9340-98c29a674930/rtr_fi_to_fi_customer_credit_transfer_pacs.008excel.xlsx")
     
     sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
@@ -125,12 +136,18 @@ def main():
     mandatory_fields = extract_mandatory_fields(excel_file)
     print(f"Found {len(mandatory_fields)} mandatory fields")
     
-    updated_files = 0
+    sizes = []
     for sample_file in sample_files:
-        if ensure_mandatory_fields(sample_file, mandatory_fields):
-            updated_files += 1
-    
-    print(f"Updated {updated_files} of {len(sample_files)} sample files")
+        xml = ensure_mandatory_fields(sample_file, mandatory_fields, compact, xml_declaration)
+        if xml is not None:
+            sizes.append(size_record(os.path.basename(sample_file), xml, compact, xml_declaration))
+    
+    print(f"Updated {len(sizes)} of {len(sample_files)} sample files")
+    total_bytes = sum(record['bytes'] for record in sizes)
+    print(f"Wrote {len(sizes)} {'compact' if compact else 'pretty'} messages, {total_bytes} bytes in total")
+    if size_log:
+        append_size_log(size_log, sizes)
+        print(f"Appended message sizes to {size_log}")
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,7 @@
 """
 Update payment scenarios and generate additional sample messages.
 """
+import argparse
 import os
 import sys
 import json
@@ -9,8 +10,17 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from iso_message_generator.message_structure import extract_message_structure
 from iso_message_generator.rule_processor import extract_rules
 from iso_message_generator.fixed_xml_generator import create_sample_xml
+from iso_message_generator.xml_formatter import append_size_log, size_record
 
-def update_payment_scenarios():
+def update_payment_scenarios(compact=False, xml_declaration=True, size_log=None):
+    """
+    Generate the sample message of every payment scenario.
+    
+    Args:
+        compact (bool): Write the compact wire format instead of two-space indentation
+        xml_declaration (bool): Start each message with an XML declaration
+        size_log (str, optional): JSON lines file the per-message byte counts are appended to
+    """
     excel_file = os.path.expanduser("~/attachments/a3d8f110-7f59-403b-9340-98c29a674930/rtr_fi_to_fi_customer_credit_transfer_pacs.008excel.xlsx")
     
     output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
@@ -95,9 +105,17 @@ def update_payment_scenarios():
     
     os.makedirs(output_dir, exist_ok=True)
     
+    sizes = []
     for scenario in scenarios:
         print(f"Creating sample message for {scenario['name']}...")
-        xml_content = create_sample_xml(scenario, message_structure, output_dir)
+        xml_content = create_sample_xml(scenario, message_structure, output_dir, compact, xml_declaration)
+        sizes.append(size_record(f"{scenario['name'].replace(' ', '_').lower()}.xml", xml_content, compact, xml_declaration))
+    
+    total_bytes = sum(record['bytes'] for record in sizes)
+    print(f"Wrote {len(sizes)} {'compact' if compact else 'pretty'} messages, {total_bytes} bytes in total")
+    if size_log:
+        append_size_log(size_log, sizes)
+        print(f"Appended message sizes to {size_log}")
     
     scenarios_json = []
     for scenario in scenarios:
@@ -114,5 +132,15 @@ def update_payment_scenarios():
     
     print(f"Saved scenarios information to {scenarios_file}")
 
+def main():
+    parser = argparse.ArgumentParser(description='Update payment scenarios and generate their sample messages.')
+    parser.add_argument('--compact', action='store_true', help='Write the compact wire format without insignificant whitespace')
+    parser.add_argument('--no-declaration', action='store_true', help='Omit the XML declaration')
+    parser.add_argument('--size-log', type=str, help='Append per-message byte counts to this JSON lines file')
+    
+    args = parser.parse_args()
+    
+    update_payment_scenarios(args.compact, not args.no_declaration, args.size_log)
+
 if __name__ == "__main__":
-    update_payment_scenarios()
+    main()
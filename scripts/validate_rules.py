@@ -1,15 +1,22 @@
 """
 Validate sample XML messages against the rules defined in the ISO 20022 Excel file.
+
+Usage:
+    python validate_rules.py [--watch inbox/] [--interval 1.0] [--report rules_watch_report.jsonl]
 """
 import os
 import sys
 import glob
+import json
+import time
+import argparse
 import pandas as pd
 import xml.etree.ElementTree as ET
-import re
-from collections import defaultdict
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from iso_message_generator.rule_engine import RULESET_VERSION, compile_rules, evaluate_rules, load_rules
+from iso_message_generator.validation_cache import cached_result, close_cache, open_cache, spec_digest
+from iso_message_generator.watch import DEFAULT_POLL_INTERVAL, watch_directory
 
 def extract_rules(excel_file):
     """
@@ -66,46 +73,22 @@ def extract_rules(excel_file):
         print(f"Error extracting rules from Excel: {e}")
         return []
 
-def parse_rule_definition(rule_definition):
-    """
-    Parse a rule definition to extract conditions and requirements.
-    
-    Args:
-        rule_definition (str): Rule definition text
-        
-    Returns:
-        dict: Dictionary containing parsed rule information
-    """
-    parsed_rule = {
-        'elements': [],
-        'conditions': [],
-        'requirements': []
-    }
-    
-    elements = re.findall(r'<([^>]+)>', rule_definition)
-    parsed_rule['elements'] = list(set(elements))
-    
-    conditions = re.findall(r'(?:If|When)\s+([^,\.]+)', rule_definition)
-    parsed_rule['conditions'] = conditions
-    
-    requirements = re.findall(r'(?:must|shall|should)\s+([^,\.]+)', rule_definition)
-    parsed_rule['requirements'] = requirements
-    
-    return parsed_rule
-
 def validate_xml_against_rules(xml_file, rules):
     """
     Validate an XML file against the extracted rules.
     
     Args:
         xml_file (str): Path to the XML file
-        rules (list): List of dictionaries containing rule information
+        rules (list): Compiled rules from compile_rules, or raw rule dictionaries
         
     Returns:
         dict: Dictionary containing validation results
     """
     print(f"Validating {os.path.basename(xml_file)}...")
     
+    if rules and 'check' not in rules[0]:
+        rules = compile_rules(rules)
+    
     validation_results = {
         'file': os.path.basename(xml_file),
         'passed_rules': [],
@@ -115,80 +98,8 @@ def validate_xml_against_rules(xml_file, rules):
     
     try:
         tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        ns = {'ns': root.tag.split('}')[0].strip('{')} if '}' in root.tag else {}
-        
-        all_elements = []
-        for elem in root.iter():
-            tag = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-            all_elements.append(tag)
-        
-        all_text = []
-        for elem in root.iter():
-            if elem.text and elem.text.strip():
-                all_text.append(elem.text.strip())
         
-        for rule in rules:
-            rule_id = rule['index']
-            rule_name = rule['name']
-            rule_definition = rule['definition']
-            
-            parsed_rule = parse_rule_definition(rule_definition)
-            
-            rule_applicable = True
-            for element in parsed_rule['elements']:
-                if element not in all_elements:
-                    rule_applicable = False
-                    break
-            
-            if not rule_applicable:
-                validation_results['not_applicable_rules'].append({
-                    'rule_id': rule_id,
-                    'rule_name': rule_name,
-                    'reason': f"Elements mentioned in rule not found in XML"
-                })
-                continue
-            
-            rule_passed = True
-            failure_reason = ""
-            
-            if 'currency' in rule_definition.lower() or 'ccy' in rule_definition.lower():
-                if 'CAD' in rule_definition and 'CAD' not in str(all_text):
-                    rule_passed = False
-                    failure_reason = "CAD currency not found in XML"
-                elif 'EUR' in rule_definition and 'EUR' not in str(all_text):
-                    rule_passed = False
-                    failure_reason = "EUR currency not found in XML"
-                elif 'USD' in rule_definition and 'USD' not in str(all_text):
-                    rule_passed = False
-                    failure_reason = "USD currency not found in XML"
-            
-            if 'amount' in rule_definition.lower() or 'amt' in rule_definition.lower():
-                amount_elements = [elem for elem in root.iter() if 
-                                  (elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag).endswith('Amt')]
-                if not amount_elements:
-                    rule_passed = False
-                    failure_reason = "Amount elements not found in XML"
-            
-            if 'settlement' in rule_definition.lower() or 'sttlm' in rule_definition.lower():
-                settlement_elements = [elem for elem in root.iter() if 
-                                      (elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag).startswith('Sttlm')]
-                if not settlement_elements:
-                    rule_passed = False
-                    failure_reason = "Settlement elements not found in XML"
-            
-            if rule_passed:
-                validation_results['passed_rules'].append({
-                    'rule_id': rule_id,
-                    'rule_name': rule_name
-                })
-            else:
-                validation_results['failed_rules'].append({
-                    'rule_id': rule_id,
-                    'rule_name': rule_name,
-                    'reason': failure_reason
-                })
+        validation_results.update(evaluate_rules(rules, tree.getroot()))
         
         print(f"  Passed: {len(validation_results['passed_rules'])}, "
               f"Failed: {len(validation_results['failed_rules'])}, "
@@ -258,13 +169,58 @@ def generate_validation_report(validation_results):
     
     return report
 
+def watch_rules(directory, compiled_rules, report_file, interval=DEFAULT_POLL_INTERVAL):
+    """
+    Validate new or modified messages in a drop folder and append the results to a rolling report.
+    
+    Args:
+        directory (str): Inbox directory to watch
+        compiled_rules (list): Compiled rules from compile_rules, kept in memory between polls
+        report_file (str): JSON lines report that every result is appended to
+        interval (float): Seconds between polls
+        
+    Returns:
+        int: Number of validated messages
+    """
+    print(f"Watching {directory} for new or modified messages (Ctrl+C to stop)")
+    print(f"Appending results to {report_file}")
+    
+    with open(report_file, 'a', encoding='utf-8') as report:
+        def handle(xml_files):
+            for xml_file in xml_files:
+                result = validate_xml_against_rules(xml_file, compiled_rules)
+                result['file'] = xml_file
+                result['validated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+                report.write(json.dumps(result) + "\n")
+            report.flush()
+        
+        return watch_directory(directory, handle, interval)
+
 def main():
+    parser = argparse.ArgumentParser(description='Validate XML messages against the ISO 20022 rules.')
+    parser.add_argument('--watch', type=str, metavar='DIRECTORY', help='Watch an inbox directory and validate new or modified messages')
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help='Seconds between polls in watch mode')
+    parser.add_argument('--report', type=str, default='rules_watch_report.jsonl', help='Rolling JSON lines report in watch mode')
+    
+    args = parser.parse_args()
+    
     excel_file = os.path.expanduser("~/attachments/a3d8f110-7f59-403b-9340-98c29a674930/rtr_fi_to_fi_customer_credit_transfer_pacs.008excel.xlsx")
     
     rules = extract_rules(excel_file)
     
     if not rules:
-        print("No rules found in the Excel file")
+        print("No rules found in the Excel file, using reference/all_rules.json")
+        rules = load_rules()
+    
+    if not rules:
+        print("No rules found")
+        return
+    
+    compiled_rules = compile_rules(rules)
+    
+    if args.watch:
+        count = watch_rules(args.watch, compiled_rules, args.report, args.interval)
+        print(f"Validated {count} messages")
         return
     
     sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
@@ -273,10 +229,19 @@ def main():
     
     print(f"Found {len(sample_files)} sample files")
     
+    spec = spec_digest(rules)
+    cache = open_cache()
+    
     validation_results = []
-    for sample_file in sample_files:
-        result = validate_xml_against_rules(sample_file, rules)
-        validation_results.append(result)
+    try:
+        for sample_file in sample_files:
+            result = cached_result(cache, 'rules', sample_file, spec,
+                                   lambda xml_file: validate_xml_against_rules(xml_file, compiled_rules),
+                                   RULESET_VERSION)
+            result['file'] = os.path.basename(sample_file)
+            validation_results.append(result)
+    finally:
+        close_cache(cache)
     
     report = generate_validation_report(validation_results)
     
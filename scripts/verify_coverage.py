@@ -1,15 +1,42 @@
 """
 Verify that the sample messages cover all required attributes from the ISO 20022 Excel file.
+
+Coverage is measured against every field of the specification in
+reference/all_fields.json, with the mandatory fields from the Excel file flagged.
+The same parse classifies every message into the branches of the usage rules
+(condition not triggered, triggered and satisfied, triggered and violated), so
+conditional requirements are covered as well as paths.
+
+Usage:
+    python verify_coverage.py [directory] [--fields all_fields.json] [--rules all_rules.json]
+        [--bitsets coverage_bitsets.npz [--which PATH]]
 """
 import os
 import sys
+import json
+import argparse
 import pandas as pd
 import xml.etree.ElementTree as ET
 import glob
-from collections import defaultdict
+from collections import Counter
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from iso_message_generator.message_structure import extract_message_structure
+from iso_message_generator.check import DEFAULT_FIELDS_FILE
+from iso_message_generator.coverage_bitsets import (message_path_counts, messages_with_path, open_coverage_store,
+                                                    path_counts, save_coverage_store, store_rule_coverage,
+                                                    update_coverage_store)
+from iso_message_generator.rule_coverage import (RULE_BRANCHES, message_rule_branches, new_rule_coverage,
+                                                 summarize_rule_coverage, update_rule_coverage)
+from iso_message_generator.rule_engine import (DEFAULT_RULES_FILE, RULESET_VERSION, build_message_index, compile_rules,
+                                               load_rules)
+from iso_message_generator.validation_cache import cached_result, close_cache, open_cache, spec_digest
+
+# Bump when extract_message_coverage changes so cached results are recomputed
+FIELD_EXTRACTION_VERSION = "2"
+
+# Above this many messages the per-file coverage is only written to the report file
+MAX_CONSOLE_FILES = 100
 
 def extract_mandatory_fields(excel_file):
     """
@@ -136,128 +163,305 @@ def extract_fields_from_xml(xml_file):
     
     return formatted_paths
 
-def analyze_coverage(mandatory_fields, sample_files):
+def extract_message_coverage(xml_file, compiled_rules):
+    """
+    Parse a message once and extract its field paths and rule branches.
+    
+    Args:
+        xml_file (str): Path to the XML file
+        compiled_rules (list): Rules returned by compile_rules
+        
+    Returns:
+        dict: Dictionary with 'fields' (absolute paths present in the message)
+        and 'rules' (rule branches from message_rule_branches)
+    """
+    index = build_message_index(ET.parse(xml_file).getroot())
+    return {
+        'fields': sorted(index['paths']),
+        'rules': message_rule_branches(compiled_rules, index)
+    }
+
+def normalize_path(path):
+    """
+    Normalize a field path so specification and message paths compare as plain strings.
+    
+    Args:
+        path (str): Field path, optionally with namespace prefixes or surrounding whitespace
+        
+    Returns:
+        str: Path with a leading slash, no namespace prefixes and no trailing slash
+    """
+    parts = [part.split(':', 1)[-1] if not part.startswith('@') else '@' + part[1:].split(':', 1)[-1]
+             for part in path.strip().strip('/').split('/') if part]
+    return '/' + '/'.join(parts)
+
+def load_spec_fields(mandatory_fields=(), fields_file=None):
     """
-    Analyze coverage of mandatory fields in sample files.
+    Load every field of the message specification, flagging the mandatory ones.
     
     Args:
-        mandatory_fields (list): List of mandatory field dictionaries
+        mandatory_fields (list): Mandatory field dictionaries from extract_mandatory_fields
+        fields_file (str, optional): Path to the fields JSON file, defaults to reference/all_fields.json
+        
+    Returns:
+        list: List of field dictionaries with normalized 'path', 'name', 'xml_tag' and 'group'
+    """
+    with open(fields_file or DEFAULT_FIELDS_FILE, 'r', encoding='utf-8') as f:
+        groups = json.load(f)
+    
+    fields = {}
+    for group, group_fields in groups.items():
+        for field in group_fields:
+            path = normalize_path(field['path'])
+            fields.setdefault(path, {
+                'path': path,
+                'name': field.get('name', '').strip(),
+                'xml_tag': field.get('xml_tag', '').strip('<>'),
+                'group': group
+            })
+    
+    for field in mandatory_fields:
+        path = normalize_path(field['path'])
+        entry = fields.setdefault(path, {'path': path, 'name': field['name'], 'xml_tag': field['xml_tag'].strip('<>')})
+        entry['group'] = 'mandatory'
+    
+    return list(fields.values())
+
+def analyze_coverage(spec_fields, sample_files, cache=None, compiled_rules=(), rules_file=None):
+    """
+    Analyze coverage of the specification fields and rule branches in sample files.
+    
+    Field paths are normalized once and looked up in sets, so each file costs one
+    pass over its own paths. Specification paths that are not absolute are matched
+    against every suffix of the message paths. Rule branches come from the same
+    parse and are added to the corpus totals one message at a time.
+    
+    Args:
+        spec_fields (list): Field dictionaries with 'path', 'name', 'xml_tag' and 'group'
         sample_files (list): List of sample XML file paths
+        cache (sqlite3.Connection, optional): Validation cache used to reuse extracted fields and branches
+        compiled_rules (list): Rules returned by compile_rules
+        rules_file (str, optional): Rules JSON file the rules were loaded from, part of the cache key
         
     Returns:
-        dict: Coverage analysis results
+        dict: Coverage analysis results, with the rule branch totals in 'rule_coverage'
     """
     print("Analyzing coverage...")
     
-    if not mandatory_fields:
-        return {
-            'total_mandatory': 0,
-            'covered_mandatory': 0,
-            'missing_mandatory': [],
-            'coverage_by_file': {os.path.basename(f): {'total_fields': 0, 'covered_mandatory': 0, 'coverage_percentage': 0} for f in sample_files},
-            'overall_coverage_percentage': 0
-        }
+    fields_by_path = {normalize_path(field['path']): field for field in spec_fields}
+    absolute_paths = {path for path in fields_by_path if path.startswith('/Document/') or path == '/Document'}
+    relative_paths = set(fields_by_path) - absolute_paths
     
     results = {
-        'total_mandatory': len(mandatory_fields),
-        'covered_mandatory': 0,
-        'missing_mandatory': [],
+        'total_fields': len(fields_by_path),
+        'covered_fields': 0,
+        'missing_fields': [],
+        'coverage_by_group': {},
         'coverage_by_file': {},
         'overall_coverage_percentage': 0
     }
     
-    field_coverage = defaultdict(list)
+    field_counts = Counter()
+    rule_coverage = new_rule_coverage(compiled_rules)
+    spec = spec_digest(FIELD_EXTRACTION_VERSION, rules_file or DEFAULT_RULES_FILE)
     
     for sample_file in sample_files:
         file_name = os.path.basename(sample_file)
         
-        xml_fields = extract_fields_from_xml(sample_file)
-        print(f"File {file_name} has {len(xml_fields)} fields")
+        try:
+            extracted = cached_result(cache, 'fields', sample_file, spec,
+                                      lambda xml_file: extract_message_coverage(xml_file, compiled_rules),
+                                      RULESET_VERSION)
+        except ET.ParseError as e:
+            print(f"Skipping {file_name}: {e}")
+            continue
         
-        covered = []
+        xml_fields = {normalize_path(path) for path in extracted['fields']}
+        update_rule_coverage(rule_coverage, extracted['rules'])
         
-        for field in mandatory_fields:
-            field_path = field['path']
-            xml_tag = field['xml_tag']
-            
-            path_covered = any(field_path.endswith(xml_field) or xml_field.endswith(field_path) for xml_field in xml_fields)
-            tag_covered = any(xml_tag in xml_field.split('/')[-1] for xml_field in xml_fields)
-            
-            if path_covered or tag_covered:
-                covered.append(field)
-                field_coverage[field_path].append(file_name)
+        covered = absolute_paths & xml_fields
+        if relative_paths:
+            suffixes = {'/' + path.split('/', depth + 1)[-1] for path in xml_fields for depth in range(path.count('/'))}
+            covered |= relative_paths & suffixes
+        
+        field_counts.update(covered)
         
-        results['coverage_by_file'][file_name] = {
+        results['coverage_by_file'][sample_file if file_name in results['coverage_by_file'] else file_name] = {
             'total_fields': len(xml_fields),
-            'covered_mandatory': len(covered),
-            'coverage_percentage': round(len(covered) / len(mandatory_fields) * 100, 2) if mandatory_fields else 0
+            'covered_fields': len(covered),
+            'coverage_percentage': round(len(covered) / len(fields_by_path) * 100, 2) if fields_by_path else 0
         }
     
-    covered_mandatory = set()
-    for field_path, files in field_coverage.items():
-        if files:
-            covered_mandatory.add(field_path)
+    results['rule_coverage'] = summarize_rule_coverage(rule_coverage)
+    return summarize_coverage(fields_by_path, field_counts, results)
+
+def summarize_coverage(fields_by_path, field_counts, results):
+    """
+    Fill in the corpus totals, per-group coverage and missing fields of a coverage result.
     
-    results['covered_mandatory'] = len(covered_mandatory)
-    results['overall_coverage_percentage'] = round(len(covered_mandatory) / len(mandatory_fields) * 100, 2) if mandatory_fields else 0
+    Args:
+        fields_by_path (dict): Normalized path to specification field
+        field_counts (dict): Path to number of messages covering it
+        results (dict): Coverage result to complete in place
+        
+    Returns:
+        dict: The completed coverage result
+    """
+    covered = [path for path in fields_by_path if field_counts.get(path)]
+    results['covered_fields'] = len(covered)
+    results['overall_coverage_percentage'] = round(len(covered) / len(fields_by_path) * 100, 2) if fields_by_path else 0
     
-    for field in mandatory_fields:
-        if field['path'] not in field_coverage or not field_coverage[field['path']]:
-            results['missing_mandatory'].append({
-                'path': field['path'],
+    for path, field in fields_by_path.items():
+        group = results['coverage_by_group'].setdefault(field['group'], {'total': 0, 'covered': 0})
+        group['total'] += 1
+        if field_counts.get(path):
+            group['covered'] += 1
+        else:
+            results['missing_fields'].append({
+                'path': path,
                 'name': field['name'],
-                'xml_tag': field['xml_tag']
+                'xml_tag': field['xml_tag'],
+                'group': field['group']
             })
     
+    for group in results['coverage_by_group'].values():
+        group['coverage_percentage'] = round(group['covered'] / group['total'] * 100, 2) if group['total'] else 0
+    
     return results
 
+def analyze_coverage_bitsets(spec_fields, store):
+    """
+    Compute the coverage result from a coverage bitset store without parsing any message.
+    
+    Args:
+        spec_fields (list): Field dictionaries with 'path', 'name', 'xml_tag' and 'group'
+        store (dict): Store from coverage_bitsets.open_coverage_store over the same paths
+        
+    Returns:
+        dict: Coverage analysis results in the same form as analyze_coverage
+    """
+    fields_by_path = {normalize_path(field['path']): field for field in spec_fields}
+    counts = path_counts(store)
+    per_message = message_path_counts(store)
+    
+    results = {
+        'total_fields': len(fields_by_path),
+        'covered_fields': 0,
+        'missing_fields': [],
+        'coverage_by_group': {},
+        'coverage_by_file': {},
+        'overall_coverage_percentage': 0
+    }
+    
+    for xml_file, covered in zip(store['files'], per_message):
+        file_name = os.path.basename(xml_file)
+        results['coverage_by_file'][xml_file if file_name in results['coverage_by_file'] else file_name] = {
+            'total_fields': int(covered),
+            'covered_fields': int(covered),
+            'coverage_percentage': round(int(covered) / len(fields_by_path) * 100, 2) if fields_by_path else 0
+        }
+    
+    field_counts = {path: int(count) for path, count in zip(store['paths'], counts)}
+    results['rule_coverage'] = summarize_rule_coverage(store_rule_coverage(store))
+    return summarize_coverage(fields_by_path, field_counts, results)
+
 def main():
+    parser = argparse.ArgumentParser(description='Measure how much of the pacs.008 specification a corpus of messages covers.')
+    parser.add_argument('directory', nargs='?', help='Directory of XML messages (defaults to sample_messages)')
+    parser.add_argument('--fields', type=str, help='Fields JSON file (defaults to reference/all_fields.json)')
+    parser.add_argument('--rules', type=str, help='Rules JSON file (defaults to reference/all_rules.json)')
+    parser.add_argument('--bitsets', type=str, metavar='STORE', help='Coverage bitset store (.npz) updated incrementally and used for the report')
+    parser.add_argument('--which', type=str, metavar='PATH', help='With --bitsets, list the messages that use a specification path')
+    
+    args = parser.parse_args()
+    
     excel_file = os.path.expanduser("~/attachments/a3d8f110-7f59-403b-9340-98c29a674930/rtr_fi_to_fi_customer_credit_transfer_pacs.008excel.xlsx")
     
-    sample_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
-    sample_files = glob.glob(os.path.join(sample_dir, "*.xml"))
+    sample_dir = args.directory or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_messages")
+    sample_files = sorted(glob.glob(os.path.join(sample_dir, "**", "*.xml"), recursive=True))
     
     print(f"Found {len(sample_files)} sample files")
     
     mandatory_fields = extract_mandatory_fields(excel_file)
     print(f"Found {len(mandatory_fields)} mandatory fields")
     
-    results = analyze_coverage(mandatory_fields, sample_files)
+    spec_fields = load_spec_fields(mandatory_fields, args.fields)
+    print(f"Measuring coverage of {len(spec_fields)} specification fields")
+    
+    compiled_rules = compile_rules(load_rules(args.rules))
+    
+    if args.bitsets:
+        store = open_coverage_store(args.bitsets, [field['path'] for field in spec_fields], compiled_rules)
+        parsed = update_coverage_store(store, sample_files)
+        save_coverage_store(store, args.bitsets)
+        print(f"Parsed {parsed} new or modified files, {len(store['files'])} messages in {args.bitsets}")
+        
+        if args.which:
+            files = messages_with_path(store, normalize_path(args.which))
+            print(f"{len(files)} messages use {normalize_path(args.which)}")
+            for xml_file in files:
+                print(f"- {xml_file}")
+            return
+        
+        results = analyze_coverage_bitsets(spec_fields, store)
+    else:
+        cache = open_cache()
+        try:
+            results = analyze_coverage(spec_fields, sample_files, cache, compiled_rules, args.rules)
+        finally:
+            close_cache(cache)
     
-    print("\n=== COVERAGE ANALYSIS ===")
-    print(f"Total mandatory fields: {results['total_mandatory']}")
-    print(f"Covered mandatory fields: {results['covered_mandatory']}")
-    print(f"Overall coverage: {results['overall_coverage_percentage']}%")
+    missing_mandatory = [field for field in results['missing_fields'] if field['group'] == 'mandatory']
     
-    print("\n=== COVERAGE BY FILE ===")
-    for file_name, coverage in results['coverage_by_file'].items():
-        print(f"{file_name}: {coverage['coverage_percentage']}% ({coverage['covered_mandatory']} of {results['total_mandatory']} mandatory fields)")
+    lines = ["=== COVERAGE ANALYSIS ==="]
+    lines.append(f"Total specification fields: {results['total_fields']}")
+    lines.append(f"Covered specification fields: {results['covered_fields']}")
+    lines.append(f"Overall coverage: {results['overall_coverage_percentage']}%")
+    for group, coverage in sorted(results['coverage_by_group'].items()):
+        lines.append(f"{group.capitalize()} fields: {coverage['covered']} of {coverage['total']} covered ({coverage['coverage_percentage']}%)")
     
-    print("\n=== MISSING MANDATORY FIELDS ===")
-    if results['missing_mandatory']:
-        for field in results['missing_mandatory']:
-            print(f"- {field['path']} ({field['name']} - {field['xml_tag']})")
+    rule_coverage = results['rule_coverage']
+    lines.append(f"Rule branch coverage: {rule_coverage['covered_branches']} of {rule_coverage['total_branches']} "
+                 f"branches exercised ({rule_coverage['coverage_percentage']}%)")
+    
+    lines.append("")
+    lines.append("=== RULE BRANCH COVERAGE ===")
+    lines.append("Messages per branch (" + ", ".join(RULE_BRANCHES) + "), triggered occurrences and violations")
+    for rule in rule_coverage['rules']:
+        branches = ", ".join(f"{branch} {rule['branches'][branch]}" for branch in RULE_BRANCHES)
+        missing = f" - never {' or '.join(rule['missing_branches'])}" if rule['missing_branches'] else ""
+        lines.append(f"{rule['rule_id']} {rule['rule_name']}: {branches}; "
+                     f"{rule['triggered']} triggered, {rule['violations']} violations{missing}")
+    
+    file_lines = [f"{file_name}: {coverage['coverage_percentage']}% ({coverage['covered_fields']} of {results['total_fields']} specification fields)"
+                  for file_name, coverage in results['coverage_by_file'].items()]
+    
+    missing_lines = ["", "=== MISSING MANDATORY FIELDS ==="]
+    if missing_mandatory:
+        for field in missing_mandatory:
+            missing_lines.append(f"- {field['path']} ({field['name']} - {field['xml_tag']})")
     else:
-        print("No missing mandatory fields!")
+        missing_lines.append("No missing mandatory fields!")
+    
+    report_lines = lines + ["", "=== COVERAGE BY FILE ==="] + file_lines + missing_lines
+    
+    if len(file_lines) <= MAX_CONSOLE_FILES:
+        console_lines = report_lines
+    else:
+        console_lines = lines + missing_lines
+    
+    print("\n" + "\n".join(console_lines))
+    print(f"{len(results['missing_fields'])} specification fields are not covered by any message")
     
     output_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "coverage_analysis.txt")
     
     with open(output_file, 'w') as f:
-        f.write("=== COVERAGE ANALYSIS ===\n")
-        f.write(f"Total mandatory fields: {results['total_mandatory']}\n")
-        f.write(f"Covered mandatory fields: {results['covered_mandatory']}\n")
-        f.write(f"Overall coverage: {results['overall_coverage_percentage']}%\n\n")
+        f.write("\n".join(report_lines) + "\n")
         
-        f.write("=== COVERAGE BY FILE ===\n")
-        for file_name, coverage in results['coverage_by_file'].items():
-            f.write(f"{file_name}: {coverage['coverage_percentage']}% ({coverage['covered_mandatory']} of {results['total_mandatory']} mandatory fields)\n")
-        
-        f.write("\n=== MISSING MANDATORY FIELDS ===\n")
-        if results['missing_mandatory']:
-            for field in results['missing_mandatory']:
+        f.write("\n=== UNCOVERED SPECIFICATION FIELDS ===\n")
+        for field in results['missing_fields']:
+            if field['group'] != 'mandatory':
                 f.write(f"- {field['path']} ({field['name']} - {field['xml_tag']})\n")
-        else:
-            f.write("No missing mandatory fields!\n")
     
     print(f"\nResults saved to {output_file}")
 
@@ -0,0 +1,105 @@
+"""Batch rule evaluation must agree with the per-message rule engine."""
+import numpy as np
+import pytest
+from lxml import etree
+
+from iso_message_generator.batch_rules import CURRENCY_RULE_ID, evaluate_rules_batch, extract_rule_columns
+from iso_message_generator.rule_engine import compile_rules, evaluate_rules, load_rules
+
+NAMESPACE = "urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08"
+
+TRANSACTION = """
+<CdtTrfTxInf>
+  <PmtId><EndToEndId>E2E-{index}</EndToEndId></PmtId>
+  <IntrBkSttlmAmt Ccy="{ccy}">100.00</IntrBkSttlmAmt>
+  <ChrgBr>SHAR</ChrgBr>
+  <InstgAgt><FinInstnId><BICFI>ABCDUS33XXX</BICFI></FinInstnId></InstgAgt>
+  <InstdAgt><FinInstnId><BICFI>EFGHCA33XXX</BICFI></FinInstnId></InstdAgt>
+  <Dbtr>{debtor_name}<PstlAdr><TwnNm>Boston</TwnNm><Ctry>US</Ctry></PstlAdr></Dbtr>
+  {debtor_agent}
+  <CdtrAgt><FinInstnId><BICFI>EFGHCA33XXX</BICFI></FinInstnId></CdtrAgt>
+  <Cdtr><Nm>Creditor</Nm></Cdtr>
+</CdtTrfTxInf>"""
+
+def build_message(transactions):
+    """Build a message from (debtor name, debtor agent BIC, currency) tuples, one per transaction."""
+    body = ''.join(TRANSACTION.format(index=index, ccy=ccy,
+                                      debtor_agent=(f"<DbtrAgt><FinInstnId><BICFI>{agent}</BICFI></FinInstnId></DbtrAgt>" if agent
+                                                    else "<DbtrAgt><BrnchId><Id>B1</Id></BrnchId></DbtrAgt>"),
+                                      debtor_name=f"<Nm>{name}</Nm>" if name else '')
+                   for index, (name, agent, ccy) in enumerate(transactions))
+    xml = (f'<Document xmlns="{NAMESPACE}"><FIToFICstmrCdtTrf><GrpHdr><MsgId>MSG</MsgId>'
+           f'<NbOfTxs>{len(transactions)}</NbOfTxs></GrpHdr>{body}</FIToFICstmrCdtTrf></Document>')
+    return etree.fromstring(xml.encode('utf-8'))
+
+VALID = ('Debtor', 'ABCDUS33XXX', 'USD')
+NO_NAME = (None, 'ABCDUS33XXX', 'USD')
+OTHER_AGENT = ('Debtor', 'ZZZZUS33XXX', 'USD')
+OTHER_CCY = ('Debtor', 'ABCDUS33XXX', 'EUR')
+BRANCH_ONLY_AGENT = ('Debtor', None, 'USD')
+
+@pytest.fixture(scope='module')
+def compiled_rules():
+    return compile_rules(load_rules())
+
+def per_message_matrices(compiled_rules, messages, rule_ids):
+    """Passed and applicable matrices built from evaluate_rules, one message at a time."""
+    passed = np.ones((len(messages), len(rule_ids)), dtype=bool)
+    applicable = np.zeros((len(messages), len(rule_ids)), dtype=bool)
+    for row, message in enumerate(messages):
+        results = evaluate_rules(compiled_rules, message)
+        for rule in results['failed_rules']:
+            if rule['rule_id'] in rule_ids:
+                passed[row, rule_ids.index(rule['rule_id'])] = False
+                applicable[row, rule_ids.index(rule['rule_id'])] = True
+        for rule in results['passed_rules']:
+            if rule['rule_id'] in rule_ids:
+                applicable[row, rule_ids.index(rule['rule_id'])] = True
+    return passed, applicable
+
+BATCHES = [
+    [[VALID, NO_NAME], []],
+    [[VALID, NO_NAME], [], []],
+    [[], [VALID, NO_NAME]],
+    [[], [NO_NAME], [], [VALID, OTHER_AGENT], []],
+    [[NO_NAME], [VALID], [OTHER_AGENT, VALID, NO_NAME], []],
+    [[], []],
+    [[BRANCH_ONLY_AGENT], [VALID, BRANCH_ONLY_AGENT]],
+]
+
+@pytest.mark.parametrize('batch', BATCHES)
+def test_batch_matches_per_message_engine(compiled_rules, batch):
+    messages = [build_message(transactions) for transactions in batch]
+    results = evaluate_rules_batch(compiled_rules, extract_rule_columns(messages), check_currency=False)
+
+    passed, applicable = per_message_matrices(compiled_rules, messages, results['rule_ids'])
+
+    assert results['passed'].tolist() == passed.tolist()
+    assert results['applicable'].tolist() == applicable.tolist()
+
+@pytest.mark.parametrize('batch', BATCHES)
+def test_batch_matches_single_message_batches(compiled_rules, batch):
+    messages = [build_message(transactions) for transactions in batch]
+    results = evaluate_rules_batch(compiled_rules, extract_rule_columns(messages))
+
+    for row, message in enumerate(messages):
+        single = evaluate_rules_batch(compiled_rules, extract_rule_columns([message]))
+        assert results['passed'][row].tolist() == single['passed'][0].tolist()
+        assert results['applicable'][row].tolist() == single['applicable'][0].tolist()
+
+def test_failing_last_row_before_empty_message_is_kept(compiled_rules):
+    messages = [build_message([VALID, NO_NAME]), build_message([])]
+    results = evaluate_rules_batch(compiled_rules, extract_rule_columns(messages))
+
+    failed = {rule_id for rule_id, ok in zip(results['rule_ids'], results['passed'][0]) if not ok}
+    assert {'R5', 'R6'} <= failed
+    assert results['passed'][1].all()
+    assert not results['applicable'][1].any()
+
+def test_currency_consistency_with_empty_messages(compiled_rules):
+    messages = [build_message([]), build_message([VALID, OTHER_CCY]), build_message([]), build_message([VALID])]
+    results = evaluate_rules_batch(compiled_rules, extract_rule_columns(messages))
+
+    position = results['rule_ids'].index(CURRENCY_RULE_ID)
+    assert results['passed'][:, position].tolist() == [True, False, True, True]
+    assert results['applicable'][:, position].tolist() == [False, True, False, True]
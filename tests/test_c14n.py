@@ -0,0 +1,61 @@
+"""Canonical digests ignore formatting and handle every well-formed input."""
+import hashlib
+
+import pytest
+from lxml import etree
+
+from iso_message_generator import c14n
+from iso_message_generator.c14n import canonical_bytes, canonical_digest, file_digest, tree_digest, write_if_changed
+from iso_message_generator.validation_cache import file_digest as cached_file_digest, open_cache
+
+PLAIN = b'<a><b>x</b></a>'
+
+EQUIVALENT = [
+    b'<?xml version="1.0"?>\n<a>\n  <b>x</b>\n</a>\n',
+    b"<a><!-- note --><b >x</b></a>",
+    b'<!DOCTYPE a [<!ENTITY e "x">]><a><b>&e;</b></a>',
+    b'<!DOCTYPE a [<!ENTITY e "<b>x</b>">]><a>&e;</a>',
+]
+
+@pytest.fixture(params=['tree', 'stream'])
+def path_kind(request, monkeypatch):
+    """Run a test on the tree path and, with the threshold lowered, on the streaming path."""
+    if request.param == 'stream':
+        monkeypatch.setattr(c14n, 'STREAMING_THRESHOLD', 0)
+    return request.param
+
+@pytest.mark.parametrize('data', EQUIVALENT)
+def test_equivalent_messages_share_the_digest(data, path_kind):
+    assert canonical_digest(data) == canonical_digest(PLAIN)
+    assert canonical_bytes(data) == canonical_bytes(PLAIN)
+
+@pytest.mark.parametrize('data', EQUIVALENT)
+def test_file_digest_matches_canonical_digest(data, path_kind, tmp_path):
+    path = tmp_path / 'message.xml'
+    path.write_bytes(data)
+    assert file_digest(str(path)) == canonical_digest(PLAIN)
+
+def test_malformed_message_digests_its_bytes(path_kind, tmp_path):
+    data = b'<a><b>x</a>'
+    path = tmp_path / 'message.xml'
+    path.write_bytes(data)
+    assert canonical_digest(data) == hashlib.sha256(data).hexdigest()
+    assert file_digest(str(path)) == hashlib.sha256(data).hexdigest()
+
+def test_tree_digest_of_tree_with_entity_references():
+    parser = etree.XMLParser(resolve_entities=False)
+    root = etree.fromstring(b'<!DOCTYPE a [<!ENTITY e "x">]><a><b>&e;</b></a>', parser)
+    assert tree_digest(root) == canonical_digest(PLAIN)
+
+def test_write_if_changed_with_entity_references(tmp_path):
+    path = tmp_path / 'message.xml'
+    path.write_bytes(EQUIVALENT[2])
+    assert write_if_changed(str(path), PLAIN) is False
+    assert write_if_changed(str(path), b'<a><b>y</b></a>') is True
+
+def test_validation_cache_digest_with_entity_references(tmp_path):
+    path = tmp_path / 'message.xml'
+    path.write_bytes(EQUIVALENT[2])
+    conn = open_cache(str(tmp_path / 'cache.sqlite'))
+    assert cached_file_digest(conn, str(path)) == canonical_digest(PLAIN)
+    conn.close()
@@ -0,0 +1,33 @@
+"""Duplicate detection of the combined check."""
+from iso_message_generator.check import check_message
+
+NAMESPACE = "urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08"
+
+def build_message(msg_id, sender, *end_to_end_ids):
+    transactions = ''.join(f"<CdtTrfTxInf><PmtId><EndToEndId>{value}</EndToEndId></PmtId></CdtTrfTxInf>"
+                           for value in end_to_end_ids)
+    return (f'<Document xmlns="{NAMESPACE}"><FIToFICstmrCdtTrf><GrpHdr><MsgId>{msg_id}</MsgId>'
+            f'<InstgAgt><FinInstnId><BICFI>{sender}</BICFI></FinInstnId></InstgAgt></GrpHdr>'
+            f'{transactions}</FIToFICstmrCdtTrf></Document>').encode('utf-8')
+
+def duplicates(seen, name, data):
+    return [(d['kind'], d['value'], d['first_seen'])
+            for d in check_message(data, seen=seen, name=name)['duplicates']]
+
+def test_msg_id_is_scoped_by_sender():
+    seen = {}
+    assert duplicates(seen, 'a.xml', build_message('MSG-1', 'AAAAUS33', 'E2E-1')) == []
+    assert duplicates(seen, 'b.xml', build_message('MSG-1', 'BBBBUS33', 'E2E-2')) == []
+    assert duplicates(seen, 'c.xml', build_message('MSG-1', 'AAAAUS33', 'E2E-3')) == [('MsgId', 'MSG-1', 'a.xml')]
+
+def test_repeats_within_a_message_are_reported():
+    seen = {}
+    assert duplicates(seen, 'a.xml', build_message('MSG-1', 'AAAAUS33', 'E2E-1', 'E2E-1', 'E2E-1')) == [
+        ('EndToEndId', 'E2E-1', 'a.xml'), ('EndToEndId', 'E2E-1', 'a.xml')]
+
+def test_identical_message_is_reported_with_its_identifiers():
+    seen = {}
+    data = build_message('MSG-1', 'AAAAUS33', 'E2E-1')
+    duplicates(seen, 'a.xml', data)
+    assert [kind for kind, _, first_seen in duplicates(seen, 'b.xml', data) if first_seen == 'a.xml'] == [
+        'Message', 'MsgId', 'EndToEndId']
@@ -0,0 +1,30 @@
+"""The message store only resolves references against the current version of each file."""
+import pytest
+
+from iso_message_generator.reference_checks import add_records, close_message_store, find_original, open_message_store
+
+def record(file, index):
+    return {'file': file, 'index': index, 'identifiers': {'TxId': f"{file}-TX{index}"}, 'references': [],
+            'amount': '100.00', 'ccy': 'USD', 'charges': '0', 'debtor': 'Debtor', 'creditor': 'Creditor'}
+
+@pytest.fixture
+def store(tmp_path):
+    conn = open_message_store(str(tmp_path / 'store.sqlite'))
+    yield conn
+    close_message_store(conn)
+
+def test_shrunk_file_leaves_no_stale_transactions(store):
+    add_records(store, [record('a.xml', index) for index in range(3)] + [record('b.xml', 0)])
+    add_records(store, [record('a.xml', 0)])
+
+    assert find_original(store, 'a.xml-TX0')['index'] == 0
+    assert find_original(store, 'a.xml-TX2') is None
+    assert find_original(store, 'b.xml-TX0') is not None
+    assert store.execute("SELECT COUNT(*) FROM identifiers").fetchone()[0] == 2
+
+def test_file_without_records_is_removed(store):
+    add_records(store, [record('a.xml', 0)])
+    add_records(store, [], files=['a.xml'])
+
+    assert find_original(store, 'a.xml-TX0') is None
+    assert store.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
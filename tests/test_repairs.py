@@ -0,0 +1,63 @@
+"""Repairs only change values that break the schema."""
+import pytest
+
+from iso_message_generator.repairs import load_repair_schema, repair_message, select_repairs
+
+XSD = b'''<?xml version="1.0" encoding="UTF-8"?>
+<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:element name="Document" type="Document"/>
+  <xs:complexType name="Document">
+    <xs:sequence>
+      <xs:element name="Ustrd" type="Max140Text" minOccurs="0"/>
+      <xs:element name="Cd" type="ChargeBearerType1Code" minOccurs="0"/>
+      <xs:element name="Id" type="Max4Text" minOccurs="0"/>
+    </xs:sequence>
+  </xs:complexType>
+  <xs:simpleType name="Max140Text">
+    <xs:restriction base="xs:string">
+      <xs:minLength value="1"/>
+      <xs:maxLength value="140"/>
+    </xs:restriction>
+  </xs:simpleType>
+  <xs:simpleType name="ChargeBearerType1Code">
+    <xs:restriction base="xs:string">
+      <xs:enumeration value="SLEV"/>
+      <xs:enumeration value="SHAR"/>
+    </xs:restriction>
+  </xs:simpleType>
+  <xs:simpleType name="Max4Text">
+    <xs:restriction base="xs:string">
+      <xs:minLength value="1"/>
+      <xs:maxLength value="4"/>
+    </xs:restriction>
+  </xs:simpleType>
+</xs:schema>
+'''
+
+@pytest.fixture
+def schema_table(tmp_path):
+    path = tmp_path / 'schema.xsd'
+    path.write_bytes(XSD)
+    return load_repair_schema(str(path))
+
+def strip(data, schema_table):
+    return repair_message(data, schema_table, select_repairs(['strip_whitespace']))
+
+def test_valid_padded_string_is_left_alone(schema_table):
+    result = strip(b'<Document><Ustrd>  Invoice  1  </Ustrd></Document>', schema_table)
+    assert result == {'data': None, 'repairs': []}
+
+@pytest.mark.parametrize('data, value', [
+    (b'<Document><Cd>  SLEV\n</Cd></Document>', b'<Cd>SLEV</Cd>'),
+    (b'<Document><Id>  AB12  </Id></Document>', b'<Id>AB12</Id>'),
+])
+def test_padding_that_breaks_a_facet_is_stripped(schema_table, data, value):
+    result = strip(data, schema_table)
+    assert [repair['repair'] for repair in result['repairs']] == ['strip_whitespace']
+    assert value in result['data']
+
+def test_value_still_invalid_after_stripping_is_left_alone(schema_table):
+    assert strip(b'<Document><Cd> XXXX </Cd></Document>', schema_table)['data'] is None
+
+def test_nothing_is_stripped_without_a_schema():
+    assert strip(b'<Document><Cd>  SLEV  </Cd></Document>', None)['data'] is None
@@ -0,0 +1,76 @@
+"""Reused identifier detection across runs."""
+import pytest
+
+from iso_message_generator import uniqueness_index
+from iso_message_generator.uniqueness_index import (check_identifier, check_message_identifiers, close_uniqueness_index,
+                                                    evict_identifiers, open_uniqueness_index)
+
+DAY = 86400
+
+def message(msg_id, sender, *end_to_end_ids):
+    """Minimal message index with the paths message_identifiers reads."""
+    return {
+        'header': {'MsgId': {'values': [msg_id]}, 'InstgAgt/FinInstnId/BICFI': {'values': [sender]}},
+        'transactions': [{'PmtId/EndToEndId': {'values': [value]}} for value in end_to_end_ids]
+    }
+
+@pytest.fixture
+def index_file(tmp_path):
+    return str(tmp_path / 'identifiers.sqlite')
+
+def open_index(index_file):
+    return open_uniqueness_index(index_file, expected_items=1000)
+
+def test_rechecking_the_same_source_reports_nothing(index_file):
+    index = open_index(index_file)
+    assert check_message_identifiers(index, message('MSG-1', 'AAAAUS33', 'E2E-1', 'E2E-2'), 'a.xml') == []
+    close_uniqueness_index(index)
+
+    index = open_index(index_file)
+    assert check_message_identifiers(index, message('MSG-1', 'AAAAUS33', 'E2E-1', 'E2E-2'), 'a.xml') == []
+    duplicates = check_message_identifiers(index, message('MSG-1', 'AAAAUS33', 'E2E-1'), 'b.xml')
+    close_uniqueness_index(index)
+
+    assert [(d['kind'], d['value'], d['first_seen']) for d in duplicates] == [
+        ('MsgId', 'MSG-1', 'a.xml'), ('EndToEndId', 'E2E-1', 'a.xml')]
+
+def test_msg_id_is_scoped_by_sender(index_file):
+    index = open_index(index_file)
+    check_message_identifiers(index, message('MSG-1', 'AAAAUS33'), 'a.xml')
+    assert check_message_identifiers(index, message('MSG-1', 'BBBBUS33'), 'b.xml') == []
+    close_uniqueness_index(index)
+
+def test_repeat_within_one_message_is_reported_on_every_run(index_file):
+    for _ in range(2):
+        index = open_index(index_file)
+        duplicates = check_message_identifiers(index, message('MSG-1', 'AAAAUS33', 'E2E-1', 'E2E-1'), 'a.xml')
+        close_uniqueness_index(index)
+        assert [(d['kind'], d['value'], d['first_seen']) for d in duplicates] == [('EndToEndId', 'E2E-1', 'a.xml')]
+
+def test_eviction_keeps_the_filter_until_enough_keys_are_stale(index_file, monkeypatch):
+    rebuilds = []
+    rebuild = uniqueness_index._rebuild_bloom
+    monkeypatch.setattr(uniqueness_index, '_rebuild_bloom', lambda index: rebuilds.append(1) or rebuild(index))
+
+    index = open_index(index_file)
+    rebuilds.clear()
+    for number in range(10):
+        check_identifier(index, 'EndToEndId', f"OLD-{number}", source='old.xml', seen_at=0)
+    for number in range(30):
+        check_identifier(index, 'EndToEndId', f"NEW-{number}", source='new.xml', seen_at=100 * DAY)
+
+    assert evict_identifiers(index, window_days=90, now=100 * DAY) == 10
+    assert rebuilds == []
+    assert index['stale'] == 10
+
+    # Evicted keys are confirmed absent by SQLite and recorded again
+    assert check_identifier(index, 'EndToEndId', 'OLD-0', source='other.xml', seen_at=100 * DAY) is None
+    close_uniqueness_index(index)
+
+    index = open_index(index_file)
+    assert rebuilds == []
+    assert index['stale'] == 10
+    assert evict_identifiers(index, window_days=10, now=200 * DAY) == 31
+    assert rebuilds == [1]
+    assert index['stale'] == 0
+    close_uniqueness_index(index)
@@ -0,0 +1,76 @@
+"""Cached results must not outlive the layout their positions refer to."""
+import os
+import sqlite3
+
+import pytest
+
+from iso_message_generator.validation_cache import cached_result, close_cache, open_cache
+
+@pytest.fixture
+def cache(tmp_path):
+    conn = open_cache(str(tmp_path / 'cache.sqlite'))
+    yield conn
+    conn.close()
+
+def write(path, data, mtime):
+    path.write_bytes(data)
+    os.utime(path, ns=(mtime, mtime))
+
+def counting(calls):
+    def compute(xml_file):
+        calls.append(xml_file)
+        with open(xml_file, 'rb') as f:
+            return {'lines': f.read().count(b'\n')}
+    return compute
+
+def test_reformatted_file_is_revalidated_for_xsd(cache, tmp_path):
+    path = tmp_path / 'message.xml'
+    calls = []
+
+    write(path, b'<a><b>x</b></a>\n', 1)
+    assert cached_result(cache, 'xsd', str(path), 'spec', counting(calls)) == {'lines': 1}
+    assert cached_result(cache, 'xsd', str(path), 'spec', counting(calls)) == {'lines': 1}
+    assert len(calls) == 1
+
+    write(path, b'<a>\n  <b>x</b>\n</a>\n', 2)
+    assert cached_result(cache, 'xsd', str(path), 'spec', counting(calls)) == {'lines': 3}
+    assert len(calls) == 2
+
+def test_reformatted_file_reuses_rule_results(cache, tmp_path):
+    path = tmp_path / 'message.xml'
+    calls = []
+
+    write(path, b'<a><b>x</b></a>\n', 1)
+    cached_result(cache, 'rules', str(path), 'spec', counting(calls))
+    write(path, b'<a>\n  <b>x</b>\n</a>\n', 2)
+    assert cached_result(cache, 'rules', str(path), 'spec', counting(calls)) == {'lines': 1}
+    assert len(calls) == 1
+
+def test_edited_file_is_recomputed_for_both_kinds(cache, tmp_path):
+    path = tmp_path / 'message.xml'
+    calls = []
+
+    write(path, b'<a><b>x</b></a>\n', 1)
+    cached_result(cache, 'rules', str(path), 'spec', counting(calls))
+    cached_result(cache, 'xsd', str(path), 'spec', counting(calls))
+    write(path, b'<a><b>y</b></a>\n\n', 2)
+    cached_result(cache, 'rules', str(path), 'spec', counting(calls))
+    cached_result(cache, 'xsd', str(path), 'spec', counting(calls))
+    assert len(calls) == 4
+
+def test_memo_from_an_older_cache_is_rebuilt(tmp_path):
+    cache_file = str(tmp_path / 'cache.sqlite')
+    conn = sqlite3.connect(cache_file)
+    conn.execute("CREATE TABLE file_digests (path TEXT PRIMARY KEY, size INTEGER NOT NULL, "
+                 "mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL) WITHOUT ROWID")
+    conn.commit()
+    conn.close()
+
+    path = tmp_path / 'message.xml'
+    write(path, b'<a/>', 1)
+    conn = open_cache(cache_file)
+    calls = []
+    cached_result(conn, 'xsd', str(path), 'spec', counting(calls))
+    cached_result(conn, 'xsd', str(path), 'spec', counting(calls))
+    close_cache(conn)
+    assert len(calls) == 1